@@ -0,0 +1,95 @@
+import functools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# --- ODCZYTY Z REPLIKI ---
+# Włączane zmienną DB_REPLICA_HOST (core/settings.py dodaje wtedy alias
+# 'replica' i ten router). Na replikę idą tylko odczyty widoków oznaczonych
+# replica_reads (lista ofert, szczegóły, PDF, statystyki) - zapisy, migracje
+# i cała reszta zostają na bazie głównej.
+#
+# Replika może być chwilę w tyle. Po zapisie (POST itd.) PrimaryAfterWriteMiddleware
+# ustawia ciasteczko na REPLICA_PIN_SECONDS - w tym czasie ten użytkownik czyta
+# z bazy głównej i od razu widzi swoją ofertę. Odczyty wewnątrz transakcji
+# też idą na bazę główną (np. SELECT ... FOR UPDATE w trakcie zapisu).
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'db_primary'
+
+_use_replica = ContextVar('db_use_replica', default=False)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replika to ta sama baza - obiekty z obu aliasów mogą się wiązać
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schemat na replikę przychodzi z replikacją
+        return db != REPLICA_ALIAS
+
+
+def _pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def replica_reads(view):
+    """Odczyty ORM widoku idą na replikę (o ile użytkownik nie jest przypięty do bazy głównej)."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _use_replica.set(not _pinned(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _use_replica.set(not _pinned(request))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    return wrapper
+
+
+class PrimaryAfterWriteMiddleware:
+    """Po żądaniu zmieniającym dane przypina użytkownika do bazy głównej na REPLICA_PIN_SECONDS."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._pin(request, await self.get_response(request))
+
+    def _pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                                httponly=True, samesite='Lax')
+        return response
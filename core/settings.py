@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,12 +55,14 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'offers.middleware.StaticFilesMiddleware',
+    'offers.middleware.QueryInspectorMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'offers.middleware.OfferHistoryMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -69,6 +73,50 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Cache gotowych PDF-ów ofert (offers/pdf_cache.py)
+PDF_CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+PDF_CACHE_MAX_AGE = int(os.getenv('PDF_CACHE_MAX_AGE', 30 * 24 * 3600))  # sekundy
+# True = offer_pdf nie renderuje w wątku requestu, tylko zleca zadanie workerowi (manage.py pdf_worker)
+PDF_RENDER_ASYNC = os.getenv('PDF_RENDER_ASYNC', 'False') == 'True'
+# Pod ASGI (uvicorn) widok offer_pdf renderuje w puli o tylu wątkach na proces
+PDF_RENDER_THREADS = int(os.getenv('PDF_RENDER_THREADS', 2))
+
+# Indeks podpowiedzi produktów (offers/catalog.py) - maks. wiek w sekundach,
+# gdy cache nie jest współdzielony między procesami
+CATALOG_INDEX_TTL = int(os.getenv('CATALOG_INDEX_TTL', 300))
+
+# Numeracja ofert (offers/numbering.py): 1 = ciąg bez dziur, >1 = paczki numerów per proces
+OFFER_NUMBER_BLOCK_SIZE = int(os.getenv('OFFER_NUMBER_BLOCK_SIZE', 1))
+
+# Wysyłka ofert mailem (offers/mailing.py, worker: manage.py email_worker).
+# Lokalnie: EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend
+# albo serwer testowy `python -m smtpd -n -c DebuggingServer localhost:1025` + EMAIL_PORT=1025
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 30))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'oferty@localhost')
+EMAIL_RETRY_BASE_DELAY = int(os.getenv('EMAIL_RETRY_BASE_DELAY', 60))  # sekundy, podwajane przy każdej próbie
+
+# Inspektor zapytań SQL (offers/query_inspector.py) - nagłówki X-Query-*, ostrzeżenia o N+1
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR', 'False') == 'True'
+QUERY_INSPECTOR_REPEAT_THRESHOLD = int(os.getenv('QUERY_INSPECTOR_REPEAT_THRESHOLD', 3))
+# Limit zapytań na widok (nazwa z urls.py, admin z przestrzenią nazw); przekroczenie = ostrzeżenie w logu,
+# a przy QUERY_BUDGET_STRICT (testy) wyjątek QueryBudgetExceeded
+QUERY_BUDGETS = {
+    'offer_list': 12,
+    'offer_detail': 8,
+    'offer_create': 45,
+    'offer_edit': 50,
+    'dashboard': 10,
+    'admin:offers_offer_changelist': 60,
+}
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
 # Konfiguracja CKEditora
 CKEDITOR_CONFIGS = {
     'default': {
@@ -104,14 +152,86 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        # Zmieniamy silnik na SQLite (baza w pliku)
-        'ENGINE': 'django.db.backends.sqlite3',
-        # Wskazujemy, że plik ma leżeć w głównym folderze projektu
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profil bazy z env: DB_ENGINE=sqlite (domyślnie, jeden serwer) albo postgres (docker-compose, produkcja)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'oferty_db'),
+            'USER': os.getenv('DB_USER', 'admin'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'db'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Połączenie zostaje otwarte między żądaniami (sekundy); przed ponownym
+            # użyciem Django sprawdza, czy baza go nie zerwała
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+                'application_name': 'oferty',
+            },
+        }
+    }
+    # Pula połączeń Django (wymaga psycopg 3: pip install "psycopg[pool]"). Pod ASGI (uvicorn)
+    # połączenia trwałe nie są współdzielone między wątkami - tam pula albo pgbouncer i CONN_MAX_AGE=0
+    if os.getenv('DB_POOL', 'False') == 'True':
+        # requirements.txt ma psycopg2 - bez psycopg 3 błąd wyszedłby dopiero przy pierwszym połączeniu
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured(
+                'DB_POOL=True wymaga psycopg 3 z pulą: pip install "psycopg[binary,pool]" '
+                '(albo DB_POOL=False i połączenia trwałe DB_CONN_MAX_AGE).'
+            )
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+    # Replika tylko do odczytu (core/db_routers.py): widoki list, szczegółów, PDF i statystyk
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+            'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+            'OPTIONS': {**DATABASES['default']['OPTIONS'], 'application_name': 'oferty-replica'},
+            # W testach replika = baza główna
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+        MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.common.CommonMiddleware'),
+                          'core.db_routers.PrimaryAfterWriteMiddleware')
+        # Tyle sekund po zapisie użytkownik czyta z bazy głównej (opóźnienie repliki)
+        REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+else:
+    DATABASES = {
+        'default': {
+            # Zmieniamy silnik na SQLite (baza w pliku)
+            'ENGINE': 'django.db.backends.sqlite3',
+            # Wskazujemy, że plik ma leżeć w głównym folderze projektu
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {
+                # WAL: odczyty nie czekają na zapis; zapis czeka na blokadę do 20 s zamiast
+                # od razu rzucać "database is locked"
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+                'timeout': 20,
+                # Blokada zapisu od początku transakcji - bez zakleszczeń przy podnoszeniu blokady
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
-}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -153,3 +273,18 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Logi aplikacji (m.in. czas renderowania PDF z offers/pdf.py)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'offers': {
+            'handlers': ['console'],
+            'level': os.getenv('OFFERS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
@@ -4,6 +4,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from offers import views as offer_views
 from offers import views
+from core.db_routers import replica_reads
 
 
 urlpatterns = [
@@ -12,13 +13,20 @@ urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')),
     path('', offer_views.home, name='root'),
     path('home/', offer_views.home, name='home'),
-    path('offers/', offer_views.offer_list, name='offer_list'),
+    path('dashboard/', replica_reads(offer_views.dashboard), name='dashboard'),
+    path('offers/', replica_reads(offer_views.offer_list), name='offer_list'),
     path('offers/create/', offer_views.offer_create, name='offer_create'),
-    path('offers/<int:pk>/', offer_views.offer_detail, name='offer_detail'),
-    path('offers/<int:pk>/pdf/', offer_views.offer_pdf, name='offer_pdf'),
+    path('offers/<int:pk>/', replica_reads(offer_views.offer_detail), name='offer_detail'),
+    path('offers/<int:pk>/pdf/', replica_reads(offer_views.offer_pdf), name='offer_pdf'),
+    path('offers/<int:pk>/pdf/async/', offer_views.offer_pdf_enqueue, name='offer_pdf_enqueue'),
+    path('offers/pdf-jobs/<int:job_id>/', offer_views.pdf_job_status, name='pdf_job_status'),
+    path('offers/<int:pk>/send/', offer_views.offer_send_email, name='offer_send_email'),
+    path('offers/<int:pk>/reprice/', offer_views.offer_reprice, name='offer_reprice'),
+    path('products/autocomplete/', offer_views.product_autocomplete, name='product_autocomplete'),
     path('offers/<int:pk>/edit/', offer_views.offer_edit, name='offer_edit'),
     path('offer/<int:pk>/status/<str:action>/', views.offer_change_status, name='offer_change_status'),
     path('offer/<int:pk>/reject/', views.offer_reject, name='offer_reject'),
+    path('offers/status/', offer_views.offer_batch_status, name='offer_batch_status'),
 ]
 
 if settings.DEBUG:
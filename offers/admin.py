@@ -1,8 +1,19 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
-from django.urls import reverse
-from .models import Offer, OfferItem, Client, Company, Seller
+from django.urls import path, reverse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from .models import (Offer, OfferItem, Client, Company, Seller, Product, PdfRenderJob, SearchDocument,
+                     ExchangeRate, OfferEvent, OutboundEmail, defer_total_recalculation)
+from . import currency, mailing, search, workflow
 from import_export.admin import ImportExportModelAdmin
+from .importing import ImportFileError, guess_format, import_offers, iter_rows
+from .numbering import next_offer_number
+from .resources import ClientResource, CompanyResource, ProductResource
+from .pdf_export import astream_offers_zip, stream_offers_zip
 
 # Branding
 admin.site.site_header = "System Ofertowy"
@@ -10,16 +21,32 @@ admin.site.site_title = "Panel Zarządzania"
 admin.site.index_title = "Ofertowanie"
 
 
+# --- Wyszukiwarka ---
+
+class FullTextSearchMixin:
+    """Pole wyszukiwania admina przez indeks pełnotekstowy zamiast icontains po JOIN-ach."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_queryset(queryset, self.search_kind, search_term), False
+
+
 # --- Modele ---
 
 @admin.register(Company)
-class CompanyAdmin(admin.ModelAdmin):
+class CompanyAdmin(FullTextSearchMixin, ImportExportModelAdmin):
+    search_kind = SearchDocument.Kind.COMPANY
+    resource_classes = [CompanyResource]  # import dopasowuje firmy po NIP
     list_display = ['name', 'nip', 'address']
     search_fields = ['name', 'nip']
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(FullTextSearchMixin, ImportExportModelAdmin):
+    search_kind = SearchDocument.Kind.CLIENT
+    resource_classes = [ClientResource]  # import dopasowuje kontakty po emailu
     list_display = ['first_name', 'last_name', 'company', 'email', 'position']
     list_filter = ['company']
     search_fields = ['last_name', 'email', 'company__name']  # Szukanie po nazwisku i firmie
@@ -30,6 +57,58 @@ class SellerAdmin(admin.ModelAdmin):
     list_display = ['name', 'nip', 'email']
 
 
+@admin.register(Product)
+class ProductAdmin(ImportExportModelAdmin):
+    # Każdy zapis unieważnia indeks podpowiedzi (offers/catalog.py)
+    resource_classes = [ProductResource]
+    list_display = ['sku', 'name', 'price_pln', 'price_eur', 'vat_rate', 'is_active']
+    list_filter = ['is_active', 'vat_rate']
+    search_fields = ['sku', 'name']
+    list_editable = ['is_active']
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'day', 'rate', 'source']
+    list_filter = ['currency', 'source']
+    date_hierarchy = 'day'
+
+
+@admin.register(OfferEvent)
+class OfferEventAdmin(admin.ModelAdmin):
+    # Dziennik tylko do odczytu
+    # Szukanie po numerze oferty; zdarzenia jednej oferty po id: ?offer__id__exact=<id>
+    list_display = ['timestamp', 'offer', 'kind', 'item_id', 'user']
+    list_filter = ['kind']
+    list_select_related = ['offer', 'user']
+    search_fields = ['offer__offer_number']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    list_select_related = ['offer']
+    search_fields = ['to', 'subject']
+    readonly_fields = ['offer', 'attempts', 'error', 'requested_by', 'created_at', 'started_at', 'sent_at']
+
+
+@admin.register(PdfRenderJob)
+class PdfRenderJobAdmin(admin.ModelAdmin):
+    list_display = ['offer', 'status', 'attempts', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status']
+    list_select_related = ['offer', 'requested_by']
+    readonly_fields = ['offer', 'cache_key', 'attempts', 'error', 'requested_by', 'created_at', 'started_at',
+                       'finished_at']
 
 
 # --- KONIEC MODELI ---
@@ -56,19 +135,23 @@ class OfferItemInline(admin.TabularInline):
 
 
 @admin.register(Offer)
-class OfferAdmin(ImportExportModelAdmin):
+class OfferAdmin(FullTextSearchMixin, ImportExportModelAdmin):
+    search_kind = SearchDocument.Kind.OFFER
     inlines = [OfferItemInline]
-    actions = ['make_pending', 'make_draft', 'make_approved', 'make_consultation']
-    list_display = ('offer_number', 'client', 'total_price', 'status_colored', 'pdf_button', 'created_at')
+    actions = ['make_pending', 'make_draft', 'make_approved', 'make_consultation', 'reprice_from_eur',
+               'send_to_clients', 'download_pdfs_zip']
+    list_display = ('offer_number', 'client', 'total_price', 'total_gross', 'status_colored', 'pdf_button',
+                    'created_at')
     list_display_links = ['offer_number']  # Linkujemy tylko numer, żeby nie kliknąć przypadkiem w klienta
     list_filter = ['status', 'created_at', 'client__company']  # Filtr po firmie!
 
-    # ZMIANA: Szukanie "głębokie" (Deep Packet Inspection)
-    # client__last_name -> szukaj w tabeli Client po polu last_name
-    # client__company__name -> szukaj w tabeli Company po polu name
+    # Szukanie "głębokie" - przez indeks pełnotekstowy (FullTextSearchMixin),
+    # search_fields zostaje tylko po to, żeby admin pokazał pole wyszukiwania
     search_fields = ['offer_number', 'client__last_name', 'client__company__name', 'client__email']
 
     list_per_page = 20
+    # Przycisk "Import hurtowy" obok przycisków import_export
+    change_list_template = 'admin/offers/offer/change_list.html'
 
     # --- UI ---
 
@@ -101,11 +184,51 @@ class OfferAdmin(ImportExportModelAdmin):
 
     pdf_button.short_description = "Pobierz"
 
+    def save_model(self, request, obj, form, change):
+        # Numer z licznika (offers/numbering.py) - widok admina działa już w transakcji
+        if not obj.offer_number:
+            obj.offer_number = next_offer_number(obj.seller)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        # Pozycje z inline'a zapisujemy hurtem - suma oferty przeliczana raz na końcu
+        with defer_total_recalculation():
+            super().save_related(request, form, formsets, change)
+
+    # --- IMPORT HURTOWY (offers/importing.py) ---
+
+    def get_urls(self):
+        urls = [
+            path('bulk-import/', self.admin_site.admin_view(self.bulk_import_view), name='offers_offer_bulk_import'),
+        ]
+        return urls + super().get_urls()
+
+    def bulk_import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:offers_offer_changelist')
+
+        result = error = None
+        if request.method == 'POST' and request.FILES.get('file'):
+            upload = request.FILES['file']
+            try:
+                result = import_offers(iter_rows(upload, guess_format(upload.name)), user=request.user)
+            except ImportFileError as exc:
+                error = str(exc)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import hurtowy ofert',
+            'result': result,
+            'error': error,
+        }
+        return TemplateResponse(request, 'admin/offers/offer/bulk_import.html', context)
+
     # --- ACL / Readonly ---
 
     def get_readonly_fields(self, request, obj=None):
         # Zablokowane pola systemowe
-        default_readonly = ['total_price', 'offer_number', 'created_at', 'updated_at']
+        default_readonly = ['total_price', 'total_vat', 'total_gross', 'offer_number', 'created_at', 'updated_at']
 
         if not obj:
             return default_readonly
@@ -118,33 +241,68 @@ class OfferAdmin(ImportExportModelAdmin):
         return default_readonly
 
     # --- ACTIONS (Maszyna Stanów) ---
+    # Te same reguły przejść co w widokach (offers/workflow.py): jeden warunkowy UPDATE
+    # na zaznaczone oferty, statystyki i historia prowadzone przez workflow.apply()
+
+    def _transition(self, request, queryset, action, done):
+        try:
+            result = workflow.apply(action, queryset.values_list('pk', flat=True), request.user)
+        except workflow.TransitionError as exc:
+            self.message_user(request, str(exc), level=messages.ERROR)
+            return
+        self.message_user(request, f"{done}: {len(result.changed)} ofert.")
+        if result.failed:
+            self.message_user(request, f"Pominięte (niedozwolony status): {len(result.failed)} ofert.",
+                              level=messages.WARNING)
 
     @admin.action(description='Prześlij do akceptacji ')
     def make_pending(self, request, queryset):
-        # Możemy wysłać tylko DRAFY lub ODRZUCONE (po poprawce)
-        updated = queryset.filter(status__in=[Offer.Status.DRAFT, Offer.Status.REJECTED]).update(
-            status=Offer.Status.PENDING)
-        self.message_user(request, f"Wysłano do akceptacji: {updated} ofert.")
+        self._transition(request, queryset, 'submit', "Wysłano do akceptacji")
 
     @admin.action(description='Cofnij do edycji')
     def make_draft(self, request, queryset):
-        updated = queryset.update(status=Offer.Status.DRAFT)
-        self.message_user(request, f"Przywrócono do edycji: {updated} ofert.")
+        self._transition(request, queryset, 'draft', "Przywrócono do edycji")
 
     @admin.action(description='Zatwierdź')
     def make_approved(self, request, queryset):
-        # Zatwierdzamy tylko te oczekujące
-        updated = queryset.filter(status=Offer.Status.PENDING).update(status=Offer.Status.APPROVED)
-        self.message_user(request, f"Zatwierdzono: {updated} ofert.")
+        self._transition(request, queryset, 'approve', "Zatwierdzono")
 
     @admin.action(description='Skieruj do konsultacji IT')
     def make_consultation(self, request, queryset):
-
-        rows_updated = queryset.update(status=Offer.Status.IN_CONSULTATION)
-
-        if rows_updated == 1:
-            message_bit = "1 ofertę"
-        else:
-            message_bit = f"{rows_updated} ofert"
-
-        self.message_user(request, f"Skierowano {message_bit} do konsultacji z Seniorem IT.")
+        self._transition(request, queryset, 'consultation', "Skierowano do konsultacji z Seniorem IT")
+
+    @admin.action(description='Przelicz ceny z EUR (aktualny kurs)')
+    def reprice_from_eur(self, request, queryset):
+        # Tylko oferty w edycji; wysłanych i zatwierdzonych nie ruszamy
+        offer_ids = queryset.filter(status__in=currency.EDITABLE_STATUSES).values_list('pk', flat=True)
+        rate = currency.current_rate('EUR')
+        if rate is None:
+            self.message_user(request, "Brak kursu EUR w tabeli kursów.", level=messages.ERROR)
+            return
+        result = currency.reprice_offers(offer_ids, rate)
+        self.message_user(request, f"Kurs {result.rate}: przeliczono {result.offers} ofert "
+                                   f"({result.items} zmienionych pozycji).")
+
+    @admin.action(description='Wyślij do klienta (kolejka e-mail)')
+    def send_to_clients(self, request, queryset):
+        queued, skipped = 0, 0
+        for offer in queryset.select_related('client'):
+            try:
+                mailing.enqueue_offer_email(offer, user=request.user)
+            except ValueError:
+                skipped += 1
+            else:
+                queued += 1
+        self.message_user(request, f"Dodano do kolejki wysyłki: {queued} ofert (pominięte: {skipped}).")
+
+    # --- EKSPORT ---
+
+    @admin.action(description='Pobierz PDF-y jako ZIP')
+    def download_pdfs_zip(self, request, queryset):
+        # Archiwum wypływa kawałkami w miarę renderowania - bez buforowania całości,
+        # pod ASGI (uvicorn) przez iterator asynchroniczny
+        stream = astream_offers_zip if isinstance(request, ASGIRequest) else stream_offers_zip
+        response = StreamingHttpResponse(stream(queryset), content_type='application/zip')
+        filename = f"oferty_{timezone.now():%Y%m%d_%H%M}.zip"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -5,4 +5,17 @@ class OffersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'offers'
     verbose_name = "System Ofertowy"  # <--- To zmieni nagłówek w menu
-    
+
+    def ready(self):
+        # Sygnały utrzymujące statystyki dashboardu
+        from . import stats  # noqa: F401
+        # Sygnały utrzymujące indeks wyszukiwania
+        from . import search  # noqa: F401
+        # Unieważnianie indeksu podpowiedzi produktów
+        from . import catalog  # noqa: F401
+        # Historia zmian ofert
+        from . import history  # noqa: F401
+        # Wersje logo wystawcy do druku w PDF
+        from . import logos  # noqa: F401
+        # Licznik zapytań SQL na połączeniach (aktywny tylko z QueryInspectorMiddleware)
+        from . import query_inspector  # noqa: F401
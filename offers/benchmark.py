@@ -0,0 +1,310 @@
+import json
+import math
+import statistics
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import OfferItemFormSet
+from .models import Offer, OfferItem, defer_total_recalculation
+from .pdf import PDF_QUERYSET_RELATED, render_offer_pdf
+from .seeding import bench_user
+
+# --- BENCHMARK WIDOKÓW I ŚCIEŻEK ZAPISU ---
+# Każdy scenariusz wykonujemy `warmup` razy bez pomiaru, potem `iterations`
+# razy mierząc czas (p50/p95) i liczbę zapytań SQL. Żądania idą przez
+# django.test.Client - pełny stos middleware i szablonów, bez sieci.
+# Scenariusze zapisujące (tworzenie, edycja, zapis formsetu) działają
+# w transakcji wycofywanej po każdym przebiegu, więc baza zostaje bez zmian.
+#
+# Wynik to JSON, który można porównać z zapisanym wcześniej (compare()):
+# regresja = czas p50/p95 gorszy o więcej niż próg albo więcej zapytań.
+
+NEW_ITEMS = 5  # pozycji w formularzu tworzenia oferty
+SAMPLE_SIZE = 20  # ofert, po których krążą scenariusze szczegółów/edycji
+
+
+class BenchmarkError(RuntimeError):
+    pass
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: object  # callable(kontekst, nr przebiegu)
+    writes: bool = False
+
+
+class Context:
+    """Zalogowany klient HTTP i próbka ofert z bazy, na której działają scenariusze."""
+
+    def __init__(self):
+        user = bench_user()
+        self.http = Client(HTTP_HOST=_host())
+        self.http.force_login(user)
+        self.offer_ids = _sample_offer_ids(Offer.objects.filter(items__isnull=False).distinct())
+        self.editable_ids = list(
+            Offer.objects.filter(status=Offer.Status.DRAFT, items__isnull=False).distinct()
+            .order_by('pk').values_list('pk', flat=True)[:SAMPLE_SIZE]
+        )
+        if not self.offer_ids or not self.editable_ids:
+            raise BenchmarkError("Za mało danych - najpierw `python manage.py seed_offers`.")
+        self.search_term = Offer.objects.filter(pk=self.offer_ids[0]).values_list(
+            'client__last_name', flat=True).first() or 'a'
+
+    def offer_id(self, iteration):
+        return self.offer_ids[iteration % len(self.offer_ids)]
+
+    def editable_offer(self, iteration):
+        return Offer.objects.get(pk=self.editable_ids[iteration % len(self.editable_ids)])
+
+
+def _host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def _sample_offer_ids(queryset, size=SAMPLE_SIZE):
+    """Oferty rozłożone równo po zakresie ID - bez ORDER BY RANDOM() po całej tabeli."""
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    step = max((bounds['high'] - bounds['low']) // size, 1)
+    ids = []
+    for start in range(bounds['low'], bounds['high'] + 1, step):
+        pk = queryset.filter(pk__gte=start).order_by('pk').values_list('pk', flat=True).first()
+        if pk is not None and pk not in ids:
+            ids.append(pk)
+        if len(ids) == size:
+            break
+    return ids
+
+
+def _check(response, *expected):
+    if response.status_code not in expected:
+        raise BenchmarkError(f"{response.request['PATH_INFO']}: HTTP {response.status_code}")
+
+
+# --- DANE FORMULARZY ---
+
+def _offer_form_data(offer):
+    return {
+        'seller': offer.seller_id or '', 'client': offer.client_id or '',
+        'description': offer.description or '', 'status': offer.status,
+        'validity_days': offer.validity_days, 'payment_deadline_days': offer.payment_deadline_days,
+        'payment_method': offer.payment_method, 'currency_rate': offer.currency_rate,
+    }
+
+
+def _items_form_data(items, iteration):
+    """Formset z istniejącymi pozycjami; każda cena zmieniona, żeby zapis był prawdziwym UPDATE."""
+    data = {'items-TOTAL_FORMS': len(items), 'items-INITIAL_FORMS': len(items),
+            'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000}
+    for i, item in enumerate(items):
+        data.update({
+            f'items-{i}-id': item.pk, f'items-{i}-description': item.description,
+            f'items-{i}-quantity': item.quantity,
+            f'items-{i}-price_per_unit': item.price_per_unit + Decimal('0.01') * (iteration + 1),
+            f'items-{i}-price_in_eur': item.price_in_eur or '', f'items-{i}-vat_rate': item.vat_rate,
+        })
+    return data
+
+
+def _new_items_form_data(count, iteration):
+    data = {'items-TOTAL_FORMS': count, 'items-INITIAL_FORMS': 0,
+            'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000}
+    for i in range(count):
+        data.update({
+            f'items-{i}-description': f"Pozycja testowa {i + 1}", f'items-{i}-quantity': i + 1,
+            f'items-{i}-price_per_unit': f"{100 + iteration}.{i:02d}", f'items-{i}-vat_rate': '23.00',
+        })
+    return data
+
+
+# --- SCENARIUSZE ---
+
+def _offer_list(ctx, iteration):
+    _check(ctx.http.get(reverse('offer_list')), 200)
+
+
+def _offer_list_search(ctx, iteration):
+    _check(ctx.http.get(reverse('offer_list'), {'q': ctx.search_term, 'status': Offer.Status.SENT}), 200)
+
+
+def _offer_detail(ctx, iteration):
+    _check(ctx.http.get(reverse('offer_detail', args=[ctx.offer_id(iteration)])), 200)
+
+
+def _offer_create(ctx, iteration):
+    template = Offer.objects.get(pk=ctx.offer_id(iteration))
+    data = {**_offer_form_data(template), 'status': Offer.Status.DRAFT,
+            **_new_items_form_data(NEW_ITEMS, iteration)}
+    _check(ctx.http.post(reverse('offer_create'), data), 302)
+
+
+def _offer_edit(ctx, iteration):
+    offer = ctx.editable_offer(iteration)
+    data = {**_offer_form_data(offer), **_items_form_data(list(offer.items.all()), iteration)}
+    _check(ctx.http.post(reverse('offer_edit', args=[offer.pk]), data), 302)
+
+
+def _formset_save(ctx, iteration):
+    # Sam zapis pozycji (walidacja + UPDATE-y + jedno przeliczenie sum), bez widoku i szablonu
+    offer = ctx.editable_offer(iteration)
+    formset = OfferItemFormSet(_items_form_data(list(offer.items.all()), iteration), instance=offer)
+    if not formset.is_valid():
+        raise BenchmarkError(f"Formset oferty {offer.pk}: {formset.errors}")
+    with defer_total_recalculation():
+        formset.save()
+
+
+def _admin_changelist(ctx, iteration):
+    _check(ctx.http.get(reverse('admin:offers_offer_changelist')), 200)
+
+
+def _dashboard(ctx, iteration):
+    _check(ctx.http.get(reverse('dashboard')), 200)
+
+
+def _pdf_render(ctx, iteration):
+    # Render z pominięciem cache PDF - koszt pierwszego pobrania
+    offer = Offer.objects.select_related(*PDF_QUERYSET_RELATED).get(pk=ctx.offer_id(iteration))
+    render_offer_pdf(offer)
+
+
+SCENARIOS = (
+    Scenario('offer_list', _offer_list),
+    Scenario('offer_list_search', _offer_list_search),
+    Scenario('offer_detail', _offer_detail),
+    Scenario('offer_create', _offer_create, writes=True),
+    Scenario('offer_edit', _offer_edit, writes=True),
+    Scenario('formset_save', _formset_save, writes=True),
+    Scenario('admin_changelist', _admin_changelist),
+    Scenario('dashboard', _dashboard),
+    Scenario('pdf_render', _pdf_render),
+)
+
+
+def _unavailable(scenario):
+    """Powód pominięcia scenariusza albo None."""
+    if scenario.name == 'pdf_render':
+        try:
+            import weasyprint  # noqa: F401
+        except (ImportError, OSError) as exc:
+            return f"WeasyPrint niedostępny: {exc}"
+    return None
+
+
+# --- POMIAR ---
+
+def percentile(values, fraction):
+    """Percentyl metodą najbliższej rangi (p95 z 20 pomiarów = 19. wartość)."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def _run_once(scenario, ctx, iteration):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        if scenario.writes:
+            with transaction.atomic():
+                scenario.run(ctx, iteration)
+                transaction.set_rollback(True)
+        else:
+            scenario.run(ctx, iteration)
+        elapsed = time.perf_counter() - started
+    return elapsed * 1000, len(queries)
+
+
+def measure(scenario, ctx, iterations, warmup):
+    for iteration in range(warmup):
+        _run_once(scenario, ctx, iteration)
+    timings, query_counts = [], []
+    for iteration in range(iterations):
+        elapsed, queries = _run_once(scenario, ctx, iteration)
+        timings.append(elapsed)
+        query_counts.append(queries)
+    return {
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'max_ms': round(max(timings), 2),
+        # Liczba zapytań bywa różna między ofertami - porównujemy najgorszy przebieg
+        'queries': max(query_counts),
+    }
+
+
+def run(names=None, iterations=20, warmup=3, progress=None):
+    """Wykonuje scenariusze (domyślnie wszystkie) i zwraca wynik gotowy do zapisu w JSON."""
+    scenarios = [s for s in SCENARIOS if names is None or s.name in names]
+    unknown = set(names or ()) - {s.name for s in SCENARIOS}
+    if unknown:
+        raise BenchmarkError(f"Nieznane scenariusze: {', '.join(sorted(unknown))}")
+
+    ctx = Context()
+    results = {}
+    for scenario in scenarios:
+        reason = _unavailable(scenario)
+        results[scenario.name] = {'skipped': reason} if reason else measure(scenario, ctx, iterations, warmup)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return {
+        'created_at': timezone.now().isoformat(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': {'offers': Offer.objects.count(), 'items': OfferItem.objects.count()},
+        'iterations': iterations,
+        'scenarios': results,
+    }
+
+
+# --- PORÓWNANIE Z BAZOWYM WYNIKIEM ---
+
+@dataclass
+class Comparison:
+    scenario: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self):
+        return (self.current - self.baseline) / self.baseline if self.baseline else math.inf
+
+    def is_regression(self, threshold):
+        if self.metric == 'queries':
+            return self.current > self.baseline
+        return self.current > self.baseline * (1 + threshold)
+
+
+def compare(current, baseline):
+    """Lista Comparison dla scenariuszy zmierzonych w obu wynikach."""
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or 'skipped' in result or 'skipped' in before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries'):
+            if metric in before:
+                rows.append(Comparison(name, metric, before[metric], result[metric]))
+    return rows
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(result, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+        f.write('\n')
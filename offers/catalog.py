@@ -0,0 +1,118 @@
+import bisect
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product
+from .search import normalize
+
+# --- PODPOWIEDZI PRODUKTÓW (AUTOCOMPLETE) ---
+# Indeks trzymamy w pamięci procesu: posortowana lista kluczy + bisect.
+# Kluczami są SKU oraz nazwa od początku każdego słowa ("kabel hdmi 2m",
+# "hdmi 2m", "2m"), znormalizowane jak w wyszukiwarce (bez polskich znaków),
+# więc "hdm" i "kab" trafiają w ten sam produkt. Zapytanie o prefiks to
+# bisect_left + kilka porównań - bez bazy danych.
+#
+# Unieważnianie: zapis/usunięcie produktu podbija wersję katalogu w cache
+# Django. Proces porównuje ją ze swoją przy każdym zapytaniu i przy różnicy
+# buduje indeks od nowa. Przy cache lokalnym (LocMemCache, domyślny) inne
+# procesy nie widzą podbicia - dla nich indeks wygasa po CATALOG_INDEX_TTL sekund.
+# Zmiany hurtowe (queryset.update, bulk_create) - wołać invalidate() ręcznie.
+
+VERSION_CACHE_KEY = 'offers:catalog_version'
+MAX_RESULTS = 20
+
+_word_start = re.compile(r'(?:^|(?<=\W))\w')
+
+
+class ProductIndex:
+    """Niezmienny po zbudowaniu - podmieniamy całą instancję, więc czytanie nie wymaga blokady."""
+
+    def __init__(self, products, version=None):
+        entries = []
+        self.products = {}
+        for product in products:
+            self.products[product['id']] = product
+            entries.append((normalize(product['sku']), product['id']))
+            name = normalize(product['name'])
+            entries.extend((name[match.start():], product['id']) for match in _word_start.finditer(name))
+        entries.sort()
+        self.keys = [key for key, _pk in entries]
+        self.ids = [pk for _key, pk in entries]
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def lookup(self, query, limit=10):
+        prefix = normalize(query).strip()
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        position = bisect.bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            pk = self.ids[position]
+            if pk not in seen:
+                seen.add(pk)
+                found.append(self.products[pk])
+                if len(found) >= limit:
+                    break
+            position += 1
+        return found
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _load_products():
+    rows = Product.objects.filter(is_active=True).order_by().values_list(
+        'pk', 'sku', 'name', 'price_pln', 'price_eur', 'vat_rate',
+    )
+    for pk, sku, name, price_pln, price_eur, vat_rate in rows.iterator(chunk_size=5000):
+        yield {
+            'id': pk,
+            'sku': sku,
+            'name': name,
+            'price_pln': str(price_pln),
+            'price_eur': str(price_eur) if price_eur is not None else None,
+            'vat_rate': str(vat_rate),
+        }
+
+
+def get_index():
+    """Aktualny indeks procesu; buduje go przy pierwszym użyciu i po zmianie katalogu."""
+    global _index
+    version = cache.get(VERSION_CACHE_KEY)
+    ttl = getattr(settings, 'CATALOG_INDEX_TTL', 300)
+    index = _index
+    if index is not None and index.version == version and time.monotonic() - index.built_at < ttl:
+        return index
+
+    with _build_lock:
+        # Inny wątek mógł właśnie zbudować indeks
+        index = _index
+        if index is None or index.version != version or time.monotonic() - index.built_at >= ttl:
+            index = _index = ProductIndex(_load_products(), version=version)
+    return index
+
+
+def lookup(query, limit=10):
+    return get_index().lookup(query, limit=min(max(limit, 1), MAX_RESULTS))
+
+
+def invalidate():
+    """Wymusza przebudowę indeksu (w tym procesie od razu, w innych - przez wersję w cache)."""
+    global _index
+    cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+    _index = None
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def _catalog_changed(sender, **kwargs):
+    invalidate()
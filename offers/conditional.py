@@ -0,0 +1,101 @@
+import hashlib
+import json
+import re
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+# --- ŻĄDANIA WARUNKOWE (ETag, Last-Modified, Range) ---
+# Widok liczy walidatory z tego, co i tak wczytuje (wiersz oferty, klucz cache
+# PDF), zanim zacznie renderować. Jeśli przeglądarka albo archiwizator ma już
+# tę wersję (If-None-Match / If-Modified-Since), dostaje 304 bez treści - bez
+# renderowania szablonu i bez WeasyPrinta. Cache-Control: private, no-cache -
+# dane po zalogowaniu, ale każdą kopię wolno użyć dopiero po rewalidacji.
+#
+# Range: jeden zakres bajtów (także "bytes=-500"), więc przerwane pobieranie
+# dużego PDF-a można wznowić; If-Range tylko z ETag-iem. Kilka zakresów naraz
+# nie jest obsługiwane - wtedy, jak pozwala RFC 9110, zwracamy cały plik.
+
+_BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def make_etag(*parts):
+    """Silny ETag (w cudzysłowie) ze skrótu podanych wartości."""
+    raw = json.dumps(parts, sort_keys=True, default=str).encode()
+    return f'"{hashlib.sha256(raw).hexdigest()}"'
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """Odpowiedź 304 (albo 412 przy niespełnionym If-Match), gdy klient ma aktualną wersję; inaczej None."""
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
+
+
+def byte_range(header, size):
+    """(początek, koniec) włącznie albo None, gdy nagłówek pomijamy; RangeNotSatisfiable poza plikiem."""
+    match = _BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # "bytes=-N" - ostatnie N bajtów
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _range_applies(request, etag):
+    # If-Range: zakres tylko dla tej samej wersji (silny ETag), inaczej cały nowy plik.
+    # Daty w If-Range nie uznajemy (RFC 9110 pozwala) - sekundowa data nie gwarantuje,
+    # że fragment pochodzi z tego samego pliku co wcześniej pobrana część.
+    if_range = request.headers.get('If-Range')
+    return not if_range or if_range == etag
+
+
+def ranged_response(request, body, content_type, etag, last_modified=None):
+    """HttpResponse z całą treścią (200), jej zakresem (206) albo 416 - z walidatorami i Accept-Ranges."""
+    size = len(body)
+    selected = None
+    if request.method in ('GET', 'HEAD') and 'Range' in request.headers and _range_applies(request, etag):
+        try:
+            selected = byte_range(request.headers['Range'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return set_validators(response, etag, last_modified)
+
+    if selected is None:
+        response = HttpResponse(body, content_type=content_type)
+    else:
+        start, end = selected
+        response = HttpResponse(body[start:end + 1], content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return set_validators(response, etag, last_modified)
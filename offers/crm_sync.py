@@ -0,0 +1,226 @@
+import itertools
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from . import search
+from .stats import track_offers
+from .models import Client, Company, Offer, SearchDocument, normalize_email, normalize_nip
+
+# --- SYNCHRONIZACJA Z CRM (UPSERT HURTOWY) ---
+# Firmy kluczujemy po nip_normalized (same cyfry), kontakty po email_normalized
+# (małe litery) - obie kolumny mają indeks UNIQUE. Paczka rekordów to jedno
+# INSERT ... ON CONFLICT (klucz) DO UPDATE (bulk_create(update_conflicts=True))
+# zamiast get_or_create na każdy wiersz. Dodatkowo jedno zapytanie na paczkę
+# o stan sprzed zapisu - po nim liczymy, co jest nowe, co się zmieniło,
+# i tylko te rekordy trafiają do indeksu wyszukiwania.
+
+logger = logging.getLogger(__name__)
+
+COMPANY_FIELDS = ('name', 'nip', 'address')
+CLIENT_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'position', 'company_id')
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)  # [(nr wiersza, komunikat)]
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def _text(row, name, max_length=None):
+    value = str(row.get(name) or '').strip()
+    return value[:max_length] if max_length else value
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield batch
+
+
+def _upsert(model, key_field, objects, fields, result):
+    """
+    Zapisuje paczkę obiektów (klucz -> niezapisany obiekt) jednym upsertem.
+    Zwraca klucze rekordów nowych lub zmienionych.
+    """
+    existing = {
+        values[0]: values[1:]
+        for values in model.objects.filter(**{f'{key_field}__in': list(objects)}).values_list(key_field, *fields)
+    }
+    changed = []
+    for key, obj in objects.items():
+        current = existing.get(key)
+        if current is None:
+            result.created += 1
+        elif current != tuple(getattr(obj, name) for name in fields):
+            result.updated += 1
+        else:
+            result.unchanged += 1
+            continue
+        changed.append(key)
+
+    model.objects.bulk_create(
+        [objects[key] for key in changed],
+        update_conflicts=True,
+        unique_fields=[key_field],
+        update_fields=[name.removesuffix('_id') for name in fields],
+    )
+    return changed
+
+
+def _reindex(kind, model, key_field, keys):
+    ids = list(model.objects.filter(**{f'{key_field}__in': keys}).values_list('pk', flat=True))
+    search.reindex(kind, ids)
+    return ids
+
+
+def upsert_companies(rows, batch_size=1000):
+    """
+    Wiersze (nr, dict z kolumnami name, nip, address) -> SyncResult.
+    Firmy bez NIP-u są odrzucane - nie da się ich dopasować przy kolejnej synchronizacji.
+    """
+    result = SyncResult()
+    for batch in _batches(rows, batch_size):
+        companies = {}
+        for line, row in batch:
+            key = normalize_nip(_text(row, 'nip'))
+            name = _text(row, 'name', 200)
+            if not key or not name:
+                result.reject(line, "firma bez nazwy lub NIP-u")
+                continue
+            # Powtórzony NIP w pliku - wygrywa ostatni wiersz
+            companies[key] = Company(
+                name=name, nip=_text(row, 'nip', 20), nip_normalized=key, address=_text(row, 'address'),
+            )
+        if not companies:
+            continue
+        with transaction.atomic():
+            changed = _upsert(Company, 'nip_normalized', companies, COMPANY_FIELDS, result)
+            if changed:
+                # Nazwa firmy jest też w dokumentach jej kontaktów i ofert
+                ids = _reindex(SearchDocument.Kind.COMPANY, Company, 'nip_normalized', changed)
+                search.reindex(SearchDocument.Kind.CLIENT,
+                               Client.objects.filter(company_id__in=ids).values_list('pk', flat=True))
+                search.reindex(SearchDocument.Kind.OFFER,
+                               Offer.objects.filter(client__company_id__in=ids).values_list('pk', flat=True))
+    logger.info("Synchronizacja firm: %d nowych, %d zmienionych, %d bez zmian, %d odrzuconych",
+                result.created, result.updated, result.unchanged, result.rejected)
+    return result
+
+
+def upsert_clients(rows, batch_size=1000):
+    """
+    Wiersze (nr, dict z kolumnami email, first_name, last_name, phone, position,
+    company_nip) -> SyncResult. Firma musi już istnieć (szukana po NIP).
+    """
+    result = SyncResult()
+    for batch in _batches(rows, batch_size):
+        company_ids = dict(Company.objects.filter(
+            nip_normalized__in={normalize_nip(_text(row, 'company_nip')) for _line, row in batch},
+        ).values_list('nip_normalized', 'pk'))
+
+        clients = {}
+        for line, row in batch:
+            key = normalize_email(_text(row, 'email'))
+            company_id = company_ids.get(normalize_nip(_text(row, 'company_nip')))
+            if not key:
+                result.reject(line, "kontakt bez adresu email")
+                continue
+            if company_id is None:
+                result.reject(line, f"nieznana firma (NIP): {_text(row, 'company_nip')!r}")
+                continue
+            clients[key] = Client(
+                email=_text(row, 'email', 254), email_normalized=key, company_id=company_id,
+                first_name=_text(row, 'first_name', 100), last_name=_text(row, 'last_name', 100),
+                phone=_text(row, 'phone', 20), position=_text(row, 'position', 100),
+            )
+        if not clients:
+            continue
+        # Upsert może przenieść kontakt do innej firmy - jego oferty zmieniają kubełek statystyk
+        moved_offers = Offer.objects.filter(client__email_normalized__in=list(clients)).values_list('pk', flat=True)
+        with transaction.atomic(), track_offers(moved_offers):
+            changed = _upsert(Client, 'email_normalized', clients, CLIENT_FIELDS, result)
+            if changed:
+                ids = _reindex(SearchDocument.Kind.CLIENT, Client, 'email_normalized', changed)
+                search.reindex(SearchDocument.Kind.OFFER,
+                               Offer.objects.filter(client_id__in=ids).values_list('pk', flat=True))
+    logger.info("Synchronizacja kontaktów: %d nowych, %d zmienionych, %d bez zmian, %d odrzuconych",
+                result.created, result.updated, result.unchanged, result.rejected)
+    return result
+
+
+# --- SCALANIE DUPLIKATÓW (manage.py merge_crm_duplicates) ---
+# Migracja 0010 nadała klucz tylko najstarszemu rekordowi z danym NIP-em / emailem.
+# Pozostałe zostały z pustym kluczem - nie da się ich zapisać (save() liczy klucz,
+# a ten jest zajęty). Scalamy je tylko na wyraźne polecenie, bo wspólna skrzynka
+# (biuro@...) bywa kilkoma osobami: najpierw --dry-run, potem scalenie. Kontakty
+# i oferty przepinamy na zachowany rekord (ze statystykami i indeksem), duplikaty usuwamy.
+
+
+def _duplicates(model, source, key_field, normalize):
+    """[(zachowywany rekord, [duplikaty])] - rekordy bez klucza, których NIP / email ma już inny rekord."""
+    orphans = defaultdict(list)
+    for obj in model.objects.filter(**{f'{key_field}__isnull': True}).order_by('pk'):
+        key = normalize(getattr(obj, source))
+        if key:
+            orphans[key].append(obj)
+    keepers = model.objects.in_bulk(list(orphans), field_name=key_field)
+    groups = []
+    for key, objs in orphans.items():
+        # Klucz bywa wolny (rekord z kluczem usunięto) - wtedy zostaje najstarszy duplikat
+        keep = keepers.get(key) or objs.pop(0)
+        groups.append((keep, objs))
+    return groups
+
+
+def duplicate_companies():
+    return _duplicates(Company, 'nip', 'nip_normalized', normalize_nip)
+
+
+def duplicate_clients():
+    return _duplicates(Client, 'email', 'email_normalized', normalize_email)
+
+
+def merge_companies(groups):
+    """Przepina kontakty duplikatów na zachowaną firmę i usuwa duplikaty. Zwraca liczbę usuniętych."""
+    removed = 0
+    for keep, duplicates in groups:
+        ids = [obj.pk for obj in duplicates]
+        with transaction.atomic():
+            moved = list(Client.objects.filter(company_id__in=ids).values_list('pk', flat=True))
+            with track_offers(Offer.objects.filter(client_id__in=moved).values_list('pk', flat=True)):
+                Client.objects.filter(pk__in=moved).update(company=keep)
+            search.reindex(SearchDocument.Kind.CLIENT, moved)
+            search.reindex(SearchDocument.Kind.OFFER,
+                           Offer.objects.filter(client_id__in=moved).values_list('pk', flat=True))
+            removed += Company.objects.filter(pk__in=ids).delete()[1].get(Company._meta.label, 0)
+            if keep.nip_normalized is None:
+                keep.save()
+    return removed
+
+
+def merge_clients(groups):
+    """Przepina oferty duplikatów na zachowany kontakt i usuwa duplikaty. Zwraca liczbę usuniętych."""
+    removed = 0
+    for keep, duplicates in groups:
+        ids = [obj.pk for obj in duplicates]
+        with transaction.atomic():
+            moved = list(Offer.objects.filter(client_id__in=ids).values_list('pk', flat=True))
+            with track_offers(moved):
+                Offer.objects.filter(pk__in=moved).update(client=keep)
+            search.reindex(SearchDocument.Kind.OFFER, moved)
+            removed += Client.objects.filter(pk__in=ids).delete()[1].get(Client._meta.label, 0)
+            if keep.email_normalized is None:
+                keep.save()
+    return removed
@@ -0,0 +1,215 @@
+import csv
+import io
+import itertools
+import logging
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import history
+from .models import ExchangeRate, Offer, OfferEvent, OfferItem, recalculate_offer_totals
+
+# --- KURSY WALUT I PRZELICZANIE CEN EUR -> PLN ---
+# Kursy ładujemy z lokalnego pliku EBC (eurofxref*.xml albo *.csv, także
+# pełna historia) do tabeli ExchangeRate - jeden upsert na paczkę dni.
+# EBC podaje kursy względem EUR, więc EUR -> PLN to wprost kolumna PLN,
+# a np. USD -> PLN = PLN / USD.
+#
+# Przeliczenie ofert: price_per_unit = price_in_eur x kurs, zaokrąglone
+# w Decimal (ROUND_HALF_UP, do grosza) - nie w SQL, gdzie SQLite liczyłby na
+# floatach. Zmienione pozycje zapisuje bulk_update, sumy ofert - jeden UPDATE,
+# wszystko w jednej transakcji i bez sygnałów per pozycja.
+
+logger = logging.getLogger(__name__)
+
+RATE_PLACES = Decimal('0.0001')
+PRICE_PLACES = Decimal('0.01')
+EDITABLE_STATUSES = (Offer.Status.DRAFT, Offer.Status.IN_CONSULTATION, Offer.Status.REJECTED)
+
+
+# --- ŁADOWANIE KURSÓW ---
+
+def _ecb_date(value):
+    value = value.strip()
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        # eurofxref.csv (dzienny): "16 October 2026"
+        return datetime.strptime(value, '%d %B %Y').date()
+
+
+def _ecb_rate(value):
+    try:
+        return Decimal(value.strip())
+    except (InvalidOperation, AttributeError):
+        return None  # "N/A" - waluta nie była notowana tego dnia
+
+
+def parse_ecb_xml(fileobj):
+    """(dzień, {waluta: kurs względem EUR}) z pliku eurofxref-daily/hist.xml - strumieniowo."""
+    for _event, element in ET.iterparse(fileobj, events=('end',)):
+        if element.tag.endswith('Cube') and 'time' in element.attrib:
+            rates = {cube.get('currency'): _ecb_rate(cube.get('rate')) for cube in element}
+            yield _ecb_date(element.get('time')), rates
+            element.clear()
+
+
+def parse_ecb_csv(fileobj):
+    """(dzień, {waluta: kurs względem EUR}) z pliku eurofxref.csv / eurofxref-hist.csv."""
+    reader = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    header = [name.strip() for name in next(reader, [])]
+    for values in reader:
+        if not values or not values[0].strip():
+            continue
+        rates = {currency: _ecb_rate(value) for currency, value in zip(header[1:], values[1:]) if currency}
+        yield _ecb_date(values[0]), rates
+
+
+def parse_ecb_file(fileobj):
+    """Format rozpoznawany po pierwszym znaku: '<' = XML, w przeciwnym razie CSV."""
+    buffered = io.BufferedReader(fileobj) if not hasattr(fileobj, 'peek') else fileobj
+    start = buffered.peek(64).lstrip(b'\xef\xbb\xbf \t\r\n')[:1]
+    return parse_ecb_xml(buffered) if start == b'<' else parse_ecb_csv(buffered)
+
+
+def pln_rates(ecb_rates, currencies):
+    """Kursy EBC (względem EUR) -> ile PLN za 1 jednostkę każdej z `currencies`."""
+    pln = ecb_rates.get('PLN')
+    if pln is None:
+        return {}
+    result = {}
+    for currency in currencies:
+        if currency == 'EUR':
+            result[currency] = pln.quantize(RATE_PLACES, rounding=ROUND_HALF_UP)
+        elif ecb_rates.get(currency):
+            result[currency] = (pln / ecb_rates[currency]).quantize(RATE_PLACES, rounding=ROUND_HALF_UP)
+    return result
+
+
+def load_rates(days, currencies=('EUR',), source='ECB', batch_size=1000):
+    """
+    Zapisuje kursy z iteratora (dzień, {waluta: kurs względem EUR}).
+    Upsert po (waluta, dzień) - ponowne wczytanie pliku niczego nie dubluje. Zwraca liczbę kursów.
+    """
+    rows = (
+        ExchangeRate(currency=currency, day=day, rate=rate, source=source)
+        for day, ecb_rates in days
+        for currency, rate in pln_rates(ecb_rates, currencies).items()
+    )
+    saved = 0
+    with transaction.atomic():
+        while batch := list(itertools.islice(rows, batch_size)):
+            ExchangeRate.objects.bulk_create(
+                batch, update_conflicts=True,
+                unique_fields=['currency', 'day'], update_fields=['rate', 'source'],
+            )
+            saved += len(batch)
+    logger.info("Kursy walut: zapisano %d notowań (%s)", saved, source)
+    return saved
+
+
+def current_rate(currency='EUR', day=None):
+    """Ostatni kurs z dnia `day` lub wcześniejszy (EBC nie notuje w weekendy); None, gdy brak."""
+    return (
+        ExchangeRate.objects.filter(currency=currency, day__lte=day or timezone.localdate())
+        .order_by('-day').values_list('rate', flat=True).first()
+    )
+
+
+# --- PRZELICZANIE CEN ---
+
+@dataclass
+class RepriceResult:
+    rate: Decimal
+    offers: int = 0
+    items: int = 0
+
+
+def convert(amount, rate):
+    return (amount * rate).quantize(PRICE_PLACES, rounding=ROUND_HALF_UP)
+
+
+def _lock_editable(offer_ids, batch_size):
+    """Pk ofert, które nadal są w edycji - z blokadą wierszy (SELECT ... FOR UPDATE) do końca transakcji."""
+    locked = []
+    for start in range(0, len(offer_ids), batch_size):
+        locked += Offer.objects.select_for_update().filter(
+            pk__in=offer_ids[start:start + batch_size], status__in=EDITABLE_STATUSES,
+        ).order_by().values_list('pk', flat=True)
+    return locked
+
+
+def reprice_offers(offer_ids, rate, batch_size=1000):
+    """
+    Przelicza ceny PLN pozycji z ceną EUR w podanych ofertach po kursie `rate`
+    i zapisuje kurs w ofercie. Jedna transakcja, zmienione pozycje przez bulk_update.
+    Oferty spoza EDITABLE_STATUSES (także zatwierdzone w międzyczasie) są pomijane.
+    """
+    offer_ids = list(offer_ids)
+    rate = Decimal(rate).quantize(RATE_PLACES, rounding=ROUND_HALF_UP)
+    result = RepriceResult(rate=rate)
+
+    def save(changed):
+        # bulk_update omija sygnały - zmiany cen dopisujemy do historii sami
+        OfferItem.objects.bulk_update(changed, ['price_per_unit'])
+        history.record(
+            OfferEvent(offer_id=item.offer_id, item_id=item.pk, kind=OfferEvent.Kind.ITEM_CHANGED,
+                       changes={'price_per_unit': [old, item.price_per_unit]})
+            for item, old in changed.items()
+        )
+        result.items += len(changed)
+
+    with transaction.atomic():
+        # Status sprawdzamy pod blokadą, w tej samej transakcji co zapis cen
+        offer_ids = _lock_editable(offer_ids, batch_size)
+        result.offers = len(offer_ids)
+        items = (
+            OfferItem.objects.filter(offer_id__in=offer_ids, price_in_eur__isnull=False)
+            .only('pk', 'offer_id', 'price_in_eur', 'price_per_unit').order_by()
+        )
+        changed = {}
+        for item in items.iterator(chunk_size=batch_size):
+            price = convert(item.price_in_eur, rate)
+            if price != item.price_per_unit:
+                changed[item] = item.price_per_unit
+                item.price_per_unit = price
+            if len(changed) >= batch_size:
+                save(changed)
+                changed = {}
+        save(changed)
+
+        for start in range(0, len(offer_ids), batch_size):
+            batch = offer_ids[start:start + batch_size]
+            Offer.objects.filter(pk__in=batch).update(currency_rate=rate, updated_at=timezone.now())
+            recalculate_offer_totals(batch)
+
+    logger.info("Przeliczenie EUR po kursie %s: %d ofert, %d zmienionych pozycji",
+                rate, result.offers, result.items)
+    return result
+
+
+def _rate_or_current(rate):
+    if rate is not None:
+        return rate
+    rate = current_rate('EUR')
+    if rate is None:
+        raise ValueError("Brak kursu EUR w tabeli kursów - wczytaj kursy (manage.py load_exchange_rates).")
+    return rate
+
+
+def reprice_offer(offer, rate=None):
+    """Jedna oferta - tylko w statusie, który pozwala na edycję."""
+    if offer.status not in EDITABLE_STATUSES:
+        raise ValueError("Ceny można przeliczać tylko w ofercie w trakcie edycji.")
+    return reprice_offers([offer.pk], _rate_or_current(rate))
+
+
+def reprice_drafts(rate=None, batch_size=1000):
+    """Wszystkie oferty robocze po podanym (domyślnie najnowszym) kursie EUR."""
+    rate = _rate_or_current(rate)
+    offer_ids = Offer.objects.filter(status=Offer.Status.DRAFT).values_list('pk', flat=True)
+    return reprice_offers(offer_ids, rate, batch_size=batch_size)
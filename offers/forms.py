@@ -1,6 +1,9 @@
 from django import forms
+from django.contrib.auth.models import User
 from django.forms import inlineformset_factory
-from .models import Offer, OfferItem
+from django.urls import reverse_lazy
+from .models import Offer, OfferItem, Company, Seller, SearchDocument, normalize_nip
+from . import search
 
 
 # 1. Formularz Główny
@@ -51,11 +54,14 @@ class OfferForm(forms.ModelForm):
 class OfferItemForm(forms.ModelForm):
     class Meta:
         model = OfferItem
-        fields = ['description', 'quantity', 'price_per_unit', 'price_in_eur']
+        fields = ['description', 'quantity', 'price_per_unit', 'price_in_eur', 'vat_rate']
         widgets = {
             'description': forms.TextInput(attrs={
                 'class': 'form-control',
-                'placeholder': 'Nazwa usługi/produktu'
+                'placeholder': 'Nazwa usługi/produktu lub SKU',
+                # Podpowiedzi z katalogu (skrypt w offer_create.html)
+                'autocomplete': 'off',
+                'data-autocomplete-url': reverse_lazy('product_autocomplete'),
             }),
             'quantity': forms.NumberInput(attrs={
                 'class': 'form-control text-end',
@@ -72,6 +78,7 @@ class OfferItemForm(forms.ModelForm):
                 'step': '0.01',
                 'placeholder': 'EUR'
             }),
+            'vat_rate': forms.Select(attrs={'class': 'form-select'}),
         }
 
 
@@ -81,3 +88,73 @@ OfferItemFormSet = inlineformset_factory(
     extra=1,  # Jeden pusty wiersz na start
     can_delete=True  # Pozwalamy usuwać wiersze
 )
+
+
+# 4. Filtry listy ofert (GET)
+class CompanyNipField(forms.ModelChoiceField):
+    """Firma wskazana NIP-em w dowolnym zapisie - pole tekstowe, bez listy wszystkich firm."""
+
+    def __init__(self, **kwargs):
+        super().__init__(queryset=Company.objects.all(), to_field_name='nip_normalized', **kwargs)
+
+    def to_python(self, value):
+        return super().to_python(normalize_nip(value) if value not in self.empty_values else value)
+
+
+class OfferFilterForm(forms.Form):
+    # Listy wyboru są ograniczone (wystawcy, aktywni pracownicy) - firm może być
+    # dziesiątki tysięcy, więc firmę podaje się NIP-em, a nie z listy.
+    q = forms.CharField(
+        label='Szukaj', required=False, max_length=200,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control form-control-sm',
+            'placeholder': 'Numer, klient, firma, NIP...',
+        }),
+    )
+    status = forms.ChoiceField(
+        label='Status', required=False,
+        choices=[('', 'Wszystkie statusy')] + list(Offer.Status.choices),
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
+    company = CompanyNipField(
+        label='NIP firmy klienta', required=False,
+        error_messages={'invalid_choice': 'Nie ma firmy z tym NIP-em.'},
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm', 'placeholder': 'NIP'}),
+    )
+    seller = forms.ModelChoiceField(
+        label='Wystawca', required=False, queryset=Seller.objects.order_by('name'),
+        empty_label='Wszyscy wystawcy',
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
+    created_by = forms.ModelChoiceField(
+        label='Handlowiec', required=False,
+        queryset=User.objects.filter(is_staff=True, is_active=True).order_by('username'),
+        empty_label='Wszyscy handlowcy',
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
+
+    def load(self):
+        """
+        Waliduje formularz i od razu wczytuje listy wyboru z bazy - potem szablon
+        renderuje go bez zapytań (wymagane w widoku async). Zwraca wynik is_valid().
+        """
+        valid = self.is_bound and self.is_valid()
+        for field in self.fields.values():
+            if isinstance(field.widget, forms.Select) and isinstance(field, forms.ModelChoiceField):
+                field.widget.choices = list(field.choices)
+        return valid
+
+    def filter_queryset(self, queryset):
+        """Zawęża queryset ofert o wybrane filtry (wymaga wcześniejszego is_valid())."""
+        data = self.cleaned_data
+        if data.get('q'):
+            queryset = search.filter_queryset(queryset, SearchDocument.Kind.OFFER, data['q'])
+        if data.get('status'):
+            queryset = queryset.filter(status=data['status'])
+        if data.get('company'):
+            queryset = queryset.filter(client__company=data['company'])
+        if data.get('seller'):
+            queryset = queryset.filter(seller=data['seller'])
+        if data.get('created_by'):
+            queryset = queryset.filter(created_by=data['created_by'])
+        return queryset
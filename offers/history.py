@@ -0,0 +1,238 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Offer, OfferEvent, OfferItem
+
+# --- HISTORIA ZMIAN OFERT (DZIENNIK TYLKO DO DOPISYWANIA) ---
+# Zdarzenia nie są zapisywane od razu. W trakcie żądania trafiają do bufora,
+# a OfferHistoryMiddleware zapisuje cały bufor jednym bulk_create na końcu
+# żądania - zapis oferty nie czeka na INSERT do historii.
+# Do bufora trafiają dopiero po COMMIT-cie (transaction.on_commit), więc
+# wycofana transakcja nie zostawia śladu w historii.
+#
+# Różnicę pól liczymy z wartości zapamiętanych przy odczycie z bazy
+# (LoadedValuesMixin.from_db) - bez dodatkowego SELECT-a przed zapisem.
+# Zmiany przez queryset.update() (akcje w panelu admina) - track_status().
+# Poza żądaniem (komendy, testy) bez collect() zdarzenia zapisują się od razu.
+
+OFFER_FIELDS = ('status', 'rejection_reason', 'client_id', 'seller_id', 'offer_number', 'validity_days',
+                'payment_deadline_days', 'payment_method', 'currency_rate')
+# Długie pola: zapisujemy tylko fakt zmiany, bez treści
+OFFER_FLAG_FIELDS = ('description',)
+ITEM_FIELDS = ('description', 'quantity', 'price_per_unit', 'price_in_eur', 'vat_rate')
+
+
+class _Collector:
+    """
+    Bufor zdarzeń jednego żądania. Zwykły obiekt porównywany po tożsamości - asgiref
+    porównuje wartości ContextVar przy przełączaniu wątków i leniwy request.user
+    trzymany wprost w zmiennej zostałby przy tym wczytany z bazy.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.events = []
+        self.closed = False
+
+
+_collector = ContextVar('offer_history_collector', default=None)
+
+
+def _user_id(user):
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return None
+    return user.pk
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _diff(instance, fields, flag_fields=()):
+    """{pole: [przed, po]} względem wartości z chwili odczytu; pól nieodczytanych nie porównujemy."""
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    changes = {}
+    for name in fields + flag_fields:
+        if name not in loaded:
+            continue
+        old, new = loaded[name], getattr(instance, name)
+        if old != new:
+            changes[name.removesuffix('_id')] = None if name in flag_fields else [_json_value(old), _json_value(new)]
+    return changes
+
+
+def _remember(instance, fields):
+    instance._loaded_values = {
+        **(getattr(instance, '_loaded_values', None) or {}),
+        **{name: getattr(instance, name) for name in fields},
+    }
+
+
+def record(events):
+    """Dopisuje zdarzenia: do bufora żądania po COMMIT-cie albo od razu, gdy bufora nie ma."""
+    events = list(events)
+    if not events:
+        return
+    collector = _collector.get()
+    user_id = _user_id(collector.user if collector else None)
+    for event in events:
+        if event.user_id is None:
+            event.user_id = user_id
+
+    def publish():
+        # COMMIT już po zakończeniu żądania (np. transakcja otwarta poza nim) - zapis od razu
+        if collector is None or collector.closed:
+            OfferEvent.objects.bulk_create(events)
+        else:
+            collector.events.extend(events)
+
+    transaction.on_commit(publish)
+
+
+def flush():
+    """Zapisuje bufor bieżącego żądania jednym INSERT-em. Zwraca liczbę zdarzeń."""
+    collector = _collector.get()
+    if collector is None or not collector.events:
+        return 0
+    events, collector.events = collector.events, []
+    OfferEvent.objects.bulk_create(events, batch_size=500)
+    return len(events)
+
+
+@contextmanager
+def collect(user=None):
+    """Buforuje zdarzenia w bloku i zapisuje je na końcu (middleware: jedno żądanie = jeden blok)."""
+    collector = _Collector(user)
+    token = _collector.set(collector)
+    try:
+        yield
+    finally:
+        try:
+            flush()
+        finally:
+            collector.closed = True
+            _collector.reset(token)
+
+
+@asynccontextmanager
+async def acollect(user=None):
+    """collect() dla middleware w trybie ASGI - bufor zapisywany w wątku, poza pętlą zdarzeń."""
+    collector = _Collector(user)
+    token = _collector.set(collector)
+    try:
+        yield
+    finally:
+        try:
+            await sync_to_async(flush)()
+        finally:
+            collector.closed = True
+            _collector.reset(token)
+
+
+@contextmanager
+def track_status(offer_ids):
+    """
+    Dla zmian statusu przez queryset.update():
+
+        with track_status(ids):
+            Offer.objects.filter(pk__in=ids).update(status=...)
+    """
+    offer_ids = list(offer_ids)
+    with transaction.atomic():
+        before = dict(Offer.objects.filter(pk__in=offer_ids).values_list('pk', 'status'))
+        yield
+        after = Offer.objects.filter(pk__in=offer_ids).values_list('pk', 'status')
+        record(
+            OfferEvent(offer_id=pk, kind=OfferEvent.Kind.STATUS, changes={'status': [before.get(pk), status]})
+            for pk, status in after
+            if before.get(pk) != status
+        )
+
+
+# --- OŚ CZASU (strona szczegółów oferty) ---
+
+def _field_labels(model):
+    return {field.name: str(field.verbose_name) for field in model._meta.concrete_fields}
+
+
+def _display(name, value):
+    if name == 'status':
+        return str(dict(Offer.Status.choices).get(value, value))
+    if name == 'payment_method':
+        return str(dict(Offer.PaymentMethod.choices).get(value, value))
+    return '—' if value in (None, '') else value
+
+
+def _describe(events):
+    labels = {'offer': _field_labels(Offer), 'item': _field_labels(OfferItem)}
+    for event in events:
+        names = labels['item' if event.item_id else 'offer']
+        event.lines = [
+            (names.get(name, name), None, None) if values is None
+            else (names.get(name, name), _display(name, values[0]), _display(name, values[1]))
+            for name, values in (event.changes or {}).items()
+        ]
+    return events
+
+
+def timeline(offer, limit=50):
+    """Ostatnie zdarzenia oferty z czytelnymi opisami zmian - jedno zapytanie po indeksie (oferta, czas)."""
+    return _describe(list(offer.events.select_related('user')[:limit]))
+
+
+async def atimeline(offer, limit=50):
+    """timeline() dla widoków async."""
+    return _describe([event async for event in offer.events.select_related('user')[:limit]])
+
+
+# --- SYGNAŁY (podpinane w OffersConfig.ready) ---
+
+@receiver(post_save, sender=Offer)
+def _offer_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record([OfferEvent(offer_id=instance.pk, kind=OfferEvent.Kind.CREATED,
+                           changes={'status': [None, instance.status]})])
+    else:
+        changes = _diff(instance, OFFER_FIELDS, OFFER_FLAG_FIELDS)
+        if changes:
+            kind = OfferEvent.Kind.STATUS if 'status' in changes else OfferEvent.Kind.CHANGED
+            record([OfferEvent(offer_id=instance.pk, kind=kind, changes=changes)])
+    _remember(instance, OFFER_FIELDS + OFFER_FLAG_FIELDS)
+
+
+@receiver(post_delete, sender=Offer)
+def _offer_deleted(sender, instance, **kwargs):
+    record([OfferEvent(offer_id=instance.pk, kind=OfferEvent.Kind.DELETED,
+                       changes={'offer_number': [instance.offer_number, None]})])
+
+
+@receiver(post_save, sender=OfferItem)
+def _item_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        changes = {name: [None, _json_value(getattr(instance, name))] for name in ITEM_FIELDS}
+        record([OfferEvent(offer_id=instance.offer_id, item_id=instance.pk, kind=OfferEvent.Kind.ITEM_ADDED,
+                           changes=changes)])
+    else:
+        changes = _diff(instance, ITEM_FIELDS)
+        if changes:
+            record([OfferEvent(offer_id=instance.offer_id, item_id=instance.pk,
+                               kind=OfferEvent.Kind.ITEM_CHANGED, changes=changes)])
+    _remember(instance, ITEM_FIELDS)
+
+
+@receiver(post_delete, sender=OfferItem)
+def _item_deleted(sender, instance, **kwargs):
+    record([OfferEvent(offer_id=instance.offer_id, item_id=instance.pk, kind=OfferEvent.Kind.ITEM_REMOVED,
+                       changes={'description': [instance.description, None]})])
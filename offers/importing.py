@@ -0,0 +1,332 @@
+import csv
+import io
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import search, stats
+from .models import (Client, Offer, OfferItem, Seller, SearchDocument, normalize_email, normalize_nip,
+                     recalculate_offer_totals)
+
+# --- IMPORT HURTOWY OFERT ---
+# Jeden wiersz pliku = jedna pozycja oferty, kolumny oferty powtarzają się
+# w każdym wierszu jej pozycji:
+#
+#   offer_number;created_at;status;seller;client;description;quantity;price_per_unit;price_in_eur;vat_rate
+#
+# seller - NIP albo nazwa wystawcy, client - email klienta.
+# Plik czytamy strumieniowo, w paczkach po `chunk_size` wierszy. Klienci
+# i wystawcy są rozwiązywani przez słowniki w pamięci (jedno zapytanie na
+# początku), oferty i pozycje idą przez bulk_create, a sumy, statystyki
+# dashboardu i indeks wyszukiwania liczymy raz na końcu. Oferty, które już są w bazie, są
+# pomijane, więc ponowny import tego samego pliku nie dubluje pozycji.
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('offer_number', 'client', 'description', 'quantity', 'price_per_unit')
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFileError(ValueError):
+    """Pliku nie da się czytać (format, brak kolumn)."""
+
+
+@dataclass
+class ImportResult:
+    offers_created: int = 0
+    items_created: int = 0
+    offers_skipped: int = 0
+    rows_rejected: int = 0
+    errors: list = field(default_factory=list)  # [(nr wiersza, komunikat)], najwyżej MAX_REPORTED_ERRORS
+    seconds: float = 0.0
+
+    def reject(self, line, message):
+        self.rows_rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+# --- CZYTANIE PLIKÓW ---
+
+def _normalize_header(header):
+    return [(name or '').strip().lower() for name in header]
+
+
+def iter_csv_rows(fileobj, encoding='utf-8-sig'):
+    """(nr wiersza, dict) z binarnego pliku CSV; separator (, ; tab) wykrywany z nagłówka."""
+    text = io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+    header_line = text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(itertools.chain([header_line], text), dialect)
+    header = _normalize_header(next(reader, []))
+    for line, values in enumerate(reader, start=2):
+        if any(values):
+            yield line, dict(zip(header, values))
+
+
+def iter_xlsx_rows(fileobj):
+    """(nr wiersza, dict) z pierwszego arkusza XLSX (openpyxl w trybie read_only - bez ładowania całości)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("Import XLSX wymaga pakietu openpyxl (pip install openpyxl).")
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = _normalize_header(str(v) if v is not None else '' for v in next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            if any(v not in (None, '') for v in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, file_format):
+    if file_format == 'csv':
+        return iter_csv_rows(fileobj)
+    if file_format == 'xlsx':
+        return iter_xlsx_rows(fileobj)
+    raise ImportFileError(f"Nieobsługiwany format pliku: {file_format}")
+
+
+def guess_format(filename):
+    return 'xlsx' if str(filename).lower().endswith('.xlsx') else 'csv'
+
+
+# --- PARSOWANIE WARTOŚCI ---
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+def _decimal(value, default=None):
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    text = _text(value).replace('\xa0', '').replace(' ', '').replace(',', '.')
+    if not text:
+        if default is None:
+            raise ValueError("brak wartości liczbowej")
+        return default
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"niepoprawna liczba: {value!r}")
+
+
+def _quantity(value):
+    quantity = _decimal(value)
+    if quantity < 0 or quantity != quantity.to_integral_value():
+        raise ValueError(f"ilość musi być liczbą całkowitą: {value!r}")
+    return int(quantity)
+
+
+def _created_at(value):
+    if value is None or _text(value) == '':
+        return None
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        moment = datetime.combine(value, datetime.min.time())
+    else:
+        moment = parse_datetime(_text(value))
+        if moment is None:
+            day = parse_date(_text(value))
+            if day is None:
+                raise ValueError(f"niepoprawna data: {value!r}")
+            moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Lookups:
+    """Słowniki klient/wystawca/status w pamięci - żadnego zapytania na wiersz."""
+
+    def __init__(self):
+        self.clients = dict(
+            Client.objects.exclude(email_normalized=None).values_list('email_normalized', 'pk')
+        )
+        self.sellers_by_name, self.sellers_by_nip = {}, {}
+        for pk, name, nip in Seller.objects.values_list('pk', 'name', 'nip'):
+            self.sellers_by_name[name.strip().lower()] = pk
+            self.sellers_by_nip[normalize_nip(nip)] = pk
+        self.statuses = {value: value for value in Offer.Status.values}
+        self.statuses.update({str(label).lower(): value for value, label in Offer.Status.choices})
+        self.vat_rates = {rate for rate, _label in OfferItem.VAT_RATES}
+
+    def client_id(self, value):
+        try:
+            return self.clients[normalize_email(_text(value))]
+        except KeyError:
+            raise ValueError(f"nieznany klient (email): {value!r}")
+
+    def seller_id(self, value):
+        text = _text(value)
+        if not text:
+            return None
+        pk = self.sellers_by_name.get(text.lower()) or self.sellers_by_nip.get(normalize_nip(text))
+        if pk is None:
+            raise ValueError(f"nieznany wystawca: {value!r}")
+        return pk
+
+    def status(self, value):
+        text = _text(value)
+        if not text:
+            return Offer.Status.DRAFT
+        try:
+            return self.statuses[text.lower()]
+        except KeyError:
+            raise ValueError(f"nieznany status: {value!r}")
+
+    def vat_rate(self, value):
+        rate = _decimal(value, default=Decimal('23')).quantize(Decimal('0.01'))
+        if rate not in self.vat_rates:
+            raise ValueError(f"niedozwolona stawka VAT: {value!r}")
+        return rate
+
+
+def _offer_from_row(row, lookups, user):
+    offer = Offer(
+        offer_number=_text(row['offer_number']),
+        client_id=lookups.client_id(row.get('client')),
+        seller_id=lookups.seller_id(row.get('seller')),
+        status=lookups.status(row.get('status')),
+        created_by=user,
+    )
+    offer._imported_created_at = _created_at(row.get('created_at'))
+    return offer
+
+
+def _item_from_row(row, lookups):
+    description = _text(row.get('description'))
+    if not description:
+        raise ValueError("brak nazwy pozycji")
+    price_in_eur = row.get('price_in_eur')
+    return OfferItem(
+        description=description[:200],
+        quantity=_quantity(row.get('quantity')),
+        price_per_unit=_decimal(row.get('price_per_unit')),
+        price_in_eur=_decimal(price_in_eur) if _text(price_in_eur) else None,
+        vat_rate=lookups.vat_rate(row.get('vat_rate')),
+    )
+
+
+# --- IMPORT ---
+
+def _import_chunk(chunk, lookups, imported, skipped, result, batch_size, user):
+    new_offers = {}  # numer -> niezapisana Offer
+    items = []  # (numer, niezapisana OfferItem, nr wiersza)
+    for line, row in chunk:
+        number = _text(row.get('offer_number'))
+        if not number:
+            result.reject(line, "brak numeru oferty")
+            continue
+        if number in skipped:
+            continue
+        try:
+            if number not in imported and number not in new_offers:
+                new_offers[number] = _offer_from_row(row, lookups, user)
+            items.append((number, _item_from_row(row, lookups), line))
+        except ValueError as exc:
+            result.reject(line, str(exc))
+
+    # Oferty sprzed importu zostawiamy w spokoju - jedno zapytanie na paczkę
+    for number in Offer.objects.filter(offer_number__in=list(new_offers)).values_list('offer_number', flat=True):
+        del new_offers[number]
+        skipped.add(number)
+        result.offers_skipped += 1
+
+    with transaction.atomic():
+        created = Offer.objects.bulk_create(new_offers.values(), batch_size=batch_size)
+        # auto_now_add nadpisuje created_at przy INSERT - historyczne daty wstawiamy
+        # potem jednym UPDATE ... CASE na paczkę (bulk_update nie wywołuje auto_now_add)
+        dated = []
+        for offer in created:
+            if offer._imported_created_at:
+                offer.created_at = offer._imported_created_at
+                dated.append(offer)
+        Offer.objects.bulk_update(dated, ['created_at'], batch_size=batch_size)
+        imported.update((offer.offer_number, offer.pk) for offer in created)
+
+        to_create = []
+        for number, item, line in items:
+            if number in imported:
+                item.offer_id = imported[number]
+                to_create.append(item)
+            elif number not in skipped:
+                result.reject(line, f"pozycja oferty {number} bez poprawnego nagłówka")
+        OfferItem.objects.bulk_create(to_create, batch_size=batch_size)
+
+    result.offers_created += len(created)
+    result.items_created += len(to_create)
+
+
+def _finish(offer_ids, batch_size):
+    """
+    Sumy, statystyki i indeks wyszukiwania - raz na ofertę, na końcu importu.
+    Oferty z bulk_create nie przeszły przez sygnały, więc do statystyk trafiają
+    tu w całości (przed = brak oferty), jednym przejściem po kubełkach.
+    """
+    offer_ids = list(offer_ids)
+    after = {}
+    with transaction.atomic():
+        for start in range(0, len(offer_ids), batch_size):
+            batch = offer_ids[start:start + batch_size]
+            recalculate_offer_totals(batch, track_stats=False)
+            after.update(stats.snapshot_offers(batch))
+        stats.apply_changes({}, after)
+    search.reindex(SearchDocument.Kind.OFFER, offer_ids, batch_size=batch_size)
+
+
+def import_offers(rows, chunk_size=2000, batch_size=1000, user=None):
+    """
+    Importuje oferty z pozycjami z iteratora (nr wiersza, dict) - patrz iter_rows().
+    Zwraca ImportResult; błędne wiersze są pomijane i raportowane, reszta wchodzi.
+    """
+    started = time.perf_counter()
+    result = ImportResult()
+    lookups = Lookups()
+    imported = {}  # numer -> pk ofert utworzonych w tym imporcie (pozycje mogą być w kolejnych paczkach)
+    skipped = set()
+
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return result
+    missing = [name for name in REQUIRED_COLUMNS if name not in first[1]]
+    if missing:
+        raise ImportFileError(f"Brak kolumn: {', '.join(missing)}")
+    rows = itertools.chain([first], rows)
+
+    try:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            _import_chunk(chunk, lookups, imported, skipped, result, batch_size, user)
+    except BaseException:
+        # Także po przerwaniu - zatwierdzone paczki muszą mieć poprawne sumy.
+        # Błąd przy tym tylko logujemy, żeby nie przykrył błędu samego importu.
+        try:
+            _finish(imported.values(), batch_size)
+        except Exception:
+            logger.exception("Nie udało się przeliczyć sum i indeksu po przerwanym imporcie")
+        raise
+    _finish(imported.values(), batch_size)
+
+    result.seconds = time.perf_counter() - started
+    logger.info(
+        "Import ofert: %d ofert, %d pozycji, %d pominiętych ofert, %d błędnych wierszy w %.1f s",
+        result.offers_created, result.items_created, result.offers_skipped, result.rows_rejected, result.seconds,
+    )
+    return result
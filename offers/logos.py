@@ -0,0 +1,121 @@
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Seller
+from .pdf_cache import file_digest
+
+# --- LOGO DO PDF (WERSJE DO DRUKU) ---
+# Logo wystawcy to dowolny plik wgrany przez użytkownika - bywa zdjęciem
+# 6000x4000 z telefonu. W PDF-ie zajmuje najwyżej 80px wysokości (szablon
+# offer_pdf.html), więc WeasyPrint nie musi dekodować i osadzać oryginału.
+#
+# Z oryginału robimy raz wersję zmniejszoną do PRINT_BOX (300 DPI przy 80px
+# wysokości), obróconą wg EXIF, bez metadanych: PNG, gdy logo ma
+# przezroczystość, inaczej JPEG. Nazwa pliku to skrót zawartości oryginału -
+# ten sam plik wgrany dwa razy ma jedną wersję, podmiana logo daje nową nazwę
+# (i nowy klucz cache PDF). Wersję tworzymy po zapisie wystawcy, a gdyby jej
+# brakowało (np. logo sprzed tej zmiany) - przy pierwszym renderze PDF.
+#
+# Układ na dysku: <LOGO_RENDITIONS_DIR>/<skrót>-<szer>x<wys>-v<wersja>.(png|jpg)
+
+logger = logging.getLogger(__name__)
+
+PRINT_BOX = (1000, 250)  # px; 250 px = 80 px CSS przy 300 DPI
+JPEG_QUALITY = 85
+
+# Podbić (razem z CACHE_VERSION w pdf_cache.py), gdy zmieni się sposób przetwarzania
+RENDITION_VERSION = 1
+
+
+def _renditions_dir():
+    return getattr(settings, 'LOGO_RENDITIONS_DIR', os.path.join(settings.MEDIA_ROOT, 'logo_renditions'))
+
+
+def _rendition_name(digest, extension):
+    width, height = PRINT_BOX
+    return f"{digest[:32]}-{width}x{height}-v{RENDITION_VERSION}.{extension}"
+
+
+def _existing_rendition(digest):
+    for extension in ('png', 'jpg'):
+        path = os.path.join(_renditions_dir(), _rendition_name(digest, extension))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def _process(source_path):
+    """Zmniejszony obraz gotowy do zapisu: (obraz Pillow, rozszerzenie, opcje save())."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        # JPEG dekoduje od razu w mniejszej skali - nie rozpakowujemy całego zdjęcia
+        image.draft('RGB', PRINT_BOX)
+        image = ImageOps.exif_transpose(image)
+        if _has_alpha(image):
+            image = image.convert('RGBA')
+            image.thumbnail(PRINT_BOX, Image.Resampling.LANCZOS)
+            return image, 'png', {'optimize': True}
+        image = image.convert('RGB')
+        image.thumbnail(PRINT_BOX, Image.Resampling.LANCZOS)
+        return image, 'jpg', {'quality': JPEG_QUALITY, 'optimize': True}
+
+
+def ensure_rendition(source_path):
+    """Ścieżka do wersji logo do druku; tworzy ją, jeśli jeszcze nie istnieje. None, gdy nie ma oryginału."""
+    digest = file_digest(source_path)
+    if digest is None:
+        return None
+    path = _existing_rendition(digest)
+    if path:
+        return path
+
+    image, extension, options = _process(source_path)
+    directory = _renditions_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, _rendition_name(digest, extension))
+    # Zapis atomowy - równoległy render PDF nie przeczyta połowy pliku
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format='PNG' if extension == 'png' else 'JPEG', **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        image.close()
+    return path
+
+
+def seller_logo_path(seller):
+    """
+    Plik logo wystawcy do osadzenia w PDF: wersja do druku, a gdy Pillow nie
+    poradzi sobie z plikiem - oryginał. None, gdy logo nie ma na dysku.
+    """
+    if not seller or not seller.logo:
+        return None
+    source_path = seller.logo.path
+    try:
+        return ensure_rendition(source_path)
+    except Exception:
+        logger.warning("Nie udało się przetworzyć logo wystawcy %s: %s", seller.pk, source_path, exc_info=True)
+        return source_path if os.path.isfile(source_path) else None
+
+
+@receiver(post_save, sender=Seller)
+def _prepare_logo(sender, instance, **kwargs):
+    # Wersję do druku robimy od razu po wgraniu, a nie przy pierwszym PDF-ie
+    if instance.logo:
+        transaction.on_commit(lambda: seller_logo_path(instance))
@@ -0,0 +1,187 @@
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import history
+from .models import Offer, OutboundEmail
+from .pdf import PDF_QUERYSET_RELATED, get_or_render_pdf
+from .stats import track_offers
+
+# --- WYSYŁKA OFERT MAILEM (KOLEJKA W BAZIE) ---
+# Widok tylko zapisuje wiadomość w tabeli OutboundEmail - żądanie nigdy nie
+# czeka na połączenie z serwerem SMTP. `manage.py email_worker` bierze
+# wiadomości paczkami i wysyła je jednym, otwartym połączeniem SMTP
+# (zamykanym dopiero, gdy kolejka jest pusta). PDF dołączany przy wysyłce -
+# z cache albo renderowany raz (offers/pdf.py).
+#
+# Błąd przejściowy -> ponowienie po 1, 2, 4... min (EMAIL_RETRY_BASE_DELAY),
+# odrzucony adres -> od razu błąd. Po wysłaniu oferta przechodzi w status SENT.
+# Oferta, która przed wysyłką przestała być zatwierdzona (szkic, odrzucona),
+# nie wychodzi - wiadomość dostaje status "anulowany".
+
+SENDABLE_STATUSES = (Offer.Status.APPROVED, Offer.Status.SENT)
+ACTIVE_STATUSES = (OutboundEmail.Status.QUEUED, OutboundEmail.Status.SENDING)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Adres nie do naprawienia ponowieniem
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_offer_email(offer, user=None):
+    """
+    Wrzuca ofertę do kolejki wysyłki na adres klienta. Oferta czekająca już
+    w kolejce nie jest dodawana drugi raz. ValueError, gdy nie da się wysłać.
+    """
+    if offer.status not in SENDABLE_STATUSES:
+        raise ValueError("Wysłać można tylko zatwierdzoną ofertę.")
+    if offer.client is None or not offer.client.email:
+        raise ValueError("Klient oferty nie ma adresu e-mail.")
+
+    email = offer.emails.filter(status__in=ACTIVE_STATUSES).first()
+    if email:
+        return email
+    return OutboundEmail.objects.create(
+        offer=offer,
+        to=offer.client.email,
+        subject=f"Oferta {offer.offer_number}",
+        body=render_to_string('offers/email/offer_email.txt', {'offer': offer}),
+        requested_by=user,
+    )
+
+
+def has_due():
+    return OutboundEmail.objects.filter(status=OutboundEmail.Status.QUEUED, next_attempt_at__lte=timezone.now()).exists()
+
+
+def claim_batch(limit):
+    """
+    Przejmuje do `limit` wiadomości, których termin minął - warunkowy UPDATE, jak w kolejce PDF.
+    Wiadomości ofert, które od zlecenia wróciły do szkicu albo zostały odrzucone, anuluje.
+    """
+    now = timezone.now()
+    candidates = list(
+        OutboundEmail.objects.filter(status=OutboundEmail.Status.QUEUED, next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    OutboundEmail.objects.filter(pk__in=candidates, status=OutboundEmail.Status.QUEUED).exclude(
+        offer__status__in=SENDABLE_STATUSES,
+    ).update(status=OutboundEmail.Status.CANCELLED, error="Oferta nie jest już zatwierdzona.")
+    claimed = []
+    for pk in candidates:
+        updated = OutboundEmail.objects.filter(
+            pk=pk, status=OutboundEmail.Status.QUEUED, offer__status__in=SENDABLE_STATUSES,
+        ).update(status=OutboundEmail.Status.SENDING, started_at=now, attempts=F('attempts') + 1)
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def requeue_stale(older_than):
+    """Wiadomości 'sending' porzucone przez martwego workera wracają do kolejki."""
+    return OutboundEmail.objects.filter(
+        status=OutboundEmail.Status.SENDING, started_at__lt=timezone.now() - older_than,
+    ).update(status=OutboundEmail.Status.QUEUED)
+
+
+def retry_delay(attempts):
+    base = timedelta(seconds=getattr(settings, 'EMAIL_RETRY_BASE_DELAY', 60))
+    return min(base * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+def build_message(email, connection):
+    offer = email.offer
+    message = EmailMessage(email.subject, email.body, to=[email.to], connection=connection)
+    with open(get_or_render_pdf(offer), 'rb') as f:
+        filename = f"Oferta_{offer.offer_number.replace('/', '_')}.pdf"
+        message.attach(filename, f.read(), 'application/pdf')
+    return message
+
+
+def _mark_failed(email, error, max_attempts):
+    if isinstance(error, PERMANENT_ERRORS) or email.attempts >= max_attempts:
+        status, next_attempt_at = OutboundEmail.Status.FAILED, email.next_attempt_at
+    else:
+        status, next_attempt_at = OutboundEmail.Status.QUEUED, timezone.now() + retry_delay(email.attempts)
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status=status, error=str(error)[:2000], next_attempt_at=next_attempt_at,
+    )
+    return status
+
+
+def _mark_offers_sent(offer_ids):
+    # queryset.update() omija sygnały - statystyki i historię prowadzimy ręcznie
+    with track_offers(offer_ids), history.track_status(offer_ids):
+        Offer.objects.filter(pk__in=offer_ids, status=Offer.Status.APPROVED).update(
+            status=Offer.Status.SENT, updated_at=timezone.now(),
+        )
+
+
+def send_batch(connection, limit=50, max_attempts=5):
+    """
+    Wysyła do `limit` wiadomości otwartym połączeniem `connection`
+    (django.core.mail.get_connection()). Zwraca (wysłane, nieudane).
+    Gdy serwer SMTP jest nieosiągalny, reszta paczki wraca do kolejki, a wyjątek leci dalej.
+    """
+    claimed = claim_batch(limit)
+    emails = list(
+        OutboundEmail.objects.filter(pk__in=claimed)
+        .select_related(*(f'offer__{name}' for name in PDF_QUERYSET_RELATED))
+        .order_by('next_attempt_at')
+    )
+    sent, failed = [], 0
+    try:
+        for position, email in enumerate(emails):
+            try:
+                message = build_message(email, connection)
+            except Exception as e:
+                # Np. błąd renderowania PDF - połączenie SMTP jest w porządku
+                failed += 1
+                logger.warning("E-mail %s: nie udało się przygotować wiadomości: %s -> %s",
+                               email.pk, e, _mark_failed(email, e, max_attempts))
+                continue
+            try:
+                connection.send_messages([message])
+            except OSError as e:  # smtplib.SMTPException też dziedziczy po OSError
+                failed += 1
+                logger.warning("E-mail %s do %s: %s -> %s", email.pk, email.to, e,
+                               _mark_failed(email, e, max_attempts))
+                if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                    # Zerwane połączenie - otwieramy nowe dla reszty paczki
+                    connection.close()
+                    try:
+                        connection.open()
+                    except OSError:
+                        _requeue([other.pk for other in emails[position + 1:]])
+                        raise
+            else:
+                sent.append(email)
+    finally:
+        if sent:
+            with transaction.atomic():
+                OutboundEmail.objects.filter(pk__in=[email.pk for email in sent]).update(
+                    status=OutboundEmail.Status.SENT, error='', sent_at=timezone.now(),
+                )
+                _mark_offers_sent({email.offer_id for email in sent})
+    return len(sent), failed
+
+
+def _requeue(email_ids):
+    OutboundEmail.objects.filter(pk__in=email_ids, status=OutboundEmail.Status.SENDING).update(
+        status=OutboundEmail.Status.QUEUED, next_attempt_at=timezone.now() + retry_delay(1),
+    )
+
+
+def delete_sent(older_than=timedelta(days=30)):
+    return OutboundEmail.objects.filter(
+        status=OutboundEmail.Status.SENT, sent_at__lt=timezone.now() - older_than,
+    ).delete()[0]
@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from offers import mailing
+
+
+def _discard(connection):
+    """Zamyka połączenie po błędzie - gniazdo bywa w połowie otwarte, kolejny błąd już nas nie obchodzi."""
+    try:
+        connection.close()
+    except OSError:
+        pass
+
+
+class Command(BaseCommand):
+    help = ("Worker kolejki e-mail: wysyła oferty z tabeli OutboundEmail paczkami, "
+            "jednym połączeniem SMTP, z ponowieniami.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Ile wiadomości brać z kolejki naraz.")
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help="Co ile sekund sprawdzać kolejkę, gdy jest pusta.")
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help="Ile razy ponawiać wysyłkę, zanim wiadomość zostanie oznaczona jako błąd.")
+        parser.add_argument('--stale-after', type=int, default=10,
+                            help="Po ilu minutach wiadomość 'sending' uznajemy za porzuconą.")
+        parser.add_argument('--once', action='store_true',
+                            help="Wyślij wszystko, co czeka, i zakończ (np. z crona).")
+
+    def handle(self, *args, **options):
+        requeued = mailing.requeue_stale(timedelta(minutes=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"Przywrócono do kolejki porzucone wiadomości: {requeued}")
+        mailing.delete_sent()
+
+        self.stdout.write("Worker e-mail wystartował.")
+        connection = None
+        try:
+            while True:
+                if not mailing.has_due():
+                    # Pusta kolejka - nie trzymamy bezczynnego połączenia SMTP
+                    if connection is not None:
+                        connection.close()
+                        connection = None
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if connection is None:
+                    connection = get_connection()
+                    try:
+                        connection.open()
+                    except OSError as e:
+                        _discard(connection)
+                        connection = None
+                        self.stderr.write(f"Brak połączenia z serwerem SMTP: {e}")
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+
+                try:
+                    sent, failed = mailing.send_batch(connection, limit=options['batch_size'],
+                                                      max_attempts=options['max_attempts'])
+                except OSError as e:
+                    _discard(connection)
+                    connection = None
+                    self.stderr.write(f"Połączenie SMTP zerwane: {e}")
+                    time.sleep(options['poll_interval'])
+                    continue
+                self.stdout.write(f"Wysłano: {sent}, nieudane: {failed}")
+        except KeyboardInterrupt:
+            self.stdout.write("Zatrzymywanie workera...")
+        finally:
+            if connection is not None:
+                connection.close()
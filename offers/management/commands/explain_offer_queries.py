@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from offers import query_plans
+
+
+class Command(BaseCommand):
+    help = ("Wypisuje plany (EXPLAIN) głównych zapytań o oferty - lista z filtrami, kolejka CEO, admin, "
+            "szczegóły, zmiana statusu - i zaznacza pełne skany tabel. SQLite i PostgreSQL.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help="PostgreSQL: EXPLAIN ANALYZE (wykonuje zapytania, pokazuje rzeczywiste czasy).")
+        parser.add_argument('--no-seqscan', action='store_true',
+                            help="PostgreSQL: enable_seqscan = off - na małej bazie planner i tak wybrałby "
+                                 "skan, a chcemy zobaczyć, którego indeksu użyje.")
+        parser.add_argument('--strict', action='store_true',
+                            help="Zakończ błędem, jeśli któreś zapytanie czyta tabelę w całości.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['no_seqscan'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            queries = query_plans.main_queries()
+            if not queries:
+                raise CommandError("Brak ofert w bazie - nie ma czego planować (np. manage.py seed_offers).")
+
+            scanning = []
+            for name, queryset in queries:
+                plan = query_plans.explain(queryset, analyze=options['analyze'])
+                scans = query_plans.full_scans(plan)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+                self.stdout.write(plan)
+                if scans:
+                    scanning.append(name)
+                    self.stdout.write(self.style.ERROR(f"   pełny skan: {', '.join(scans)}"))
+                if query_plans.sorts_outside_index(plan):
+                    self.stdout.write(self.style.WARNING("   sortowanie poza indeksem"))
+                self.stdout.write("")
+
+        if scanning:
+            message = f"Pełne skany w {len(scanning)} z {len(queries)} zapytań: {', '.join(scanning)}"
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(queries)} zapytań, żadne nie czyta tabeli w całości."))
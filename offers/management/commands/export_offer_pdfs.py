@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from offers.models import Offer
+from offers.pdf_export import stream_offers_zip
+
+
+class Command(BaseCommand):
+    help = "Zapisuje PDF-y wybranych ofert do jednego archiwum ZIP (renderowanie równoległe)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Ścieżka pliku ZIP, np. archiwum_2026_10.zip")
+        parser.add_argument('--status', choices=Offer.Status.values, help="Tylko oferty o danym statusie.")
+        parser.add_argument('--since', help="Utworzone od dnia (RRRR-MM-DD).")
+        parser.add_argument('--until', help="Utworzone do dnia włącznie (RRRR-MM-DD).")
+        parser.add_argument('--ids', nargs='+', type=int, help="Konkretne ID ofert.")
+        parser.add_argument('--workers', type=int, help="Liczba procesów renderujących.")
+
+    def handle(self, *args, **options):
+        queryset = Offer.objects.order_by('created_at', 'pk')
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+        for name, lookup in (('since', 'created_at__date__gte'), ('until', 'created_at__date__lte')):
+            if options[name]:
+                day = parse_date(options[name])
+                if day is None:
+                    raise CommandError(f"Niepoprawna data --{name}: {options[name]}")
+                queryset = queryset.filter(**{lookup: day})
+
+        count = queryset.count()
+        written = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in stream_offers_zip(queryset, workers=options['workers']):
+                f.write(chunk)
+                written += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Zapisano {count} ofert do {options['output']} ({written / 1024:.0f} KB)."
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from offers.importing import ImportFileError, guess_format, import_offers, iter_rows
+
+
+class Command(BaseCommand):
+    help = ("Import hurtowy ofert z pozycjami z pliku CSV/XLSX (jeden wiersz = jedna pozycja). "
+            "Kolumny: offer_number, created_at, status, seller, client, description, quantity, "
+            "price_per_unit, price_in_eur, vat_rate.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Plik .csv albo .xlsx")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help="Domyślnie wg rozszerzenia pliku.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Wierszy pliku na paczkę.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rekordów na jeden INSERT.")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_offers(
+                    iter_rows(f, file_format),
+                    chunk_size=options['chunk_size'], batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for line, message in result.errors:
+            self.stderr.write(f"Wiersz {line}: {message}")
+        if result.rows_rejected > len(result.errors):
+            self.stderr.write(f"... oraz {result.rows_rejected - len(result.errors)} kolejnych błędów.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Zaimportowano {result.offers_created} ofert i {result.items_created} pozycji "
+            f"w {result.seconds:.1f} s (pominięte istniejące oferty: {result.offers_skipped}, "
+            f"błędne wiersze: {result.rows_rejected})."
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from offers.currency import load_rates, parse_ecb_file
+
+
+class Command(BaseCommand):
+    help = ("Wczytuje kursy walut z lokalnego pliku EBC (eurofxref-daily.xml, eurofxref-hist.xml, "
+            "eurofxref.csv, eurofxref-hist.csv) do tabeli kursów.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Plik XML lub CSV z EBC.")
+        parser.add_argument('--currencies', nargs='+', default=['EUR'],
+                            help="Waluty do zapisania jako kurs w PLN (domyślnie EUR).")
+
+    def handle(self, *args, **options):
+        currencies = [currency.upper() for currency in options['currencies']]
+        try:
+            with open(options['path'], 'rb') as f:
+                saved = load_rates(parse_ecb_file(f), currencies=currencies)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except ValueError as exc:
+            raise CommandError(f"Niepoprawny plik kursów: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"Zapisano {saved} kursów ({', '.join(currencies)})."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from offers.crm_sync import duplicate_clients, duplicate_companies, merge_clients, merge_companies
+
+
+class Command(BaseCommand):
+    help = ("Scala firmy i kontakty z tym samym NIP-em / emailem, które migracja 0010 zostawiła bez klucza. "
+            "Kontakty i oferty duplikatów trafiają do zachowanego rekordu, duplikaty są usuwane.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Tylko wypisuje duplikaty, niczego nie zmienia.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # Najpierw firmy - kontakty scalanych firm trafiają do firmy zachowanej
+        companies = duplicate_companies()
+        self._report("Firma", companies, lambda obj: f"{obj.name} (NIP {obj.nip})")
+        if not dry_run:
+            removed = merge_companies(companies)
+            self.stdout.write(self.style.SUCCESS(f"Firmy: usunięto {removed} duplikatów."))
+
+        clients = duplicate_clients()
+        self._report("Kontakt", clients, lambda obj: f"{obj.first_name} {obj.last_name} <{obj.email}>")
+        if not dry_run:
+            removed = merge_clients(clients)
+            self.stdout.write(self.style.SUCCESS(f"Kontakty: usunięto {removed} duplikatów."))
+
+    def _report(self, label, groups, describe):
+        for keep, duplicates in groups:
+            merged = ', '.join(f"{obj.pk}: {describe(obj)}" for obj in duplicates) or "-"
+            self.stdout.write(f"{label} {keep.pk}: {describe(keep)} <- {merged}")
@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from offers import pdf_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker kolejki PDF: renderuje zadania z tabeli PdfRenderJob w puli procesów."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Liczba procesów renderujących (domyślnie: liczba rdzeni).")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Co ile sekund sprawdzać kolejkę, gdy jest pusta.")
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help="Ile razy ponawiać zadanie, zanim zostanie oznaczone jako błąd.")
+        parser.add_argument('--stale-after', type=int, default=10,
+                            help="Po ilu minutach zadanie 'running' uznajemy za porzucone.")
+        parser.add_argument('--once', action='store_true',
+                            help="Opróżnij kolejkę i zakończ (np. z crona).")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        max_attempts = options['max_attempts']
+
+        requeued = pdf_jobs.requeue_stale_jobs(timedelta(minutes=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"Przywrócono do kolejki porzucone zadania: {requeued}")
+        pdf_jobs.delete_finished_jobs()
+
+        self.stdout.write(f"Worker PDF wystartował ({workers} procesów).")
+        in_flight = {}
+
+        with pdf_jobs.create_process_pool(workers) as pool:
+            try:
+                while True:
+                    # Trzymamy pulę pełną, ale nie zabieramy z kolejki więcej, niż zdążymy zrobić
+                    free_slots = workers - len(in_flight)
+                    if free_slots > 0:
+                        for job_id in pdf_jobs.claim_jobs(free_slots):
+                            in_flight[pool.submit(pdf_jobs.render_job, job_id)] = job_id
+
+                    if not in_flight:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+
+                    done, _pending = wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job_id = in_flight.pop(future)
+                        self._finish(future, job_id, max_attempts)
+            except KeyboardInterrupt:
+                self.stdout.write("Zatrzymywanie workera...")
+
+    def _finish(self, future, job_id, max_attempts):
+        try:
+            path = future.result()
+        except Exception as e:
+            status = pdf_jobs.mark_failed(job_id, e, max_attempts)
+            self.stderr.write(f"Zadanie {job_id}: {e} -> {status}")
+        else:
+            pdf_jobs.mark_done(job_id)
+            self.stdout.write(f"Zadanie {job_id}: {path}")
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from offers import stats
+
+
+class Command(BaseCommand):
+    help = "Przelicza od zera tabelę statystyk dashboardu (OfferDailyStat) na podstawie ofert."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Statystyki przeliczone: {rows} wierszy w {time.perf_counter() - started:.2f} s."
+        ))
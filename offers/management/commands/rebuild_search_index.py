@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from offers import search
+
+
+class Command(BaseCommand):
+    help = "Przebudowuje od zera indeks wyszukiwania pełnotekstowego (oferty, klienci, firmy)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = search.rebuild(batch_size=options['batch_size'])
+        summary = ', '.join(f"{kind}: {count}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Indeks przebudowany ({summary}) w {time.perf_counter() - started:.2f} s."
+        ))
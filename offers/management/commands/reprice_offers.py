@@ -0,0 +1,38 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from offers.currency import reprice_drafts, reprice_offer
+from offers.models import Offer
+
+
+class Command(BaseCommand):
+    help = ("Przelicza ceny PLN pozycji z ceną EUR według kursu z tabeli kursów (lub --rate). "
+            "Domyślnie wszystkie oferty robocze.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offer', type=int, help="Tylko jedna oferta (ID).")
+        parser.add_argument('--rate', help="Kurs EUR ręcznie, np. 4.2875 - zamiast najnowszego z tabeli.")
+
+    def handle(self, *args, **options):
+        rate = None
+        if options['rate']:
+            try:
+                rate = Decimal(options['rate'].replace(',', '.'))
+            except InvalidOperation:
+                raise CommandError(f"Niepoprawny kurs: {options['rate']}")
+
+        try:
+            if options['offer']:
+                offer = Offer.objects.filter(pk=options['offer']).first()
+                if offer is None:
+                    raise CommandError(f"Nie ma oferty o ID {options['offer']}.")
+                result = reprice_offer(offer, rate)
+            else:
+                result = reprice_drafts(rate)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Kurs {result.rate}: przeliczono {result.offers} ofert, zmieniono {result.items} pozycji."
+        ))
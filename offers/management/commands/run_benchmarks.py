@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from offers import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Mierzy czasy (p50/p95) i liczbę zapytań SQL widoków ofert, zapisu formsetu, listy w panelu admina "
+            "i renderowania PDF. Wynik zapisuje do JSON i opcjonalnie porównuje z wynikiem bazowym.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json', help="Plik wynikowy JSON.")
+        parser.add_argument('--baseline', help="Wynik bazowy (JSON) do porównania.")
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help="Dopuszczalne pogorszenie czasu w procentach (domyślnie 20).")
+        parser.add_argument('--iterations', type=int, default=20, help="Mierzonych przebiegów na scenariusz.")
+        parser.add_argument('--warmup', type=int, default=3, help="Przebiegów rozgrzewkowych (bez pomiaru).")
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            choices=[scenario.name for scenario in benchmark.SCENARIOS],
+                            help="Tylko wskazane scenariusze (można podać kilka razy).")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations musi być dodatnie.")
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = benchmark.load(options['baseline'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Nie można wczytać wyniku bazowego: {exc}")
+
+        try:
+            result = benchmark.run(
+                options['scenarios'], iterations=options['iterations'], warmup=options['warmup'],
+                progress=self._report,
+            )
+        except benchmark.BenchmarkError as exc:
+            raise CommandError(str(exc))
+        benchmark.save(result, options['output'])
+        self.stdout.write(f"Wynik zapisany w {options['output']} "
+                          f"({result['dataset']['offers']} ofert, {result['dataset']['items']} pozycji).")
+
+        if baseline is None:
+            return
+        threshold = options['threshold'] / 100
+        regressions = []
+        for row in benchmark.compare(result, baseline):
+            regressed = row.is_regression(threshold)
+            if regressed:
+                regressions.append(row)
+            line = f"  {row.scenario:<20} {row.metric:<8} {row.baseline:>10} -> {row.current:>10} ({row.change:+.0%})"
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+        if regressions:
+            raise CommandError(f"Regresje względem {options['baseline']}: {len(regressions)}.")
+        self.stdout.write(self.style.SUCCESS("Brak regresji względem wyniku bazowego."))
+
+    def _report(self, name, measured):
+        if 'skipped' in measured:
+            self.stdout.write(self.style.WARNING(f"{name:<20} pominięty: {measured['skipped']}"))
+        else:
+            self.stdout.write(f"{name:<20} p50 {measured['p50_ms']:>8.1f} ms   p95 {measured['p95_ms']:>8.1f} ms   "
+                              f"zapytań {measured['queries']}")
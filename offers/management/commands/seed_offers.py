@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from offers.seeding import SCALES, generate
+
+
+class Command(BaseCommand):
+    help = ("Generuje syntetyczne firmy, kontakty, oferty i pozycje do testów wydajności "
+            "(numery BENCH/..., ponowne uruchomienie dopisuje tylko brakujące oferty).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES, key=SCALES.get), default='1k',
+                            help="Wielkość zbioru: 1k, 100k albo 1m ofert.")
+        parser.add_argument('--offers', type=int, help="Dokładna liczba ofert - zamiast --scale.")
+        parser.add_argument('--items-per-offer', type=int, default=5,
+                            help="Średnia liczba pozycji na ofertę (losowo 1..2n-1).")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Ziarno generatora - ten sam seed daje te same dane.")
+        parser.add_argument('--chunk-size', type=int, default=50_000,
+                            help="Ofert na jedno wywołanie importu (postęp raportowany co paczkę).")
+
+    def handle(self, *args, **options):
+        offers = options['offers'] if options['offers'] is not None else SCALES[options['scale']]
+        if offers < 1 or options['items_per_offer'] < 1:
+            raise CommandError("Liczba ofert i pozycji musi być dodatnia.")
+
+        result = generate(
+            offers, items_per_offer=options['items_per_offer'], seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            progress=lambda done, total: self.stdout.write(f"  {done}/{total} ofert"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Nowe: {result.companies} firm, {result.clients} kontaktów, {result.offers} ofert, "
+            f"{result.items} pozycji (pominięte istniejące oferty: {result.skipped})."
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from offers.crm_sync import upsert_clients, upsert_companies
+from offers.importing import ImportFileError, guess_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = ("Synchronizuje firmy i kontakty z eksportu CRM (CSV/XLSX) - upsert hurtowy po NIP i emailu. "
+            "Firmy: name, nip, address. Kontakty: email, first_name, last_name, phone, position, company_nip.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', help="Plik z firmami.")
+        parser.add_argument('--clients', help="Plik z kontaktami (firmy muszą już istnieć).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['companies'] and not options['clients']:
+            raise CommandError("Podaj --companies i/lub --clients.")
+
+        # Najpierw firmy - kontakty wskazują na nie po NIP
+        for option, label, upsert in (('companies', 'Firmy', upsert_companies),
+                                      ('clients', 'Kontakty', upsert_clients)):
+            path = options[option]
+            if not path:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    result = upsert(iter_rows(f, guess_format(path)), batch_size=options['batch_size'])
+            except (OSError, ImportFileError) as exc:
+                raise CommandError(str(exc))
+
+            for line, message in result.errors:
+                self.stderr.write(f"{label}, wiersz {line}: {message}")
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {result.created} nowych, {result.updated} zmienionych, "
+                f"{result.unchanged} bez zmian, {result.rejected} odrzuconych."
+            ))
@@ -0,0 +1,91 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import history, query_inspector
+
+# --- MIDDLEWARE ---
+# Każde middleware obsługuje oba tryby. Pod ASGI (uvicorn) jedno synchroniczne
+# middleware w łańcuchu kazałoby Django przełączać każde żądanie do wątku
+# i widoki async straciłyby sens.
+
+
+class OfferHistoryMiddleware:
+    """
+    Zbiera zdarzenia historii ofert z całego żądania i zapisuje je jednym
+    INSERT-em po wygenerowaniu odpowiedzi (offers/history.py).
+    Musi stać za AuthenticationMiddleware - zdarzenia podpisujemy request.user.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with history.collect(user=getattr(request, 'user', None)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        async with history.acollect(user=getattr(request, 'user', None)):
+            return await self.get_response(request)
+
+
+class QueryInspectorMiddleware:
+    """
+    Liczy zapytania SQL żądania, szuka powtórzeń (N+1) i dopisuje nagłówki
+    X-Query-* (offers/query_inspector.py). Wyłączone, gdy QUERY_INSPECTOR = False.
+    Stoi wysoko w łańcuchu - liczy też zapytania sesji i uwierzytelniania.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSPECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with query_inspector.inspect() as log:
+            response = self.get_response(request)
+        return query_inspector.report(request, response, log)
+
+    async def __acall__(self, request):
+        with query_inspector.inspect() as log:
+            response = await self.get_response(request)
+        return query_inspector.report(request, response, log)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise (pliki statyczne) w wersji, która nie wymusza trybu synchronicznego pod ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # Wyszukanie pliku to słownik w pamięci (lub stat przy autorefresh) - bez I/O sieciowego
+        static_file = self.find_file(request.path_info) if self.autorefresh else self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
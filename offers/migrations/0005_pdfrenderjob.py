@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0004_alter_seller_options_alter_offer_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, verbose_name='Klucz cache')),
+                ('status', models.CharField(choices=[('queued', 'W kolejce'), ('running', 'Generowanie'), ('done', 'Gotowe'), ('failed', 'Błąd')], default='queued', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Próby')),
+                ('error', models.TextField(blank=True, verbose_name='Błąd')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('offer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_jobs', to='offers.offer', verbose_name='Oferta')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Zlecił')),
+            ],
+            options={
+                'verbose_name': 'Zadanie PDF',
+                'verbose_name_plural': 'Kolejka PDF',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='offers_pdfr_status_00751d_idx')],
+            },
+        ),
+    ]
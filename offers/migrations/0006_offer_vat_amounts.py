@@ -0,0 +1,62 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:39
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Sum, Subquery, OuterRef, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce, Round
+
+
+def backfill_amounts(apps, schema_editor):
+    """Istniejące pozycje dostają 23% (default), oferty - kwoty netto/VAT/brutto jednym UPDATE."""
+    Offer = apps.get_model('offers', 'Offer')
+    OfferItem = apps.get_model('offers', 'OfferItem')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def items_sum(expression):
+        return Coalesce(
+            Subquery(
+                OfferItem.objects.filter(offer=OuterRef('pk')).order_by().values('offer')
+                .annotate(total=Sum(expression)).values('total'),
+                output_field=money,
+            ),
+            Value(Decimal('0.00')),
+            output_field=money,
+        )
+
+    net = items_sum(ExpressionWrapper(F('quantity') * F('price_per_unit'), output_field=money))
+    vat = items_sum(Round(
+        ExpressionWrapper(F('quantity') * F('price_per_unit') * F('vat_rate') * Value(Decimal('0.01')),
+                          output_field=money),
+        2, output_field=money,
+    ))
+    Offer.objects.update(
+        total_price=net,
+        total_vat=vat,
+        total_gross=ExpressionWrapper(net + vat, output_field=money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0005_pdfrenderjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='total_gross',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Suma brutto PLN'),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='total_vat',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='VAT PLN'),
+        ),
+        migrations.AddField(
+            model_name='offeritem',
+            name='vat_rate',
+            field=models.DecimalField(choices=[(Decimal('23.00'), '23%'), (Decimal('8.00'), '8%'), (Decimal('5.00'), '5%'), (Decimal('0.00'), '0%')], decimal_places=2, default=Decimal('23.00'), max_digits=5, verbose_name='Stawka VAT %'),
+        ),
+        migrations.RunPython(backfill_amounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def initial_rollup(apps, schema_editor):
+    """Wypełnia statystyki istniejącymi ofertami (to samo co manage.py rebuild_offer_stats)."""
+    Offer = apps.get_model('offers', 'Offer')
+    OfferDailyStat = apps.get_model('offers', 'OfferDailyStat')
+    rows = (
+        Offer.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'seller_id', 'created_by_id', 'client__company_id')
+        .annotate(offer_count=Count('pk'), total_net=Sum('total_price'), total_gross=Sum('total_gross'))
+    )
+    OfferDailyStat.objects.bulk_create(
+        [
+            OfferDailyStat(
+                day=row['day'], status=row['status'], seller_id=row['seller_id'],
+                created_by_id=row['created_by_id'], company_id=row['client__company_id'],
+                offer_count=row['offer_count'], total_net=row['total_net'] or 0,
+                total_gross=row['total_gross'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0006_offer_vat_amounts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dzień')),
+                ('status', models.CharField(choices=[('draft', 'Robocza'), ('pending', 'Oczekuje na akceptację'), ('consultation', 'Konsultacja'), ('approved', 'Zatwierdzona'), ('sent', 'Wysłana'), ('rejected', 'Odrzucona')], max_length=20, verbose_name='Status')),
+                ('offer_count', models.IntegerField(default=0, verbose_name='Liczba ofert')),
+                ('total_net', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Netto PLN')),
+                ('total_gross', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Brutto PLN')),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='offers.company')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='offers.seller')),
+            ],
+            options={
+                'verbose_name': 'Statystyka dzienna',
+                'verbose_name_plural': 'Statystyki dzienne',
+                'indexes': [models.Index(fields=['day', 'status'], name='offers_offe_day_04f94b_idx')],
+            },
+        ),
+        migrations.RunPython(initial_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:42
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    # External-content FTS5: tekst trzymamy raz (w offers_searchdocument), FTS tylko indeksuje
+    """CREATE VIRTUAL TABLE offers_search_fts USING fts5(
+        body, content='offers_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER offers_search_ai AFTER INSERT ON offers_searchdocument BEGIN
+        INSERT INTO offers_search_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+    """CREATE TRIGGER offers_search_ad AFTER DELETE ON offers_searchdocument BEGIN
+        INSERT INTO offers_search_fts(offers_search_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    """CREATE TRIGGER offers_search_au AFTER UPDATE ON offers_searchdocument BEGIN
+        INSERT INTO offers_search_fts(offers_search_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO offers_search_fts(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS offers_search_au",
+    "DROP TRIGGER IF EXISTS offers_search_ad",
+    "DROP TRIGGER IF EXISTS offers_search_ai",
+    "DROP TABLE IF EXISTS offers_search_fts",
+]
+POSTGRES_FORWARD = [
+    """ALTER TABLE offers_searchdocument ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED""",
+    "CREATE INDEX offers_searchdocument_vector_gin ON offers_searchdocument USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS offers_searchdocument_vector_gin",
+    "ALTER TABLE offers_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def _normalize(*parts):
+    # Kopia offers.search.normalize - migracja nie może zależeć od bieżącego kodu aplikacji
+    folding = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O', 'ß': 'ss'})
+    text = ' '.join(str(p) for p in parts if p).translate(folding)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def populate_index(apps, schema_editor):
+    Offer = apps.get_model('offers', 'Offer')
+    Client = apps.get_model('offers', 'Client')
+    Company = apps.get_model('offers', 'Company')
+    SearchDocument = apps.get_model('offers', 'SearchDocument')
+
+    documents = []
+    for pk, number, first, last, email, company, nip, seller in Offer.objects.values_list(
+            'pk', 'offer_number', 'client__first_name', 'client__last_name', 'client__email',
+            'client__company__name', 'client__company__nip', 'seller__name').iterator():
+        documents.append(SearchDocument(kind='offer', object_id=pk, body=_normalize(
+            number, first, last, email, company, nip, _digits(nip), seller)))
+    for pk, first, last, email, phone, position, company, nip in Client.objects.values_list(
+            'pk', 'first_name', 'last_name', 'email', 'phone', 'position', 'company__name',
+            'company__nip').iterator():
+        documents.append(SearchDocument(kind='client', object_id=pk, body=_normalize(
+            first, last, email, phone, _digits(phone), position, company, _digits(nip))))
+    for pk, name, nip, address in Company.objects.values_list('pk', 'name', 'nip', 'address').iterator():
+        documents.append(SearchDocument(kind='company', object_id=pk, body=_normalize(
+            name, nip, _digits(nip), address)))
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0007_offerdailystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('offer', 'Oferta'), ('client', 'Klient'), ('company', 'Firma')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('body', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Dokument wyszukiwania',
+                'verbose_name_plural': 'Indeks wyszukiwania',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='offers_searchdocument_unique_object')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(populate_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0008_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferNumberCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dzień')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='Ostatni numer')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='offers.seller', verbose_name='Wystawca')),
+            ],
+            options={
+                'verbose_name': 'Licznik numerów',
+                'verbose_name_plural': 'Liczniki numerów ofert',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('seller__isnull', False)), fields=('seller', 'day'), name='offers_numbercounter_unique_seller_day'), models.UniqueConstraint(condition=models.Q(('seller__isnull', True)), fields=('day',), name='offers_numbercounter_unique_day_without_seller')],
+            },
+        ),
+    ]
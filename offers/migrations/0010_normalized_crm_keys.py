@@ -0,0 +1,71 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:53
+
+import re
+
+from django.db import migrations, models
+
+
+def fill_keys(apps, schema_editor):
+    """
+    Wypełnia klucze dla istniejących rekordów. Duplikaty (ten sam NIP / email)
+    dostają klucz tylko w najstarszym rekordzie - reszta zostaje z NULL
+    i nie blokuje założenia indeksu UNIQUE. Niczego nie scalamy ani nie usuwamy:
+    duplikaty wypisujemy, a scala je dopiero manage.py merge_crm_duplicates.
+    """
+    Company = apps.get_model('offers', 'Company')
+    Client = apps.get_model('offers', 'Client')
+
+    def fill(model, source, target, normalize):
+        seen = set()
+        changed = []
+        duplicates = 0
+        for obj in model.objects.order_by('pk').only('pk', source):
+            key = normalize(getattr(obj, source))
+            if not key:
+                continue
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            setattr(obj, target, key)
+            changed.append(obj)
+        model.objects.bulk_update(changed, [target], batch_size=1000)
+        return duplicates
+
+    companies = fill(Company, 'nip', 'nip_normalized', lambda value: re.sub(r'\D', '', value or '') or None)
+    clients = fill(Client, 'email', 'email_normalized', lambda value: (value or '').strip().lower() or None)
+    if companies or clients:
+        print(f"\n  Duplikaty bez klucza: {companies} firm (NIP), {clients} kontaktów (email). "
+              f"Nie da się ich zapisać, dopóki ich nie scalisz - "
+              f"sprawdź: python manage.py merge_crm_duplicates --dry-run")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0009_offernumbercounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='email_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='nip_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='client',
+            name='email_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=254, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='nip_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, unique=True),
+        ),
+    ]
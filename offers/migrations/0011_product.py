@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:56
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0010_normalized_crm_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku', models.CharField(max_length=50, unique=True, verbose_name='Kod (SKU)')),
+                ('name', models.CharField(max_length=200, verbose_name='Nazwa produktu')),
+                ('price_pln', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Cena katalogowa PLN')),
+                ('price_eur', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Cena katalogowa EUR')),
+                ('vat_rate', models.DecimalField(choices=[(Decimal('23.00'), '23%'), (Decimal('8.00'), '8%'), (Decimal('5.00'), '5%'), (Decimal('0.00'), '0%')], decimal_places=2, default=Decimal('23.00'), max_digits=5, verbose_name='Stawka VAT %')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Aktywny')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Produkt',
+                'verbose_name_plural': 'Katalog produktów',
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0011_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(default='EUR', max_length=3, verbose_name='Waluta')),
+                ('day', models.DateField(verbose_name='Dzień notowania')),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=10, verbose_name='Kurs PLN')),
+                ('source', models.CharField(blank=True, max_length=20, verbose_name='Źródło')),
+            ],
+            options={
+                'verbose_name': 'Kurs waluty',
+                'verbose_name_plural': 'Kursy walut',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('currency', 'day'), name='offers_exchangerate_unique_day')],
+            },
+        ),
+    ]
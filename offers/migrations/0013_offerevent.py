@@ -0,0 +1,36 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:01
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0012_exchangerate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID pozycji')),
+                ('kind', models.CharField(choices=[('created', 'Utworzenie'), ('status', 'Zmiana statusu'), ('changed', 'Zmiana danych'), ('deleted', 'Usunięcie'), ('item_added', 'Dodanie pozycji'), ('item_changed', 'Zmiana pozycji'), ('item_removed', 'Usunięcie pozycji')], max_length=20, verbose_name='Zdarzenie')),
+                ('changes', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Zmiany')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Czas')),
+                ('offer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='offers.offer', verbose_name='Oferta')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Użytkownik')),
+            ],
+            options={
+                'verbose_name': 'Zdarzenie oferty',
+                'verbose_name_plural': 'Historia zmian ofert',
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['offer', 'timestamp'], name='offers_event_offer_ts_idx')],
+            },
+        ),
+    ]
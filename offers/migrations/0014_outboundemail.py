@@ -0,0 +1,41 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0013_offerevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to', models.EmailField(max_length=254, verbose_name='Do')),
+                ('subject', models.CharField(max_length=200, verbose_name='Temat')),
+                ('body', models.TextField(verbose_name='Treść')),
+                ('status', models.CharField(choices=[('queued', 'W kolejce'), ('sending', 'Wysyłanie'), ('sent', 'Wysłany'), ('failed', 'Błąd')], default='queued', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Próby')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Następna próba')),
+                ('error', models.TextField(blank=True, verbose_name='Błąd')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('offer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='offers.offer', verbose_name='Oferta')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Zlecił')),
+            ],
+            options={
+                'verbose_name': 'Wiadomość e-mail',
+                'verbose_name_plural': 'Kolejka e-mail',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='offers_email_queue_idx')],
+            },
+        ),
+    ]
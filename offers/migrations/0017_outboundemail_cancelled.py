@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0015_offer_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='status',
+            field=models.CharField(choices=[('queued', 'W kolejce'), ('sending', 'Wysyłanie'), ('sent', 'Wysłany'), ('failed', 'Błąd'), ('cancelled', 'Anulowany')], default='queued', max_length=20, verbose_name='Status'),
+        ),
+    ]
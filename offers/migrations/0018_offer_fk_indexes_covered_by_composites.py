@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers', '0017_outboundemail_cancelled'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='offer',
+            name='client',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='offers.client', verbose_name='Klient'),
+        ),
+        migrations.AlterField(
+            model_name='offer',
+            name='created_by',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Utworzył'),
+        ),
+        migrations.AlterField(
+            model_name='offer',
+            name='seller',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='offers.seller', verbose_name='Wystawca'),
+        ),
+    ]
@@ -1,23 +1,53 @@
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, Q, Sum, Count, Subquery, OuterRef, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce, Round
 from ckeditor.fields import RichTextField
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from datetime import timedelta
 from django.contrib.auth.models import User
 from decimal import Decimal
+from contextlib import contextmanager
+from contextvars import ContextVar
+from . import pdf_cache
 
 
 # --- NOWE MODELE (CRM) ---
 
+def normalize_nip(value):
+    """Sam ciąg cyfr: 'PL 123-456-78-90' -> '1234567890'. Pusty NIP -> None."""
+    return re.sub(r'\D', '', value or '') or None
+
+
+def normalize_email(value):
+    return (value or '').strip().lower() or None
+
+
 class Company(models.Model):
     name = models.CharField(max_length=200, verbose_name="Nazwa Firmy")
     nip = models.CharField(max_length=20, blank=True, null=True, verbose_name="NIP")
+    # Klucz do wyszukiwania i synchronizacji z CRM (offers/crm_sync.py) - unikalny, z indeksem
+    nip_normalized = models.CharField(max_length=20, unique=True, null=True, blank=True, editable=False)
     address = models.TextField(verbose_name="Adres", blank=True)
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        key = normalize_nip(self.nip)
+        if key and Company.objects.filter(nip_normalized=key).exclude(pk=self.pk).exists():
+            raise ValidationError({'nip': "Firma z tym numerem NIP już istnieje."})
+
+    def save(self, *args, **kwargs):
+        self.nip_normalized = normalize_nip(self.nip)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Firma"
         verbose_name_plural = "Baza Firm"
@@ -31,10 +61,21 @@ class Client(models.Model):
     phone = models.CharField(max_length=20, blank=True, verbose_name="Telefon")
     position = models.CharField(max_length=100, blank=True,
                                 verbose_name="Stanowisko")  # np. "Dyrektor IT" vs "Serwisant"
+    # Email małymi literami - unikalny klucz kontaktu (offers/crm_sync.py)
+    email_normalized = models.CharField(max_length=254, unique=True, null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.company.name})"
 
+    def clean(self):
+        key = normalize_email(self.email)
+        if key and Client.objects.filter(email_normalized=key).exclude(pk=self.pk).exists():
+            raise ValidationError({'email': "Kontakt z tym adresem email już istnieje."})
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Klient / Kontakt"
         verbose_name_plural = "Baza Klientów"
@@ -61,7 +102,45 @@ class Seller(models.Model):
 
 # --- ZMODYFIKOWANY MODEL OFERTY ---
 
-class Offer(models.Model):
+class LoadedValuesMixin(models.Model):
+    """Pamięta wartości z chwili odczytu z bazy - historia zmian liczy z nich różnicę bez dodatkowego SELECT-a."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    class Meta:
+        abstract = True
+
+
+class OfferQuerySet(models.QuerySet):
+    """Raporty kwotowe liczone w SQL z zapisanych kolumn netto/VAT/brutto."""
+
+    def revenue(self):
+        """Jeden SELECT SUM(...) zamiast pętli po ofertach."""
+        totals = self.aggregate(
+            count=Count('pk'),
+            net=Sum('total_price'),
+            vat=Sum('total_vat'),
+            gross=Sum('total_gross'),
+        )
+        for key in ('net', 'vat', 'gross'):
+            totals[key] = (totals[key] or Decimal('0')).quantize(Decimal('0.01'))
+        return totals
+
+    def revenue_by(self, *fields):
+        """Sumy pogrupowane, np. revenue_by('status') albo revenue_by('seller__name')."""
+        return (
+            self.order_by()
+            .values(*fields)
+            .annotate(count=Count('pk'), net=Sum('total_price'), vat=Sum('total_vat'), gross=Sum('total_gross'))
+            .order_by(*fields)
+        )
+
+
+class Offer(LoadedValuesMixin, models.Model):
     class Status(models.TextChoices):
         DRAFT = 'draft', _('Robocza')
         PENDING = 'pending', _('Oczekuje na akceptację')
@@ -77,14 +156,20 @@ class Offer(models.Model):
         CARD = 'card', _('Karta płatnicza')
 
     # Podstawowe
-    seller = models.ForeignKey(Seller, on_delete=models.PROTECT, verbose_name="Wystawca", null=True)
+    # db_index=False przy kluczach obcych: pokrywają je indeksy złożone z Meta.indexes
+    seller = models.ForeignKey(Seller, on_delete=models.PROTECT, verbose_name="Wystawca", null=True,
+                               db_index=False)
     offer_number = models.CharField(max_length=50, unique=True, verbose_name="Numer oferty")
     # ZMIANA: Zamiast wpisywać ręcznie, wybieramy z bazy (Foreign Key) (1, 2)
-    client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name="Klient", null=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name="Klient", null=True,
+                               db_index=False)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.DRAFT, verbose_name="Status")
     description = RichTextField(null=True, blank=True, help_text="Wstęp/Opis oferty")
     # Finanse
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Suma PLN")
+    # Utrzymywane razem z total_price przez recalculate_offer_totals() - raporty sumują kolumny w SQL
+    total_vat = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="VAT PLN")
+    total_gross = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Suma brutto PLN")
     # Waluty (7) - Manualne sterowanie na początek
     currency_rate = models.DecimalField(max_digits=6, decimal_places=4, default=1.0000,
                                         verbose_name="Kurs EUR (dla informacji)")
@@ -102,22 +187,18 @@ class Offer(models.Model):
 
     external_file = models.FileField(upload_to='offers_archive/', null=True, blank=True, verbose_name="Archiwalny PDF")
     # Kto utworzył oferte
-    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Utworzył")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Utworzył",
+                                   db_index=False)
+
+    objects = OfferQuerySet.as_manager()
 
     def update_total(self):
         """
         Przelicza sumę oferty na podstawie pozycji.
+        Sumuje baza (jeden UPDATE z podzapytaniem) - pozycji nie ładujemy do Pythona.
         """
-        # 1. Pobieramy wszystkie pozycje tej oferty
-        offer_items = self.items.all()
-
-        # 2. Sumujemy (używając property total_price z items)
-        new_total = sum(item.total_price for item in offer_items)
-
-        # 3. Zapisujemy wynik w bazie
-        self.total_price = new_total
-        # Używamy update_fields, żeby nie nadpisywać innych pól (optymalizacja)
-        self.save(update_fields=['total_price'])
+        recalculate_offer_totals([self.pk])
+        self.refresh_from_db(fields=['total_price', 'total_vat', 'total_gross'])
 
     def __str__(self):
         return f"{self.offer_number}"
@@ -131,20 +212,54 @@ class Offer(models.Model):
         ordering = ['-created_at']
         verbose_name = "Oferta"
         verbose_name_plural = "Baza Ofert"
-
-    #  Funkcja jest gotowa, do konsultacji jak to ma wyglądać w szczegółach oferty dla nas i na generowanym PDF # !WAŻNE
+        # Indeksy pod ścieżki dostępu: lista/admin sortują po (-created_at, -id) - stronicowanie
+        # kursorem (offers/pagination.py) - i filtrują po statusie, firmie klienta, wystawcy
+        # i autorze. Indeksy zaczynające się od klucza obcego zastępują jego własny indeks
+        # (db_index=False) - wyszukiwanie po samym kluczu też z nich korzysta.
+        # Plany zapytań: python manage.py explain_offer_queries
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='offers_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='offers_status_created_idx'),
+            models.Index(fields=['client', '-created_at', '-id'], name='offers_client_created_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='offers_seller_created_idx'),
+            models.Index(fields=['created_by', '-created_at', '-id'], name='offers_creator_created_idx'),
+            # Kolejka CEO - oferty czekające na akceptację to mały ułamek tabeli
+            models.Index(fields=['-created_at'], name='offers_pending_idx', condition=Q(status='pending')),
+        ]
+
+    # Kwoty liczone przy zapisie pozycji (stawka VAT per pozycja) - tu tylko odczyt
     def get_total_vat(self):
-        """Oblicza kwotę samego podatku VAT (23%)"""
-        return self.total_price * Decimal('0.23')
+        """Kwota samego podatku VAT"""
+        return self.total_vat
 
     def get_total_gross(self):
-        """Oblicza kwotę Brutto (Netto + VAT)"""
-        return self.total_price * Decimal('1.23')
+        """Kwota Brutto (Netto + VAT)"""
+        return self.total_gross
 
 
 # --- POZYCJE OFERTY (Tu też mała zmiana pod waluty) ---
 
-class OfferItem(models.Model):
+class OfferItemQuerySet(models.QuerySet):
+
+    def with_amounts(self):
+        """Dokleja wartości pozycji policzone w bazie: line_net, line_vat, line_gross."""
+        return self.annotate(
+            line_net=line_net_expression(),
+            line_vat=line_vat_expression(),
+        ).annotate(
+            line_gross=ExpressionWrapper(F('line_net') + F('line_vat'), output_field=_money_field()),
+        )
+
+
+class OfferItem(LoadedValuesMixin, models.Model):
+    VAT_RATES = [
+        (Decimal('23.00'), '23%'),
+        (Decimal('8.00'), '8%'),
+        (Decimal('5.00'), '5%'),
+        (Decimal('0.00'), '0%'),
+    ]
+
+
     offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='items')
     description = models.CharField(max_length=200, verbose_name="Nazwa produktu")
     quantity = models.PositiveIntegerField(default=1, verbose_name="Ilość")
@@ -156,6 +271,12 @@ class OfferItem(models.Model):
     price_in_eur = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
                                        verbose_name="Cena katalogowa EUR")
 
+    vat_rate = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('23.00'),
+                                   choices=VAT_RATES,
+                                   verbose_name="Stawka VAT %")
+
+    objects = OfferItemQuerySet.as_manager()
+
     @property
     def total_price(self):
         return self.quantity * self.price_per_unit
@@ -164,9 +285,336 @@ class OfferItem(models.Model):
         return self.description
 
 
-# --- SYGNAŁY BEZ ZMIAN ---
+# --- KATALOG PRODUKTÓW (podpowiedzi: offers/catalog.py) ---
+
+class Product(models.Model):
+    sku = models.CharField(max_length=50, unique=True, verbose_name="Kod (SKU)")
+    name = models.CharField(max_length=200, verbose_name="Nazwa produktu")
+    price_pln = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Cena katalogowa PLN")
+    price_eur = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                    verbose_name="Cena katalogowa EUR")
+    vat_rate = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('23.00'),
+                                   choices=OfferItem.VAT_RATES, verbose_name="Stawka VAT %")
+    is_active = models.BooleanField(default=True, verbose_name="Aktywny")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.sku} - {self.name}"
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Produkt"
+        verbose_name_plural = "Katalog produktów"
+
+
+# --- KURSY WALUT (ładowanie i przeliczanie cen: offers/currency.py) ---
+
+class ExchangeRate(models.Model):
+    currency = models.CharField(max_length=3, default='EUR', verbose_name="Waluta")
+    day = models.DateField(verbose_name="Dzień notowania")
+    # Ile PLN za 1 jednostkę waluty
+    rate = models.DecimalField(max_digits=10, decimal_places=4, verbose_name="Kurs PLN")
+    source = models.CharField(max_length=20, blank=True, verbose_name="Źródło")
+
+    def __str__(self):
+        return f"{self.currency} {self.day}: {self.rate}"
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'day'], name='offers_exchangerate_unique_day'),
+        ]
+        verbose_name = "Kurs waluty"
+        verbose_name_plural = "Kursy walut"
+
+
+# --- HISTORIA ZMIAN OFERT (zapisywana przez offers/history.py) ---
+
+class OfferEvent(models.Model):
+    class Kind(models.TextChoices):
+        CREATED = 'created', _('Utworzenie')
+        STATUS = 'status', _('Zmiana statusu')
+        CHANGED = 'changed', _('Zmiana danych')
+        DELETED = 'deleted', _('Usunięcie')
+        ITEM_ADDED = 'item_added', _('Dodanie pozycji')
+        ITEM_CHANGED = 'item_changed', _('Zmiana pozycji')
+        ITEM_REMOVED = 'item_removed', _('Usunięcie pozycji')
+
+    # Bez klucza obcego w bazie - historia zostaje także po usunięciu oferty lub pozycji
+    offer = models.ForeignKey(Offer, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events',
+                              verbose_name="Oferta")
+    item_id = models.BigIntegerField(null=True, blank=True, verbose_name="ID pozycji")
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name="Zdarzenie")
+    # {pole: [przed, po]}
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Zmiany")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                             verbose_name="Użytkownik")
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Czas")
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Historia zmian jest tylko do dopisywania.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.offer_id} {self.get_kind_display()} ({self.timestamp:%Y-%m-%d %H:%M})"
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['offer', 'timestamp'], name='offers_event_offer_ts_idx'),
+        ]
+        verbose_name = "Zdarzenie oferty"
+        verbose_name_plural = "Historia zmian ofert"
+
+
+# --- KOLEJKA RENDEROWANIA PDF (worker: manage.py pdf_worker) ---
+
+class PdfRenderJob(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('W kolejce')
+        RUNNING = 'running', _('Generowanie')
+        DONE = 'done', _('Gotowe')
+        FAILED = 'failed', _('Błąd')
+
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='pdf_jobs', verbose_name="Oferta")
+    # Klucz z offers/pdf_cache.py - ta sama wersja danych nie trafia do kolejki dwa razy
+    cache_key = models.CharField(max_length=64, verbose_name="Klucz cache")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED, verbose_name="Status")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Próby")
+    error = models.TextField(blank=True, verbose_name="Błąd")
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Zlecił")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"PDF {self.offer_id} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        verbose_name = "Zadanie PDF"
+        verbose_name_plural = "Kolejka PDF"
+
+
+# --- KOLEJKA WYSYŁKI E-MAIL (worker: manage.py email_worker) ---
+
+class OutboundEmail(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('W kolejce')
+        SENDING = 'sending', _('Wysyłanie')
+        SENT = 'sent', _('Wysłany')
+        FAILED = 'failed', _('Błąd')
+        # Oferta przestała być zatwierdzona, zanim worker doszedł do wiadomości
+        CANCELLED = 'cancelled', _('Anulowany')
+
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='emails', verbose_name="Oferta")
+    to = models.EmailField(verbose_name="Do")
+    subject = models.CharField(max_length=200, verbose_name="Temat")
+    body = models.TextField(verbose_name="Treść")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED, verbose_name="Status")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Próby")
+    # Ponowienia z rosnącym odstępem - worker bierze tylko wiadomości, których termin minął
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Następna próba")
+    error = models.TextField(blank=True, verbose_name="Błąd")
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                     verbose_name="Zlecił")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.to} - {self.subject} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='offers_email_queue_idx')]
+        verbose_name = "Wiadomość e-mail"
+        verbose_name_plural = "Kolejka e-mail"
+
+
+# --- LICZNIKI NUMERÓW OFERT (offers/numbering.py) ---
+
+class OfferNumberCounter(models.Model):
+    """Ostatni wydany numer w ciągu (wystawca, dzień)."""
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+                               verbose_name="Wystawca")
+    day = models.DateField(verbose_name="Dzień")
+    last_value = models.PositiveIntegerField(default=0, verbose_name="Ostatni numer")
+
+    def __str__(self):
+        return f"{self.day} / {self.seller_id or '-'}: {self.last_value}"
+
+    class Meta:
+        constraints = [
+            # NULL w zwykłym UNIQUE nie koliduje z NULL - oferty bez wystawcy mają osobny indeks
+            models.UniqueConstraint(fields=['seller', 'day'], condition=models.Q(seller__isnull=False),
+                                    name='offers_numbercounter_unique_seller_day'),
+            models.UniqueConstraint(fields=['day'], condition=models.Q(seller__isnull=True),
+                                    name='offers_numbercounter_unique_day_without_seller'),
+        ]
+        verbose_name = "Licznik numerów"
+        verbose_name_plural = "Liczniki numerów ofert"
+
+
+# --- INDEKS WYSZUKIWANIA (utrzymywany przez offers/search.py) ---
+
+class SearchDocument(models.Model):
+    """
+    Znormalizowany tekst (małe litery, bez polskich znaków) jednej oferty / klienta / firmy.
+    Nad tą tabelą migracja zakłada indeks pełnotekstowy: FTS5 na SQLite, tsvector + GIN na Postgresie.
+    """
+    class Kind(models.TextChoices):
+        OFFER = 'offer', _('Oferta')
+        CLIENT = 'client', _('Klient')
+        COMPANY = 'company', _('Firma')
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    body = models.TextField()
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='offers_searchdocument_unique_object'),
+        ]
+        verbose_name = "Dokument wyszukiwania"
+        verbose_name_plural = "Indeks wyszukiwania"
+
+
+# --- STATYSTYKI SPRZEDAŻY (rollup dzienny, utrzymywany przez offers/stats.py) ---
+
+class OfferDailyStat(models.Model):
+    """
+    Jeden wiersz = suma ofert z jednego dnia dla kombinacji (status, wystawca, handlowiec, firma).
+    Dashboard czyta tylko tę tabelę - nigdy nie skanuje Offer.
+    Ten sam "kubełek" może mieć kilka wierszy (równoległe zapisy) - zawsze sumujemy.
+    """
+    day = models.DateField(verbose_name="Dzień")
+    status = models.CharField(max_length=20, choices=Offer.Status.choices, verbose_name="Status")
+    seller = models.ForeignKey(Seller, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    offer_count = models.IntegerField(default=0, verbose_name="Liczba ofert")
+    total_net = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Netto PLN")
+    total_gross = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Brutto PLN")
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.offer_count}"
+
+    class Meta:
+        indexes = [models.Index(fields=['day', 'status'])]
+        verbose_name = "Statystyka dzienna"
+        verbose_name_plural = "Statystyki dzienne"
+
+
+# --- SUMY OFERT ---
+
+def _money_field():
+    return models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def line_net_expression():
+    """Wartość netto pozycji (ilość x cena) liczona po stronie bazy."""
+    return ExpressionWrapper(F('quantity') * F('price_per_unit'), output_field=_money_field())
+
+
+def line_vat_expression():
+    """
+    VAT pozycji (netto x stawka %), zaokrąglony do groszy. Mnożymy przez 0.01
+    zamiast dzielić przez 100 - SQLite przy kolumnach całkowitych zrobiłby dzielenie całkowite.
+    """
+    return Round(
+        ExpressionWrapper(F('quantity') * F('price_per_unit') * F('vat_rate') * Value(Decimal('0.01')),
+                          output_field=_money_field()),
+        2,
+        output_field=_money_field(),
+    )
+
+
+def _items_sum(expression):
+    return Coalesce(
+        Subquery(
+            OfferItem.objects.filter(offer=OuterRef('pk'))
+            .order_by()
+            .values('offer')
+            .annotate(total=Sum(expression))
+            .values('total'),
+            output_field=_money_field(),
+        ),
+        Value(Decimal('0.00')),
+        output_field=_money_field(),
+    )
+
+
+def recalculate_offer_totals(offer_ids, track_stats=True):
+    """
+    Przelicza kwoty podanych ofert jednym zapytaniem:
+    UPDATE offer SET total_price = (SELECT SUM(quantity * price_per_unit) ...), total_vat = ... WHERE id IN (...)
+    track_stats=False - wołający sam przenosi zmianę do statystyk (import hurtowy).
+    """
+    from .stats import track_offers
+
+    offer_ids = list(offer_ids)
+    if not offer_ids:
+        return 0
+    net = _items_sum(line_net_expression())
+    vat = _items_sum(line_vat_expression())
+    update = Offer.objects.filter(pk__in=offer_ids).update
+    amounts = dict(
+        total_price=net,
+        total_vat=vat,
+        total_gross=ExpressionWrapper(net + vat, output_field=_money_field()),
+        # Zmiana pozycji to zmiana oferty - updated_at jest walidatorem Last-Modified (offers/conditional.py)
+        updated_at=timezone.now(),
+    )
+    if not track_stats:
+        return update(**amounts)
+    # UPDATE omija sygnały - zmianę kwot przenosimy do statystyk ręcznie
+    with track_offers(offer_ids):
+        return update(**amounts)
+
+
+# Zbiór ofert do przeliczenia po wyjściu z defer_total_recalculation() (None = tryb zwykły)
+_deferred_offer_ids = ContextVar('deferred_offer_ids', default=None)
+
+
+@contextmanager
+def defer_total_recalculation():
+    """
+    Wstrzymuje przeliczanie sum przy każdym zapisie pozycji. Przy wyjściu każda
+    dotknięta oferta jest przeliczana raz, jednym zapytaniem - zapis formsetu
+    z 300 pozycjami kosztuje wtedy stałą liczbę zapytań zamiast kwadratowej.
+    """
+    if _deferred_offer_ids.get() is not None:
+        # Zagnieżdżenie - przeliczy zewnętrzny blok
+        yield
+        return
+
+    token = _deferred_offer_ids.set(set())
+    try:
+        yield
+        offer_ids = _deferred_offer_ids.get()
+    finally:
+        _deferred_offer_ids.reset(token)
+    recalculate_offer_totals(offer_ids)
+
+
+# --- SYGNAŁY ---
 @receiver(post_save, sender=OfferItem)
 @receiver(post_delete, sender=OfferItem)
 def recalculate_offer_total(sender, instance, **kwargs):
-    offer = instance.offer
-    offer.update_total()
+    deferred = _deferred_offer_ids.get()
+    if deferred is not None:
+        deferred.add(instance.offer_id)
+        return
+    # Po offer_id, bez ładowania obiektu oferty
+    recalculate_offer_totals([instance.offer_id])
+
+
+@receiver(post_delete, sender=Offer)
+def drop_cached_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate_offer(instance.pk)
@@ -0,0 +1,86 @@
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OfferNumberCounter
+
+# --- NUMERACJA OFERT ---
+# Numer: OF/RRRRMMDD/<id wystawcy>/<kolejny numer dnia>, np. OF/20261018/2/0007.
+# Ciąg liczy osobny licznik w tabeli OfferNumberCounter dla każdej pary
+# (wystawca, dzień). Licznik podbija jeden UPDATE ... SET last_value = last_value + n
+# pod blokadą wiersza, więc równoległe zapisy nigdy nie dostaną tego samego numeru.
+#
+# OFFER_NUMBER_BLOCK_SIZE = 1 (domyślnie): numer rezerwowany w transakcji zapisu
+# oferty - wycofany zapis oddaje numer, ciąg jest bez dziur.
+# OFFER_NUMBER_BLOCK_SIZE > 1: proces rezerwuje od razu paczkę numerów i wydaje
+# je z pamięci bez zapytań do bazy. Cena: numery z różnych procesów przeplatają
+# się, a niewykorzystana reszta paczki (restart, koniec dnia) zostaje dziurą.
+# Stare numery (OF/RRRRMMDD/XXXX) mają inny format, więc z nowymi nie kolidują.
+
+_blocks = {}  # (seller_id, dzień) -> [następny, ostatni] z paczki tego procesu
+_lock = threading.Lock()
+
+
+def format_offer_number(seller_id, day, value):
+    return f"OF/{day:%Y%m%d}/{seller_id or 0}/{value:04d}"
+
+
+def reserve_numbers(seller_id, day, count=1):
+    """Rezerwuje w bazie `count` kolejnych numerów i zwraca (pierwszy, ostatni)."""
+    counters = OfferNumberCounter.objects.filter(seller_id=seller_id, day=day)
+    with transaction.atomic():
+        if not counters.update(last_value=F('last_value') + count):
+            try:
+                # Pierwsza oferta dnia - równoległy INSERT przegra na UNIQUE i podbije licznik
+                with transaction.atomic():
+                    OfferNumberCounter.objects.create(seller_id=seller_id, day=day, last_value=count)
+            except IntegrityError:
+                counters.update(last_value=F('last_value') + count)
+        last = counters.values_list('last_value', flat=True).get()
+    return last - count + 1, last
+
+
+def _take_from_block(key):
+    with _lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            value = block[0]
+            block[0] += 1
+            return value
+    return None
+
+
+def _keep_block(key, first, last):
+    with _lock:
+        # Paczki z poprzednich dni już się nie przydadzą
+        for stale in [k for k in _blocks if k[1] != key[1]]:
+            del _blocks[stale]
+        _blocks[key] = [first, last]
+
+
+def next_offer_number(seller=None, day=None):
+    """
+    Kolejny numer oferty dla wystawcy. Wywoływać w transakcji zapisu oferty,
+    wtedy wycofany zapis nie zostawia dziury w numeracji.
+    """
+    seller_id = getattr(seller, 'pk', seller)
+    day = day or timezone.localdate()
+    key = (seller_id, day)
+    block_size = max(1, getattr(settings, 'OFFER_NUMBER_BLOCK_SIZE', 1))
+
+    value = _take_from_block(key) if block_size > 1 else None
+    if value is None:
+        value, last = reserve_numbers(seller_id, day, block_size)
+        if last > value:
+            # Resztę paczki udostępniamy dopiero po COMMIT - po ROLLBACK baza wyda te numery ponownie
+            transaction.on_commit(lambda: _keep_block(key, value + 1, last))
+    return format_offer_number(seller_id, day, value)
+
+
+def reset_blocks():
+    """Zapomina paczki numerów tego procesu (testy, zmiana ustawień)."""
+    with _lock:
+        _blocks.clear()
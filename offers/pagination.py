@@ -0,0 +1,113 @@
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db.models import Q
+
+
+# --- PAGINACJA KURSOROWA (KEYSET) ---
+# Zamiast OFFSET (który każe bazie przeskanować wszystkie wcześniejsze wiersze)
+# zapamiętujemy ostatni widziany klucz (created_at, id) i pytamy tylko o "dalej".
+# Dzięki temu koszt strony nie rośnie razem z tabelą ofert.
+
+@dataclass
+class KeysetPage:
+    object_list: list = field(default_factory=list)
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Zwraca krotkę (created_at, pk) albo None, jeśli kursor jest uszkodzony.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _page_query(queryset, after_key, before_key, per_page):
+    """Zapytanie o per_page + 1 wierszy i informacja, czy idziemy wstecz."""
+    if before_key:
+        created_at, pk = before_key
+        query = (
+            queryset.filter(created_at__gte=created_at)
+            .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            .order_by('created_at', 'pk')[:per_page + 1]
+        )
+        return query, True
+
+    queryset = queryset.order_by('-created_at', '-pk')
+    if after_key:
+        created_at, pk = after_key
+        # Nadmiarowy warunek created_at <= x pozwala bazie wejść w indeks (created_at, id) od razu
+        # w miejscu kursora - sam OR zmusza ją do czytania indeksu od początku
+        queryset = queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    return queryset[:per_page + 1], False
+
+
+def _make_page(rows, per_page, backwards, after_key):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    page = KeysetPage(object_list=rows)
+    if rows:
+        if backwards:
+            page.next_cursor = encode_cursor(rows[-1])
+            if has_more:
+                page.prev_cursor = encode_cursor(rows[0])
+        else:
+            if has_more:
+                page.next_cursor = encode_cursor(rows[-1])
+            if after_key:
+                page.prev_cursor = encode_cursor(rows[0])
+    return page
+
+
+def keyset_paginate(queryset, after=None, before=None, per_page=25):
+    """
+    Zwraca jedną stronę querysetu posortowanego malejąco po (created_at, id).
+
+    `after` - kursor ostatniego elementu poprzedniej strony (idziemy dalej),
+    `before` - kursor pierwszego elementu bieżącej strony (cofamy się).
+    Pobieramy per_page + 1 wierszy, żeby wiedzieć, czy istnieje kolejna strona
+    bez dodatkowego COUNT(*).
+    """
+    after_key = decode_cursor(after)
+    query, backwards = _page_query(queryset, after_key, decode_cursor(before), per_page)
+    return _make_page(list(query), per_page, backwards, after_key)
+
+
+async def akeyset_paginate(queryset, after=None, before=None, per_page=25):
+    """To samo co keyset_paginate, ale wiersze czyta asynchroniczny ORM (widoki async)."""
+    after_key = decode_cursor(after)
+    query, backwards = _page_query(queryset, after_key, decode_cursor(before), per_page)
+    return _make_page([row async for row in query], per_page, backwards, after_key)
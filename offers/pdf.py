@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.template.loader import render_to_string
+
+from .logos import seller_logo_path
+from .pdf_cache import offer_cache_key, get_cached_pdf, store_pdf
+
+# --- SILNIK PDF ---
+# Jedno wejście: render_offer_pdf(offer). Używa go widok, kolejka w tle,
+# eksport ZIP z admina i polecenia manage.py.
+#
+# Koszty stałe (parsowanie pdf_style.css, konfiguracja fontów) płacimy raz
+# na wątek workera, a nie przy każdym PDF-ie. Obiekty WeasyPrint trzymamy
+# per wątek - przy serwerze wielowątkowym renderowania nie dzielą stanu.
+# WeasyPrint importujemy dopiero przy pierwszym renderze, więc moduły,
+# które tylko linkują do PDF-a, nie ładują Pango/Cairo.
+
+logger = logging.getLogger(__name__)
+
+PDF_QUERYSET_RELATED = ('seller', 'client__company', 'created_by')
+
+_engine = threading.local()
+
+
+def pdf_css_path():
+    if not settings.DEBUG:
+        # --- PRODUKCJA (PythonAnywhere) ---
+        return '/home/jakub3011/offert_system_basic/staticfiles/offers/pdf_style.css'
+    # --- LOKALNIE (Docker) ---
+    # Ścieżka do kodu źródłowego
+    return os.path.join(settings.BASE_DIR, 'offers', 'static', 'offers', 'pdf_style.css')
+
+
+def _font_config():
+    if getattr(_engine, 'font_config', None) is None:
+        from weasyprint.text.fonts import FontConfiguration
+        _engine.font_config = FontConfiguration()
+    return _engine.font_config
+
+
+def get_stylesheets():
+    """
+    Sparsowany pdf_style.css. Ponowne parsowanie tylko po zmianie pliku (mtime),
+    więc poprawki CSS działają bez restartu serwera.
+    """
+    css_path = pdf_css_path()
+    try:
+        mtime = os.stat(css_path).st_mtime_ns
+    except OSError:
+        if getattr(_engine, 'css_key', None) != (css_path, None):
+            logger.warning("Brak pliku CSS dla PDF: %s - generuję bez styli.", css_path)
+            _engine.css_key, _engine.stylesheets = (css_path, None), []
+        return _engine.stylesheets
+
+    if getattr(_engine, 'css_key', None) != (css_path, mtime):
+        from weasyprint import CSS
+        _engine.stylesheets = [CSS(filename=css_path, font_config=_font_config())]
+        _engine.css_key = (css_path, mtime)
+    return _engine.stylesheets
+
+
+def resolve_logo_url(seller):
+    """Adres file:// logo wystawcy w wersji do druku (offers/logos.py) albo None (brak logo lub pliku na dysku)."""
+    path = seller_logo_path(seller)
+    if path is None:
+        if seller and seller.logo:
+            logger.warning("Logo wystawcy %s nie istnieje na dysku: %s", seller.pk, seller.logo.path)
+        return None
+    return Path(path).as_uri()
+
+
+def render_offer_pdf(offer):
+    """Renderuje PDF oferty i zwraca go jako bytes."""
+    from weasyprint import HTML
+
+    started = time.perf_counter()
+
+    context = {
+        'offer': offer,
+        'logo_url': resolve_logo_url(offer.seller),
+    }
+    html_string = render_to_string('offers/offer_pdf.html', context)
+
+    # base_url='' - nie pozwalamy WeasyPrintowi błądzić po sieci
+    pdf_file = HTML(string=html_string, base_url='').write_pdf(
+        stylesheets=get_stylesheets(),
+        font_config=_font_config(),
+    )
+
+    logger.info(
+        "PDF %s: %.0f ms, %d KB",
+        offer.offer_number, (time.perf_counter() - started) * 1000, len(pdf_file) // 1024,
+    )
+    return pdf_file
+
+
+def offer_pdf_cache_key(offer):
+    return offer_cache_key(offer, pdf_css_path())
+
+
+def cached_offer_pdf(offer, cache_key=None):
+    """Ścieżka do gotowego PDF-a z cache albo None."""
+    return get_cached_pdf(offer.pk, cache_key or offer_pdf_cache_key(offer))
+
+
+def get_or_render_pdf(offer):
+    """
+    Zwraca ścieżkę do PDF-a oferty w cache - renderuje go tylko wtedy,
+    gdy dla bieżącej wersji danych jeszcze nie istnieje.
+    """
+    cache_key = offer_pdf_cache_key(offer)
+    path = get_cached_pdf(offer.pk, cache_key)
+    if path:
+        return path
+    return store_pdf(offer.pk, cache_key, render_offer_pdf(offer))
+
+
+# --- PULA RENDEROWANIA DLA WIDOKÓW ASYNC ---
+# Widok async nie renderuje w pętli zdarzeń (WeasyPrint blokuje na setki ms),
+# tylko oddaje pracę do puli o stałej liczbie wątków (PDF_RENDER_THREADS).
+# Nadmiar żądań czeka w kolejce puli zamiast tworzyć nowe wątki, a pętla
+# w tym czasie obsługuje listy i szczegóły ofert.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PDF_RENDER_THREADS', 2), thread_name_prefix='pdf-render',
+            )
+        return _executor
+
+
+def _render_and_store(offer, cache_key):
+    # Wątek puli ma własne połączenie z bazą - sprzątamy je jak po żądaniu
+    close_old_connections()
+    try:
+        pdf_file = render_offer_pdf(offer)
+        store_pdf(offer.pk, cache_key, pdf_file)
+        return pdf_file
+    finally:
+        close_old_connections()
+
+
+async def arender_offer_pdf(offer, cache_key):
+    """Renderuje PDF w puli wątków i zapisuje go w cache; zwraca bytes."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor(), _render_and_store, offer, cache_key)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import models
+from django.template.loader import get_template
+
+# --- CACHE PLIKÓW PDF (adresowany treścią) ---
+# Klucz to SHA-256 ze wszystkiego, co trafia do PDF-a: oferta, pozycje, klient,
+# wystawca (razem z plikiem logo), szablon i arkusz CSS. Zmiana czegokolwiek
+# daje nowy klucz, więc stary plik po prostu przestaje być trafiany
+# i znika przy najbliższym sprzątaniu.
+#
+# Układ na dysku: <PDF_CACHE_DIR>/<offer_pk>/<klucz>.pdf
+
+PDF_TEMPLATE = 'offers/offer_pdf.html'
+
+# Podbić, gdy zmieni się sposób renderowania niezależny od plików (np. wersja WeasyPrint)
+CACHE_VERSION = 2  # 2: logo osadzane w wersji do druku (offers/logos.py)
+
+_last_eviction = None
+
+
+def _cache_dir():
+    return getattr(settings, 'PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'pdf_cache'))
+
+
+@lru_cache(maxsize=256)
+def _digest_file(path, mtime_ns, size):
+    # mtime i rozmiar są częścią klucza lru_cache - podmiana pliku wymusza ponowne liczenie
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(path):
+    """Skrót zawartości pliku albo None, jeśli pliku nie ma."""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return _digest_file(str(path), st.st_mtime_ns, st.st_size)
+
+
+def _field_value(field, obj):
+    value = getattr(obj, field.attname)
+    if isinstance(field, models.DecimalField) and value is not None:
+        # Świeżo utworzony obiekt ma np. float 1.0, a z bazy wraca Decimal('1.0000') -
+        # sprowadzamy oba do tej samej postaci, żeby klucz był stabilny
+        value = field.to_python(value).quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
+def _model_values(obj, exclude=()):
+    if obj is None:
+        return None
+    return {
+        f.attname: _field_value(f, obj)
+        for f in obj._meta.concrete_fields
+        if f.attname not in exclude
+    }
+
+
+def offer_cache_key(offer, css_path=None):
+    """
+    Liczy klucz cache dla PDF-a oferty.
+    `updated_at` pomijamy celowo - samo zapisanie oferty bez zmian nie unieważnia pliku.
+    """
+    seller = offer.seller
+    client = offer.client
+    logo_path = seller.logo.path if seller and seller.logo else None
+
+    payload = {
+        'v': CACHE_VERSION,
+        'offer': _model_values(offer, exclude=('updated_at',)),
+        'items': list(
+            offer.items.order_by('pk').values_list(
+                'pk', 'description', 'quantity', 'price_per_unit', 'price_in_eur', 'vat_rate'
+            )
+        ),
+        'seller': _model_values(seller),
+        'logo': file_digest(logo_path),
+        'client': _model_values(client),
+        'company': _model_values(client.company) if client else None,
+        'created_by': _model_values(offer.created_by, exclude=('password', 'last_login')),
+        'template': file_digest(get_template(PDF_TEMPLATE).origin.name),
+        'css': file_digest(css_path),
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def cache_path(offer_pk, key):
+    return os.path.join(_cache_dir(), str(offer_pk), f"{key}.pdf")
+
+
+def get_cached_pdf(offer_pk, key):
+    """Ścieżka do gotowego PDF-a albo None (cache miss)."""
+    path = cache_path(offer_pk, key)
+    try:
+        # Odświeżamy mtime - sprzątanie usuwa najdawniej używane pliki
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def store_pdf(offer_pk, key, pdf_bytes):
+    """
+    Zapisuje PDF atomowo (plik tymczasowy + os.replace) i usuwa
+    poprzednie wersje PDF-a tej samej oferty.
+    """
+    path = cache_path(offer_pk, key)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    for name in os.listdir(directory):
+        if name.endswith('.pdf') and name != os.path.basename(path):
+            _remove_quietly(os.path.join(directory, name))
+
+    _maybe_evict()
+    return path
+
+
+def invalidate_offer(offer_pk):
+    shutil.rmtree(os.path.join(_cache_dir(), str(offer_pk)), ignore_errors=True)
+
+
+def evict(max_bytes=None, max_age=None):
+    """
+    Usuwa pliki starsze niż max_age (sekundy), a potem najdawniej używane,
+    dopóki cały cache nie zmieści się w max_bytes. Zwraca liczbę usuniętych plików.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+    if max_age is None:
+        max_age = getattr(settings, 'PDF_CACHE_MAX_AGE', 30 * 24 * 3600)
+
+    root = _cache_dir()
+    if not os.path.isdir(root):
+        return 0
+
+    now = time.time()
+    entries = []
+    removed = 0
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > max_age:
+                removed += _remove_quietly(path)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _mtime, size, _path in entries)
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        removed += _remove_quietly(path)
+        total -= size
+    return removed
+
+
+def _maybe_evict():
+    # Skanowanie katalogu nie musi się odbywać przy każdym zapisie
+    global _last_eviction
+    interval = getattr(settings, 'PDF_CACHE_EVICT_INTERVAL', 60)
+    if _last_eviction is None or time.monotonic() - _last_eviction >= interval:
+        _last_eviction = time.monotonic()
+        evict()
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
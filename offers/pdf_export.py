@@ -0,0 +1,133 @@
+import os
+import zipfile
+from concurrent.futures import as_completed
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Offer
+from .pdf import PDF_QUERYSET_RELATED, cached_offer_pdf, get_or_render_pdf
+from .pdf_jobs import create_process_pool
+
+# --- EKSPORT WIELU PDF-ÓW DO ZIP ---
+# PDF-y z cache idą do archiwum od razu, brakujące renderuje pula procesów.
+# Każdy plik trafia do ZIP-a w chwili, gdy jest gotowy, a archiwum wypływa
+# do klienta kawałkami - w pamięci nigdy nie ma całego ZIP-a.
+#
+# Pod ASGI StreamingHttpResponse ze zwykłym generatorem zostałby najpierw
+# zebrany w całości (sync_to_async(list)) - tam podajemy astream_offers_zip,
+# który pobiera kolejne kawałki tego samego generatora w wątku.
+
+CHUNK_SIZE = 64 * 1024
+
+
+def render_offer_to_cache(offer_id):
+    """Wywoływane w procesie puli - zwraca ścieżkę PDF-a w cache."""
+    offer = Offer.objects.select_related(*PDF_QUERYSET_RELATED).get(pk=offer_id)
+    return get_or_render_pdf(offer)
+
+
+def iter_offer_pdfs(queryset, workers=None):
+    """
+    Generator krotek (oferta, ścieżka_pdf, błąd) w kolejności ukończenia.
+    Pulę procesów tworzymy tylko wtedy, gdy czegoś brakuje w cache.
+    """
+    missing = {}
+    for offer in queryset.select_related(*PDF_QUERYSET_RELATED).iterator(chunk_size=200):
+        path = cached_offer_pdf(offer)
+        if path:
+            yield offer, path, None
+        else:
+            missing[offer.pk] = offer
+
+    if not missing:
+        return
+
+    workers = workers or getattr(settings, 'PDF_EXPORT_WORKERS', None) or os.cpu_count() or 1
+    with create_process_pool(min(workers, len(missing))) as pool:
+        futures = {pool.submit(render_offer_to_cache, pk): pk for pk in missing}
+        try:
+            for future in as_completed(futures):
+                offer = missing[futures[future]]
+                try:
+                    yield offer, future.result(), None
+                except Exception as e:
+                    yield offer, None, e
+        finally:
+            # Klient przerwał pobieranie - nie renderujemy reszty na darmo
+            for future in futures:
+                future.cancel()
+
+
+class _StreamBuffer:
+    """Minimalny, niewyszukiwalny "plik" - ZipFile pisze tu, a my zbieramy bajty."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_name(offer):
+    return f"Oferta_{offer.offer_number.replace('/', '_')}.pdf"
+
+
+def stream_offers_zip(queryset, workers=None):
+    """
+    Generator bajtów archiwum ZIP z PDF-ami ofert (do StreamingHttpResponse
+    albo zapisu do pliku). Nieudane oferty lądują w BLEDY.txt na końcu archiwum.
+    """
+    buffer = _StreamBuffer()
+    errors = []
+
+    # ZIP_STORED - PDF jest już skompresowany, kompresowanie drugi raz to strata CPU
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for offer, path, error in iter_offer_pdfs(queryset, workers=workers):
+            if error is not None:
+                errors.append(f"{offer.offer_number}: {error}")
+                continue
+
+            with open(path, 'rb') as source, archive.open(archive_name(offer), mode='w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            # CRC i rozmiary (data descriptor) ZipFile dopisuje przy zamknięciu wpisu
+            yield buffer.pop()
+
+        if errors:
+            archive.writestr('BLEDY.txt', "\n".join(errors))
+
+    yield buffer.pop()
+
+
+def _next_chunk(chunks):
+    # StopIteration nie przechodzi przez sync_to_async - koniec sygnalizujemy przez None
+    return next(chunks, None)
+
+
+async def astream_offers_zip(queryset, workers=None):
+    """stream_offers_zip() jako iterator asynchroniczny (StreamingHttpResponse pod ASGI)."""
+    chunks = stream_offers_zip(queryset, workers=workers)
+    try:
+        while (chunk := await sync_to_async(_next_chunk)(chunks)) is not None:
+            yield chunk
+    finally:
+        # Klient przerwał pobieranie - zamknięcie generatora anuluje renderowanie reszty
+        await sync_to_async(chunks.close)()
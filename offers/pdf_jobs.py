@@ -0,0 +1,106 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Offer, PdfRenderJob
+from .pdf import PDF_QUERYSET_RELATED, get_or_render_pdf
+
+# --- KOLEJKA PDF W BAZIE ---
+# Widok tylko wrzuca zadanie do tabeli i od razu oddaje odpowiedź.
+# Renderowanie robi `manage.py pdf_worker` w puli procesów (po jednym na rdzeń).
+
+ACTIVE_STATUSES = [PdfRenderJob.Status.QUEUED, PdfRenderJob.Status.RUNNING]
+
+
+def enqueue_pdf_job(offer, cache_key, user=None):
+    """
+    Zwraca zadanie dla tej wersji oferty - istniejące (w kolejce / w trakcie)
+    albo nowo utworzone. Wielokrotne kliknięcie "Pobierz PDF" nie mnoży pracy.
+    """
+    # W transakcji sprawdzenie idzie na bazę główną także w widoku czytającym z repliki
+    # (core/db_routers.py) - replika w tyle nie ukryje zadania utworzonego przed chwilą
+    with transaction.atomic():
+        job = PdfRenderJob.objects.filter(
+            offer=offer, cache_key=cache_key, status__in=ACTIVE_STATUSES
+        ).first()
+        if job:
+            return job
+        return PdfRenderJob.objects.create(offer=offer, cache_key=cache_key, requested_by=user)
+
+
+def claim_jobs(limit):
+    """
+    Przejmuje do `limit` zadań z kolejki. Warunkowy UPDATE (status='queued')
+    gwarantuje, że dwa workery nie wezmą tego samego zadania.
+    """
+    candidates = list(
+        PdfRenderJob.objects.filter(status=PdfRenderJob.Status.QUEUED)
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = []
+    now = timezone.now()
+    for pk in candidates:
+        updated = PdfRenderJob.objects.filter(pk=pk, status=PdfRenderJob.Status.QUEUED).update(
+            status=PdfRenderJob.Status.RUNNING, started_at=now, attempts=F('attempts') + 1
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def requeue_stale_jobs(older_than):
+    """Zadania 'running' porzucone przez martwego workera wracają do kolejki."""
+    return PdfRenderJob.objects.filter(
+        status=PdfRenderJob.Status.RUNNING,
+        started_at__lt=timezone.now() - older_than,
+    ).update(status=PdfRenderJob.Status.QUEUED)
+
+
+def mark_done(job_id):
+    PdfRenderJob.objects.filter(pk=job_id).update(
+        status=PdfRenderJob.Status.DONE, error='', finished_at=timezone.now()
+    )
+
+
+def mark_failed(job_id, error, max_attempts):
+    job = PdfRenderJob.objects.get(pk=job_id)
+    # Błąd przejściowy - próbujemy ponownie, dopóki nie wyczerpiemy limitu
+    status = PdfRenderJob.Status.FAILED if job.attempts >= max_attempts else PdfRenderJob.Status.QUEUED
+    PdfRenderJob.objects.filter(pk=job_id).update(
+        status=status, error=str(error)[:2000], finished_at=timezone.now()
+    )
+    return status
+
+
+# --- KOD WYKONYWANY W PROCESACH PULI ---
+
+def create_process_pool(workers):
+    """
+    Pula procesów do renderowania. Metoda 'spawn' zamiast 'fork' - dziecko nie
+    dziedziczy otwartych połączeń z bazą rodzica, tylko konfiguruje Django od zera.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def render_job(job_id):
+    """Renderuje PDF zadania (w procesie puli) i zwraca ścieżkę pliku w cache."""
+    job = PdfRenderJob.objects.only('offer_id').get(pk=job_id)
+    offer = Offer.objects.select_related(*PDF_QUERYSET_RELATED).get(pk=job.offer_id)
+    return get_or_render_pdf(offer)
+
+
+def delete_finished_jobs(older_than=timedelta(days=7)):
+    return PdfRenderJob.objects.filter(
+        status__in=[PdfRenderJob.Status.DONE, PdfRenderJob.Status.FAILED],
+        finished_at__lt=timezone.now() - older_than,
+    ).delete()[0]
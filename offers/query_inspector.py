@@ -0,0 +1,162 @@
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# --- INSPEKTOR ZAPYTAŃ SQL (N+1) ---
+# Włączany ustawieniem QUERY_INSPECTOR (zmienna środowiskowa QUERY_INSPECTOR=True).
+# QueryInspectorMiddleware zakłada na czas żądania rejestrator (ContextVar),
+# a wrapper podpięty do każdego połączenia z bazą (execute_wrapper) dopisuje do
+# niego każde zapytanie: SQL, czas i miejsce wywołania. ContextVar przechodzi
+# przez sync_to_async, więc zapytania widoków async z wątku ORM też są liczone.
+#
+# Zapytania grupujemy po "odcisku" (SQL bez wartości, listy IN zwinięte) -
+# ten sam SELECT powtórzony >= QUERY_INSPECTOR_REPEAT_THRESHOLD razy to
+# podejrzenie N+1, raportowane z linią szablonu lub kodu, która je wywołała.
+# Limity zapytań na widok: QUERY_BUDGETS = {'nazwa_url': limit}.
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+PROJECT_DIR = Path(settings.BASE_DIR).resolve()
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Widok wykonał więcej zapytań niż pozwala QUERY_BUDGETS (tylko przy QUERY_BUDGET_STRICT)."""
+
+
+def fingerprint(sql):
+    """SQL bez konkretnych wartości - `IN (%s, %s)` i `IN (%s)` dają ten sam odcisk."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERALS.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _template_origin(frame):
+    # Node.render_annotated trzyma węzeł szablonu z numerem linii
+    node = frame.f_locals.get('self')
+    token, origin = getattr(node, 'token', None), getattr(node, 'origin', None)
+    if token is None or origin is None:
+        return None
+    return f"{origin.template_name or origin.name}:{token.lineno}"
+
+
+def find_origin():
+    """
+    Miejsce wywołania zapytania: najbliższa linia szablonu i najbliższa linia kodu
+    projektu (poza Django i bibliotekami), np. "offers/x.html:12 <- offers/models.py:68 (__str__)".
+    """
+    frame = sys._getframe(2)
+    template_origin = code_origin = None
+    while frame is not None and template_origin is None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            template_origin = _template_origin(frame)
+        elif code_origin is None and code.co_filename != _THIS_FILE and 'site-packages' not in code.co_filename:
+            path = Path(code.co_filename)
+            if path.is_relative_to(PROJECT_DIR):
+                code_origin = f"{path.relative_to(PROJECT_DIR)}:{frame.f_lineno} ({code.co_name})"
+        frame = frame.f_back
+    return ' <- '.join(filter(None, (template_origin, code_origin))) or '?'
+
+
+class QueryLog:
+    """Zapytania jednego żądania."""
+
+    def __init__(self):
+        self.queries = []  # (odcisk, sekundy, miejsce wywołania)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _fp, duration, _origin in self.queries)
+
+    def repeated(self, threshold=None):
+        """[(odcisk, ile razy, najczęstsze miejsce wywołania)] dla SELECT-ów powtórzonych >= threshold razy."""
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_INSPECTOR_REPEAT_THRESHOLD', 3)
+        counts = Counter(fp for fp, _duration, _origin in self.queries)
+        result = []
+        for fp, count in counts.most_common():
+            if count < threshold:
+                break
+            if not fp.upper().startswith('SELECT'):
+                continue
+            origins = Counter(origin for other, _duration, origin in self.queries if other == fp)
+            result.append((fp, count, origins.most_common(1)[0][0]))
+        return result
+
+
+_current = ContextVar('query_inspector_log', default=None)
+
+
+def _record(execute, sql, params, many, context):
+    log = _current.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.queries.append((fingerprint(sql), time.perf_counter() - started, find_origin()))
+
+
+@receiver(connection_created)
+def _install(sender, connection, **kwargs):
+    # Wrapper zostaje na połączeniu; poza inspekcją to tylko odczyt ContextVar
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+@contextmanager
+def inspect():
+    """Zbiera zapytania z bloku (wszystkie połączenia, także wątki sync_to_async)."""
+    log = QueryLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+
+def budget_for(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(match.view_name)
+
+
+def report(request, response, log):
+    """Nagłówki z podsumowaniem, ostrzeżenia o N+1 i sprawdzenie limitu zapytań widoku."""
+    repeated = log.repeated()
+    response['X-Query-Count'] = str(log.count)
+    response['X-Query-Time-Ms'] = f"{log.total_time * 1000:.1f}"
+    response['X-Query-Repeated'] = str(len(repeated))
+    if repeated:
+        response['X-Query-Repeated-Origin'] = repeated[0][2]
+    for fp, count, origin in repeated:
+        logger.warning("N+1? %s %s: %dx z %s: %s", request.method, request.path, count, origin, fp[:300])
+
+    budget = budget_for(request)
+    if budget is not None and log.count > budget:
+        message = (f"{request.resolver_match.view_name}: {log.count} zapytań przy limicie {budget}"
+                   + "".join(f"\n  {count}x {origin}: {fp[:200]}" for fp, count, origin in repeated))
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning("Przekroczony limit zapytań - %s", message)
+    return response
@@ -0,0 +1,77 @@
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Offer, OfferEvent
+from .workflow import TRANSITIONS
+
+# --- PLANY GŁÓWNYCH ZAPYTAŃ O OFERTY ---
+# Te same zapytania, które wykonują lista ofert (z filtrami i kolejną stroną
+# kursora), kolejka CEO, panel admina, szczegóły i zmiana statusu - z
+# wartościami wziętymi z bazy. `manage.py explain_offer_queries` wypisuje ich
+# EXPLAIN i zaznacza pełne skany tabel oraz sortowanie poza indeksem.
+
+PAGE = 26  # jak lista ofert: strona + 1 wiersz, żeby wiedzieć, czy jest następna
+LIST_ORDER = ('-created_at', '-pk')
+
+_SQLITE_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def _sample():
+    """Wartości do zapytań: środkowa oferta listy (kursor) i jej klient/wystawca/autor."""
+    middle = Offer.objects.count() // 2
+    return Offer.objects.order_by(*LIST_ORDER).values(
+        'pk', 'created_at', 'status', 'client__company_id', 'seller_id', 'created_by_id',
+    )[middle:middle + 1].first()
+
+
+def main_queries():
+    """[(nazwa, queryset)] - pusta lista, gdy w bazie nie ma ofert."""
+    offer = _sample()
+    if offer is None:
+        return []
+    listing = Offer.objects.select_related('client__company').order_by(*LIST_ORDER)
+    # Warunek kursora jak w offers/pagination.py
+    after = Q(created_at__lte=offer['created_at']) & (
+        Q(created_at__lt=offer['created_at']) | Q(created_at=offer['created_at'], pk__lt=offer['pk'])
+    )
+    return [
+        ('lista ofert', listing[:PAGE]),
+        ('lista ofert - kolejna strona', listing.filter(after)[:PAGE]),
+        ('lista ofert - status', listing.filter(status=offer['status'])[:PAGE]),
+        ('lista ofert - status, kolejna strona', listing.filter(after, status=offer['status'])[:PAGE]),
+        ('lista ofert - firma klienta', listing.filter(client__company=offer['client__company_id'])[:PAGE]),
+        ('lista ofert - wystawca', listing.filter(seller=offer['seller_id'])[:PAGE]),
+        ('lista ofert - autor', listing.filter(created_by=offer['created_by_id'])[:PAGE]),
+        ('kolejka CEO (oczekujące)', Offer.objects.filter(status=Offer.Status.PENDING).order_by('-created_at')[:PAGE]),
+        ('admin - status i ostatnie 7 dni', Offer.objects.filter(
+            status=offer['status'], created_at__gte=timezone.now() - timedelta(days=7),
+        ).order_by(*LIST_ORDER)[:20]),
+        ('szczegóły oferty', Offer.objects.select_related('client__company').filter(pk=offer['pk'])),
+        ('historia oferty', OfferEvent.objects.filter(offer_id=offer['pk'])[:50]),
+        ('zmiana statusu (warunek)', Offer.objects.filter(
+            pk__in=[offer['pk']], status__in=TRANSITIONS['approve'].sources,
+        )),
+    ]
+
+
+def explain(queryset, analyze=False):
+    if analyze and connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def full_scans(plan):
+    """Tabele czytane w całości wg planu (SQLite: SCAN bez indeksu, PostgreSQL: Seq Scan)."""
+    pattern = _POSTGRES_SCAN if connection.vendor == 'postgresql' else _SQLITE_SCAN
+    return sorted(set(pattern.findall(plan)))
+
+
+def sorts_outside_index(plan):
+    if connection.vendor == 'postgresql':
+        return bool(re.search(r'^\s*(->\s*)?Sort\b', plan, re.MULTILINE))
+    return 'USE TEMP B-TREE FOR ORDER BY' in plan
@@ -0,0 +1,133 @@
+from import_export import fields, resources, widgets
+
+from . import search, stats
+from .models import Client, Company, Offer, Product, SearchDocument, normalize_email, normalize_nip
+
+# --- ZASOBY IMPORT/EXPORT (panel admina) ---
+# Domyślny ModelResource robi SELECT na każdy wiersz pliku (get_instance),
+# a potem osobny INSERT/UPDATE. Tutaj istniejące rekordy ładujemy jednym
+# zapytaniem po znormalizowanych kluczach, nowe zapisujemy hurtem jako upsert
+# (jak offers/crm_sync.py), zmienione - przez bulk_update.
+
+
+class UpsertResource(resources.ModelResource):
+    # Ustawiane w podklasie: pole źródłowe (= kolumna pliku), pole klucza, rodzaj dokumentu w indeksie
+    # i funkcja normalizująca klucz (normalize_nip / normalize_email)
+    upsert_source = upsert_key = upsert_kind = None
+    normalizer = None
+
+    def normalize(self, value):
+        # Arkusz potrafi zwrócić NIP jako liczbę
+        return self.normalizer(str(value) if value is not None else None)
+
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        keys = {self.normalize(value) for value in dataset[self.upsert_source]} - {None}
+        model = self._meta.model
+        self._instances = {
+            getattr(obj, self.upsert_key): obj
+            for obj in model.objects.filter(**{f'{self.upsert_key}__in': keys})
+        }
+        self._touched_keys = set()
+
+    def get_instance(self, instance_loader, row):
+        return self._instances.get(self.normalize(row.get(self.upsert_source)))
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # Zapis hurtowy omija Model.save() - klucz ustawiamy sami
+        key = self.normalize(getattr(instance, self.upsert_source))
+        setattr(instance, self.upsert_key, key)
+        self._touched_keys.add(key)
+        super().before_save_instance(instance, row, **kwargs)
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        if self.create_instances and (using_transactions or not dry_run):
+            # Ten sam klucz dwa razy w pliku - wygrywa ostatni wiersz (jeden upsert nie może dotknąć wiersza dwa razy)
+            unique = {getattr(obj, self.upsert_key): obj for obj in self.create_instances}
+            try:
+                self._meta.model.objects.bulk_create(
+                    list(unique.values()), batch_size=batch_size,
+                    update_conflicts=True, unique_fields=[self.upsert_key],
+                    update_fields=self.get_bulk_update_fields(),
+                )
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.create_instances.clear()
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        if not kwargs.get('dry_run') and self._touched_keys:
+            model = self._meta.model
+            ids = model.objects.filter(**{f'{self.upsert_key}__in': self._touched_keys}).values_list('pk', flat=True)
+            search.reindex(self.upsert_kind, ids)
+
+
+class CompanyResource(UpsertResource):
+    upsert_source, upsert_key, upsert_kind = 'nip', 'nip_normalized', SearchDocument.Kind.COMPANY
+    normalizer = staticmethod(normalize_nip)
+
+    class Meta:
+        model = Company
+        fields = ('name', 'nip', 'address')
+        import_id_fields = ('nip',)
+        use_bulk = True
+        batch_size = 1000
+        skip_unchanged = True
+
+
+class CompanyByNipWidget(widgets.ForeignKeyWidget):
+    """Firma po NIP w dowolnym zapisie; słownik wypełnia ClientResource.before_import."""
+
+    def __init__(self):
+        super().__init__(Company, field='nip_normalized')
+        self.companies = {}
+
+    def clean(self, value, row=None, **kwargs):
+        key = normalize_nip(str(value) if value is not None else None)
+        if key is None:
+            return None
+        if key not in self.companies:
+            self.companies[key] = Company.objects.get(nip_normalized=key)
+        return self.companies[key]
+
+
+class ClientResource(UpsertResource):
+    upsert_source, upsert_key, upsert_kind = 'email', 'email_normalized', SearchDocument.Kind.CLIENT
+    normalizer = staticmethod(normalize_email)
+
+    company = fields.Field(attribute='company', column_name='company_nip', widget=CompanyByNipWidget())
+
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        widget = self.fields['company'].widget
+        keys = {normalize_nip(str(value)) for value in dataset['company_nip'] if value} - {None}
+        widget.companies = {company.nip_normalized: company
+                            for company in Company.objects.filter(nip_normalized__in=keys)}
+        # Zapis hurtowy omija sygnały - zmianę firmy kontaktu przenosimy do statystyk sami
+        self._stats_before = stats.snapshot_offers(
+            Offer.objects.filter(client__in=self._instances.values()).values_list('pk', flat=True)
+        )
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        if not kwargs.get('dry_run') and self._stats_before:
+            stats.apply_changes(self._stats_before, stats.snapshot_offers(self._stats_before))
+
+    class Meta:
+        model = Client
+        fields = ('email', 'first_name', 'last_name', 'phone', 'position', 'company')
+        import_id_fields = ('email',)
+        use_bulk = True
+        batch_size = 1000
+        skip_unchanged = True
+
+
+class ProductResource(resources.ModelResource):
+    """Import cennika - produkty dopasowywane po SKU."""
+
+    class Meta:
+        model = Product
+        fields = ('sku', 'name', 'price_pln', 'price_eur', 'vat_rate', 'is_active')
+        import_id_fields = ('sku',)
+        skip_unchanged = True
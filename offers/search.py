@@ -0,0 +1,198 @@
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Offer, Client, Company, Seller, SearchDocument
+
+# --- WYSZUKIWANIE PEŁNOTEKSTOWE ---
+# Zamiast icontains po kilku JOIN-ach (LIKE '%x%' = pełny skan) trzymamy
+# jeden znormalizowany dokument na ofertę / klienta / firmę w SearchDocument,
+# a nad nim indeks pełnotekstowy (migracja 0008):
+#   SQLite   - tabela wirtualna FTS5 offers_search_fts, synchronizowana triggerami,
+#   Postgres - kolumna search_vector (tsvector, GENERATED) z indeksem GIN.
+# Polskie znaki usuwamy przy zapisie i przy zapytaniu ("Łódź" == "lodz"),
+# a każde słowo zapytania dopasowujemy jako prefiks ("kow" -> "Kowalski").
+
+FTS_TABLE = 'offers_search_fts'
+MAX_TERMS = 8
+
+# Litery, których NFKD nie rozkłada na literę bazową + znak diakrytyczny
+_EXTRA_FOLDING = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O', 'ß': 'ss'})
+
+
+def normalize(text):
+    """Małe litery, bez diakrytyków: 'Źdźbło Sp. z o.o.' -> 'zdzblo sp. z o.o.'"""
+    text = (text or '').translate(_EXTRA_FOLDING)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def search_terms(query):
+    return re.findall(r'\w+', normalize(query))[:MAX_TERMS]
+
+
+def _digits(value):
+    # NIP "123-456-78-90" da się wtedy znaleźć także jako "1234567890"
+    return re.sub(r'\D', '', value or '')
+
+
+def _join(*parts):
+    return normalize(' '.join(str(p) for p in parts if p))
+
+
+# --- BUDOWANIE DOKUMENTÓW ---
+
+def _offer_bodies(offer_ids):
+    rows = Offer.objects.filter(pk__in=offer_ids).values_list(
+        'pk', 'offer_number', 'client__first_name', 'client__last_name', 'client__email',
+        'client__company__name', 'client__company__nip', 'seller__name',
+    )
+    for pk, number, first, last, email, company, nip, seller in rows:
+        yield pk, _join(number, first, last, email, company, nip, _digits(nip), seller)
+
+
+def _client_bodies(client_ids):
+    rows = Client.objects.filter(pk__in=client_ids).values_list(
+        'pk', 'first_name', 'last_name', 'email', 'phone', 'position', 'company__name', 'company__nip',
+    )
+    for pk, first, last, email, phone, position, company, nip in rows:
+        yield pk, _join(first, last, email, phone, _digits(phone), position, company, _digits(nip))
+
+
+def _company_bodies(company_ids):
+    for pk, name, nip, address in Company.objects.filter(pk__in=company_ids).values_list(
+            'pk', 'name', 'nip', 'address'):
+        yield pk, _join(name, nip, _digits(nip), address)
+
+
+_BUILDERS = {
+    SearchDocument.Kind.OFFER: _offer_bodies,
+    SearchDocument.Kind.CLIENT: _client_bodies,
+    SearchDocument.Kind.COMPANY: _company_bodies,
+}
+
+
+def reindex(kind, object_ids, batch_size=1000):
+    """
+    Przebudowuje dokumenty podanych obiektów: DELETE + bulk INSERT w paczkach.
+    Obiekty, których już nie ma, po prostu znikają z indeksu.
+    """
+    object_ids = list(object_ids)
+    for start in range(0, len(object_ids), batch_size):
+        batch = object_ids[start:start + batch_size]
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=kind, object_id__in=batch).delete()
+            SearchDocument.objects.bulk_create(
+                SearchDocument(kind=kind, object_id=pk, body=body) for pk, body in _BUILDERS[kind](batch)
+            )
+
+
+def rebuild(batch_size=1000):
+    """Pełna przebudowa indeksu (manage.py rebuild_search_index)."""
+    SearchDocument.objects.all().delete()
+    counts = {}
+    for kind, model in ((SearchDocument.Kind.OFFER, Offer),
+                        (SearchDocument.Kind.CLIENT, Client),
+                        (SearchDocument.Kind.COMPANY, Company)):
+        ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+        reindex(kind, ids, batch_size=batch_size)
+        counts[kind] = len(ids)
+    return counts
+
+
+# --- ZAPYTANIA ---
+
+def matching_documents(kind, query):
+    """
+    Queryset SearchDocument pasujących do zapytania (każde słowo jako prefiks).
+    Zwraca None dla pustego zapytania.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return None
+
+    documents = SearchDocument.objects.filter(kind=kind)
+    if connection.vendor == 'sqlite':
+        fts_query = ' '.join(f'"{term}"*' for term in terms)
+        return documents.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query]
+        ))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVectorField
+
+        # search_vector nie jest polem modelu (kolumna GENERATED z migracji) - dołączamy ją jako alias.
+        # Bez nazwy tabeli: w podzapytaniu filter_queryset() tabela dostaje alias (U0).
+        ts_query = ' & '.join(f"{term}:*" for term in terms)
+        return documents.alias(
+            search_vector=RawSQL('search_vector', [], output_field=SearchVectorField()),
+        ).filter(search_vector=SearchQuery(ts_query, config='simple', search_type='raw'))
+
+    # Inne bazy - bez indeksu, ale z tą samą normalizacją
+    condition = Q()
+    for term in terms:
+        condition &= Q(body__contains=term)
+    return documents.filter(condition)
+
+
+def filter_queryset(queryset, kind, query):
+    """Zawęża queryset modelu do obiektów pasujących do zapytania - jedno zapytanie z podzapytaniem."""
+    documents = matching_documents(kind, query)
+    if documents is None:
+        return queryset
+    return queryset.filter(pk__in=documents.values('object_id'))
+
+
+# --- SYNCHRONIZACJA (sygnały podpinane w OffersConfig.ready) ---
+
+@receiver(post_save, sender=Offer)
+def _index_offer(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex(SearchDocument.Kind.OFFER, [instance.pk])
+
+
+@receiver(post_save, sender=Client)
+def _index_client(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reindex(SearchDocument.Kind.CLIENT, [instance.pk])
+    # Nazwisko / email klienta są też w dokumentach jego ofert
+    reindex(SearchDocument.Kind.OFFER, Offer.objects.filter(client=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Company)
+def _index_company(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reindex(SearchDocument.Kind.COMPANY, [instance.pk])
+    reindex(SearchDocument.Kind.CLIENT, instance.employees.values_list('pk', flat=True))
+    reindex(SearchDocument.Kind.OFFER,
+            Offer.objects.filter(client__company=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=Seller)
+def _remember_seller_name(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._indexed_name = Seller.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Seller)
+def _index_seller(sender, instance, created=False, raw=False, **kwargs):
+    # Nazwa wystawcy jest w dokumentach jego ofert. Wystawca ma ich tysiące -
+    # przebudowujemy je tylko przy zmianie nazwy, nie np. po podmianie logo.
+    if raw or created or getattr(instance, '_indexed_name', None) == instance.name:
+        return
+    reindex(SearchDocument.Kind.OFFER, Offer.objects.filter(seller=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Offer)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Company)
+def _unindex(sender, instance, **kwargs):
+    kind = {Offer: SearchDocument.Kind.OFFER, Client: SearchDocument.Kind.CLIENT,
+            Company: SearchDocument.Kind.COMPANY}[sender]
+    SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
@@ -0,0 +1,161 @@
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import crm_sync
+from .importing import import_offers
+from .models import Offer, OfferItem, Seller
+
+# --- SYNTETYCZNE DANE DO TESTÓW WYDAJNOŚCI ---
+# Firmy, kontakty, wystawcy, oferty i pozycje generowane z ziarna (--seed),
+# więc ten sam przebieg daje zawsze te same dane. Zapis idzie istniejącymi
+# ścieżkami hurtowymi: firmy i kontakty przez upsert z offers/crm_sync.py,
+# oferty z pozycjami przez import z offers/importing.py (sumy, statystyki
+# i indeks wyszukiwania liczone raz na paczkę). Oferty mają numery
+# BENCH/0000001... - ponowne uruchomienie pomija te, które już są w bazie.
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+NUMBER_PREFIX = 'BENCH/'
+BENCH_USERNAME = 'bench'
+HISTORY_DAYS = 730
+
+_COMPANY_WORDS = ('Agro', 'Bud', 'Data', 'Energo', 'Farm', 'Geo', 'Hydro', 'Info', 'Logi', 'Med', 'Neo', 'Omni',
+                  'Pol', 'Rem', 'Stal', 'Tech', 'Trans', 'Wod')
+_COMPANY_SUFFIXES = ('mex', 'pol', 'tron', 'serwis', 'system', 'net', 'bud', 'sfera')
+_FIRST_NAMES = ('Anna', 'Piotr', 'Katarzyna', 'Tomasz', 'Magdalena', 'Krzysztof', 'Agnieszka', 'Paweł', 'Ewa', 'Michał')
+_LAST_NAMES = ('Nowak', 'Kowalski', 'Wiśniewski', 'Wójcik', 'Kamiński', 'Lewandowski', 'Zieliński', 'Szymański',
+               'Woźniak', 'Dąbrowski')
+_PRODUCTS = ('Serwer rack', 'Laptop', 'Monitor 27"', 'Licencja roczna', 'Kabel HDMI', 'Przełącznik 24 porty',
+             'Wdrożenie', 'Szkolenie', 'Dysk SSD', 'Zasilacz UPS', 'Drukarka', 'Router', 'Abonament serwisowy')
+# Rozkład statusów zbliżony do produkcyjnego: dużo wysłanych i zatwierdzonych, mało w toku
+_STATUS_WEIGHTS = (
+    (Offer.Status.DRAFT, 15), (Offer.Status.PENDING, 5), (Offer.Status.IN_CONSULTATION, 3),
+    (Offer.Status.APPROVED, 25), (Offer.Status.SENT, 45), (Offer.Status.REJECTED, 7),
+)
+_VAT_WEIGHTS = ((Decimal('23.00'), 85), (Decimal('8.00'), 10), (Decimal('5.00'), 3), (Decimal('0.00'), 2))
+
+
+@dataclass
+class SeedResult:
+    companies: int = 0
+    clients: int = 0
+    sellers: int = 0
+    offers: int = 0
+    items: int = 0
+    skipped: int = 0
+
+
+def bench_user():
+    """Użytkownik, na którego zapisujemy oferty i którym loguje się benchmark."""
+    user, created = User.objects.get_or_create(
+        username=BENCH_USERNAME, defaults={'is_staff': True, 'is_superuser': True},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    return user
+
+
+def company_nip(index):
+    # Zakres 9xxxxxxxxx - nie zderza się z prawdziwymi NIP-ami w bazie deweloperskiej
+    return f"{9_000_000_000 + index}"
+
+
+def client_email(index):
+    return f"klient{index}@bench.example.com"
+
+
+def _company_rows(count, rng):
+    for index in range(count):
+        name = f"{rng.choice(_COMPANY_WORDS)}{rng.choice(_COMPANY_SUFFIXES)} {index} Sp. z o.o."
+        yield index + 1, {'name': name, 'nip': company_nip(index), 'address': f"ul. Testowa {index % 200 + 1}, Warszawa"}
+
+
+def _client_rows(count, companies, rng):
+    for index in range(count):
+        yield index + 1, {
+            'email': client_email(index),
+            'first_name': rng.choice(_FIRST_NAMES),
+            'last_name': rng.choice(_LAST_NAMES),
+            'phone': f"+48 600 {index % 1000:03d} {index // 1000 % 1000:03d}",
+            'company_nip': company_nip(index % companies),
+        }
+
+
+def _sellers(count):
+    sellers = []
+    for index in range(count):
+        seller, _created = Seller.objects.get_or_create(
+            name=f"BENCH Wystawca {index + 1}",
+            defaults={'nip': f"52{index:08d}", 'address': "ul. Benchmarkowa 1, Warszawa"},
+        )
+        sellers.append(seller.name)
+    return sellers
+
+
+def _offer_rows(first, count, total, clients, sellers, items_per_offer, rng):
+    """Wiersze importu (nr, dict) - jeden wiersz na pozycję, jak w pliku dla import_offers."""
+    statuses, status_weights = zip(*_STATUS_WEIGHTS)
+    vat_rates, vat_weights = zip(*_VAT_WEIGHTS)
+    start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=HISTORY_DAYS)
+    line = 0
+    for number in range(first, first + count):
+        # Dni rosną z numerem, godzina w ciągu dnia pracy jest losowa
+        day = (number - 1) * HISTORY_DAYS // total
+        offer = {
+            'offer_number': f"{NUMBER_PREFIX}{number:07d}",
+            'created_at': start + timedelta(days=day, hours=rng.randint(8, 17), minutes=rng.randint(0, 59)),
+            'status': rng.choices(statuses, status_weights)[0],
+            'seller': rng.choice(sellers),
+            'client': client_email(rng.randrange(clients)),
+        }
+        for _ in range(rng.randint(1, 2 * items_per_offer - 1)):
+            price = Decimal(rng.randint(1_000, 2_000_000)) / 100
+            line += 1
+            yield line, {
+                **offer,
+                'description': f"{rng.choice(_PRODUCTS)} {rng.randint(1, 999)}",
+                'quantity': rng.randint(1, 20),
+                'price_per_unit': price,
+                'price_in_eur': (price / Decimal('4.3')).quantize(Decimal('0.01')) if rng.random() < 0.2 else None,
+                'vat_rate': rng.choices(vat_rates, vat_weights)[0],
+            }
+
+
+def generate(offers, items_per_offer=5, seed=0, chunk_size=50_000, progress=None):
+    """
+    Generuje zbiór danych dla `offers` ofert. Firm jest ~offers/20, kontaktów
+    dwa razy więcej. `progress(gotowe, wszystkie)` wołane po każdej paczce ofert.
+    """
+    rng = random.Random(seed)
+    companies = max(5, offers // 20)
+    clients = companies * 2
+    result = SeedResult()
+
+    result.companies = crm_sync.upsert_companies(_company_rows(companies, rng)).created
+    result.clients = crm_sync.upsert_clients(_client_rows(clients, companies, rng)).created
+    sellers = _sellers(3)
+    result.sellers = len(sellers)
+    user = bench_user()
+
+    for first in range(1, offers + 1, chunk_size):
+        count = min(chunk_size, offers + 1 - first)
+        imported = import_offers(_offer_rows(first, count, offers, clients, sellers, items_per_offer, rng), user=user)
+        result.offers += imported.offers_created
+        result.items += imported.items_created
+        result.skipped += imported.offers_skipped
+        if progress:
+            progress(first + count - 1, offers)
+    return result
+
+
+def seeded_offers():
+    return Offer.objects.filter(offer_number__startswith=NUMBER_PREFIX)
+
+
+def seeded_items():
+    return OfferItem.objects.filter(offer__offer_number__startswith=NUMBER_PREFIX)
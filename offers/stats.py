@@ -0,0 +1,199 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DEFERRED, Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Client, Offer, OfferDailyStat
+
+# --- STATYSTYKI: PRZYROSTOWE ODŚWIEŻANIE ROLLUPU ---
+# Każda zmiana oferty (status, kwoty, usunięcie) to "zdjęcie przed" i "zdjęcie po".
+# Kubełek zawiera firmę klienta - przeniesienie kontaktu do innej firmy też
+# przenosi jego oferty (sygnały Client, synchronizacja CRM i import w adminie).
+# Różnica trafia do OfferDailyStat jako -1 w starym kubełku i +1 w nowym,
+# więc koszt jest stały - niezależny od liczby ofert w bazie. Zapis z update_fields
+# bez pól kubełka i kwot nic nie liczy; kontakt porównuje firmę z wartością
+# zapamiętaną przy wczytaniu, bez dodatkowego SELECT-a.
+# Pełne przeliczenie od zera: manage.py rebuild_offer_stats
+
+SNAPSHOT_FIELDS = (
+    'pk', 'created_at', 'status', 'seller_id', 'created_by_id', 'client__company_id',
+    'total_price', 'total_gross',
+)
+
+BUCKET_FIELDS = ('day', 'status', 'seller_id', 'created_by_id', 'company_id')
+
+# Pola oferty, od których zależy kubełek albo kwoty (update_fields podaje nazwy pól lub attname)
+TRACKED_OFFER_FIELDS = frozenset({
+    'created_at', 'status', 'seller', 'seller_id', 'created_by', 'created_by_id',
+    'client', 'client_id', 'total_price', 'total_gross',
+})
+
+
+def snapshot_offers(offer_ids):
+    """{pk: (kubełek, netto, brutto)} dla podanych ofert - jedno zapytanie."""
+    offer_ids = list(offer_ids)
+    if not offer_ids:
+        return {}
+    snapshot = {}
+    for pk, created_at, status, seller_id, created_by_id, company_id, net, gross in (
+            Offer.objects.filter(pk__in=offer_ids).order_by().values_list(*SNAPSHOT_FIELDS)):
+        bucket = (timezone.localdate(created_at), status, seller_id, created_by_id, company_id)
+        snapshot[pk] = (bucket, net or Decimal('0'), gross or Decimal('0'))
+    return snapshot
+
+
+def apply_changes(before, after):
+    """Przenosi różnicę między dwoma zdjęciami ofert do tabeli statystyk."""
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for sign, snapshot in ((-1, before), (1, after)):
+        for bucket, net, gross in snapshot.values():
+            delta = deltas[bucket]
+            delta[0] += sign
+            delta[1] += sign * net
+            delta[2] += sign * gross
+
+    for bucket, (count, net, gross) in deltas.items():
+        if count == 0 and net == 0 and gross == 0:
+            continue
+        _add_to_bucket(bucket, count, net, gross)
+
+
+def _bucket_row(bucket):
+    lookup = {}
+    for name, value in zip(BUCKET_FIELDS, bucket):
+        # NULL trzeba porównywać przez __isnull, "= NULL" nic nie znajdzie
+        if value is None:
+            lookup[f"{name.removesuffix('_id')}__isnull"] = True
+        else:
+            lookup[name] = value
+    return OfferDailyStat.objects.filter(**lookup).values_list('pk', flat=True).first()
+
+
+def _add_to_bucket(bucket, count, net, gross):
+    row_id = _bucket_row(bucket)
+    if row_id is None and count < 0 and bucket[-1] is not None:
+        # Usuwanie firmy: kaskada ustawiła już company=NULL w wierszach statystyk
+        # (SET_NULL idzie przed post_delete ofert) - odejmujemy z kubełka bez firmy,
+        # nie tworzymy wiersza wskazującego na usuwaną firmę.
+        bucket = (*bucket[:-1], None)
+        row_id = _bucket_row(bucket)
+    if row_id is None:
+        OfferDailyStat.objects.create(
+            **dict(zip(BUCKET_FIELDS, bucket)), offer_count=count, total_net=net, total_gross=gross
+        )
+    else:
+        OfferDailyStat.objects.filter(pk=row_id).update(
+            offer_count=F('offer_count') + count,
+            total_net=F('total_net') + net,
+            total_gross=F('total_gross') + gross,
+        )
+
+
+@contextmanager
+def track_offers(offer_ids):
+    """
+    Dla zmian omijających sygnały (queryset.update()):
+
+        with track_offers(ids):
+            Offer.objects.filter(pk__in=ids).update(status=...)
+    """
+    offer_ids = list(offer_ids)
+    with transaction.atomic():
+        before = snapshot_offers(offer_ids)
+        yield
+        apply_changes(before, snapshot_offers(offer_ids))
+
+
+def rebuild():
+    """Przelicza całą tabelę od zera jednym GROUP BY po ofertach. Zwraca liczbę wierszy."""
+    rows = (
+        Offer.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'seller_id', 'created_by_id', 'client__company_id')
+        .annotate(offer_count=Count('pk'), total_net=Sum('total_price'), total_gross=Sum('total_gross'))
+    )
+    with transaction.atomic():
+        OfferDailyStat.objects.all().delete()
+        created = OfferDailyStat.objects.bulk_create(
+            (
+                OfferDailyStat(
+                    day=row['day'], status=row['status'], seller_id=row['seller_id'],
+                    created_by_id=row['created_by_id'], company_id=row['client__company_id'],
+                    offer_count=row['offer_count'], total_net=row['total_net'] or 0,
+                    total_gross=row['total_gross'] or 0,
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+    return len(created)
+
+
+# --- SYGNAŁY (podpinane w OffersConfig.ready) ---
+
+def _skips_stats(update_fields):
+    return update_fields is not None and not TRACKED_OFFER_FIELDS.intersection(update_fields)
+
+
+@receiver(pre_save, sender=Offer)
+def _remember_offer_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or _skips_stats(update_fields):
+        instance._stats_before = {}
+    else:
+        instance._stats_before = snapshot_offers([instance.pk])
+
+
+@receiver(post_save, sender=Offer)
+def _update_stats_after_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or _skips_stats(update_fields):
+        return
+    before = getattr(instance, '_stats_before', {})
+    apply_changes(before, snapshot_offers([instance.pk]))
+    instance._stats_before = {}
+
+
+@receiver(pre_delete, sender=Offer)
+def _remember_deleted_offer(sender, instance, **kwargs):
+    instance._stats_before = snapshot_offers([instance.pk])
+
+
+@receiver(post_delete, sender=Offer)
+def _update_stats_after_delete(sender, instance, **kwargs):
+    apply_changes(getattr(instance, '_stats_before', {}), {})
+
+
+@receiver(post_init, sender=Client)
+def _remember_loaded_company(sender, instance, **kwargs):
+    # Z __dict__, nie przez atrybut - pole odroczone (only()/defer()) nie dociągnie się zapytaniem
+    instance._stats_company_id = instance.__dict__.get('company_id', DEFERRED)
+
+
+@receiver(pre_save, sender=Client)
+def _remember_client_offers(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stats_before = {}
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {'company', 'company_id'}.intersection(update_fields):
+        return
+    company_id = getattr(instance, '_stats_company_id', DEFERRED)
+    if company_id is DEFERRED:
+        company_id = Client.objects.filter(pk=instance.pk).values_list('company_id', flat=True).first()
+    if company_id != instance.company_id:
+        instance._stats_before = snapshot_offers(Offer.objects.filter(client=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Client)
+def _update_stats_after_client_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields is None or {'company', 'company_id'}.intersection(update_fields):
+        instance._stats_company_id = instance.company_id
+    before = getattr(instance, '_stats_before', {})
+    if raw or not before:
+        return
+    apply_changes(before, snapshot_offers(before))
+    instance._stats_before = {}
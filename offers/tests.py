@@ -1,3 +1,1189 @@
-from django.test import TestCase
+import io
+import os
+import random
+import zipfile
+import shutil
+import smtplib
+import tempfile
 
-# Create your tests here.
+import tablib
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from unittest import mock, skipUnless
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import pdf_cache, pdf_jobs
+from .pdf import cached_offer_pdf, offer_pdf_cache_key, resolve_logo_url
+from .pdf_export import astream_offers_zip, stream_offers_zip
+
+try:
+    import weasyprint  # noqa: F401
+    HAS_WEASYPRINT = True
+except (ImportError, OSError):
+    # Brak bibliotek systemowych (Pango/Cairo) - testy renderowania pomijamy
+    HAS_WEASYPRINT = False
+from . import (benchmark, catalog, crm_sync, currency, history, mailing, numbering, query_plans, search, seeding,
+               stats, workflow)
+from .models import (Company, Client, Seller, Offer, OfferItem, OfferDailyStat, OfferNumberCounter, PdfRenderJob,
+                     Product, SearchDocument, ExchangeRate, OfferEvent, OutboundEmail,
+                     defer_total_recalculation)
+from . import importing
+from .importing import ImportFileError, import_offers, iter_rows
+from .pagination import keyset_paginate
+from .query_inspector import QueryBudgetExceeded, fingerprint
+from .resources import CompanyResource
+from core.db_routers import PIN_COOKIE, ReplicaRouter, replica_reads
+
+
+class OfferTestMixin:
+    """Wspólne dane testowe: firma, klient, wystawca i użytkownik."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('ceo', 'ceo@example.com', 'haslo123')
+        cls.company = Company.objects.create(name='Acme', nip='123-456-78-90')
+        cls.client_obj = Client.objects.create(
+            company=cls.company, first_name='Jan', last_name='Kowalski', email='jan@acme.pl'
+        )
+        cls.seller = Seller.objects.create(name='Nasza Firma', nip='111', address='Warszawa')
+
+    def make_offer(self, number, **kwargs):
+        kwargs.setdefault('client', self.client_obj)
+        kwargs.setdefault('seller', self.seller)
+        return Offer.objects.create(offer_number=number, **kwargs)
+
+
+class KeysetPaginationTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.offers = [self.make_offer(f"OF/{i:03d}") for i in range(7)]
+        # Dwie oferty z identycznym created_at - kursor musi rozstrzygać po id
+        for i, offer in enumerate(self.offers):
+            created = now - timedelta(minutes=i // 2)
+            Offer.objects.filter(pk=offer.pk).update(created_at=created)
+
+    def test_walks_all_pages_without_gaps_or_duplicates(self):
+        seen = []
+        page = keyset_paginate(Offer.objects.all(), per_page=3)
+        seen += [o.pk for o in page]
+        while page.has_next:
+            page = keyset_paginate(Offer.objects.all(), after=page.next_cursor, per_page=3)
+            seen += [o.pk for o in page]
+
+        expected = list(Offer.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_before_cursor_returns_previous_page(self):
+        first = keyset_paginate(Offer.objects.all(), per_page=3)
+        second = keyset_paginate(Offer.objects.all(), after=first.next_cursor, per_page=3)
+        back = keyset_paginate(Offer.objects.all(), before=second.prev_cursor, per_page=3)
+        self.assertEqual([o.pk for o in back], [o.pk for o in first])
+        self.assertFalse(back.has_previous)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = keyset_paginate(Offer.objects.all(), after='nie-kursor', per_page=3)
+        self.assertEqual(len(page), 3)
+        self.assertFalse(page.has_previous)
+
+
+class OfferListViewTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_filters_by_status(self):
+        self.make_offer('OF/A', status=Offer.Status.APPROVED)
+        self.make_offer('OF/D', status=Offer.Status.DRAFT)
+        response = self.client.get(reverse('offer_list'), {'status': Offer.Status.APPROVED})
+        self.assertContains(response, 'OF/A')
+        self.assertNotContains(response, 'OF/D')
+
+    def test_filters_by_company_nip_without_loading_all_companies(self):
+        other = Company.objects.create(name='Beta', nip='555')
+        self.make_offer('OF/ACME')
+        self.make_offer('OF/BETA', client=Client.objects.create(
+            company=other, first_name='Ewa', last_name='Lis', email='ewa@beta.pl'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('offer_list'), {'company': 'PL 123-456-78-90'})
+        self.assertContains(response, 'OF/ACME')
+        self.assertNotContains(response, 'OF/BETA')
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('SELECT "offers_company"."id"')
+                          and 'ORDER BY' in q['sql']])
+
+        response = self.client.get(reverse('offer_list'), {'company': '999'})
+        self.assertContains(response, 'Nie ma firmy z tym NIP-em.')
+
+    def test_main_queries_use_indexes(self):
+        for i in range(5):
+            self.make_offer(f'OF/IX/{i}', created_by=self.user, status=Offer.Status.PENDING)
+
+        for name, queryset in query_plans.main_queries():
+            self.assertEqual(query_plans.full_scans(query_plans.explain(queryset)), [], name)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.make_offer('OF/0')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('offer_list'))
+        for i in range(1, 20):
+            self.make_offer(f"OF/{i}")
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('offer_list'))
+        self.assertEqual(len(small), len(large))
+
+    def test_detail_query_count_does_not_grow_with_items(self):
+        self.client.force_login(self.user)
+        small, large = self.make_offer('OF/S'), self.make_offer('OF/L')
+        with defer_total_recalculation():
+            OfferItem.objects.create(offer=small, description='Kabel', quantity=3, price_per_unit=Decimal('2.50'))
+            for i in range(50):
+                OfferItem.objects.create(offer=large, description=f'Poz {i}', quantity=1, price_per_unit=Decimal('1'))
+
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(reverse('offer_detail', args=[small.pk]))
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse('offer_detail', args=[large.pk]))
+
+        self.assertEqual(len(few), len(many))
+        self.assertContains(response, '7.50')
+
+    async def test_async_views_render_without_sync_queries(self):
+        # Zapytanie z szablonu w widoku async skończyłoby się SynchronousOnlyOperation
+        offer = await Offer.objects.acreate(offer_number='OF/ASYNC', client=self.client_obj, seller=self.seller)
+        await OfferItem.objects.acreate(offer=offer, description='Kabel', quantity=1, price_per_unit=Decimal('5'))
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('offer_detail', args=[offer.pk]))
+        self.assertContains(response, 'Kabel')
+        response = await self.async_client.get(reverse('offer_list'), {'company': self.company.nip})
+        self.assertContains(response, 'OF/ASYNC')
+
+
+class PdfCacheTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        self.offer = self.make_offer('OF/PDF/1')
+        OfferItem.objects.create(offer=self.offer, description='Serwer', quantity=2, price_per_unit=Decimal('100'))
+
+    def test_key_changes_when_item_changes(self):
+        key = pdf_cache.offer_cache_key(self.offer)
+        self.assertEqual(key, pdf_cache.offer_cache_key(self.offer))
+        self.offer.items.update(quantity=3)
+        self.assertNotEqual(key, pdf_cache.offer_cache_key(self.offer))
+
+    def test_store_replaces_previous_version(self):
+        old = pdf_cache.store_pdf(self.offer.pk, 'a' * 64, b'%PDF-old')
+        new = pdf_cache.store_pdf(self.offer.pk, 'b' * 64, b'%PDF-new')
+        self.assertFalse(os.path.exists(old))
+        self.assertEqual(pdf_cache.get_cached_pdf(self.offer.pk, 'b' * 64), new)
+        self.assertIsNone(pdf_cache.get_cached_pdf(self.offer.pk, 'a' * 64))
+
+    def test_evict_by_size_removes_least_recently_used(self):
+        first = pdf_cache.store_pdf(1, 'a' * 64, b'x' * 100)
+        second = pdf_cache.store_pdf(2, 'b' * 64, b'x' * 100)
+        os.utime(first, (1, 1))
+        pdf_cache.evict(max_bytes=150)
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+
+    @skipUnless(HAS_WEASYPRINT, "WeasyPrint niedostępny")
+    def test_second_download_is_served_from_file(self):
+        self.client.force_login(self.user)
+        url = reverse('offer_pdf', args=[self.offer.pk])
+        first = self.client.get(url)
+        self.assertIsNotNone(cached_offer_pdf(self.offer))
+        second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+
+class SellerLogoTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        self.override = override_settings(MEDIA_ROOT=self.media_dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def upload(self, name, mode, size):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new(mode, size, 'red').save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_pdf_uses_print_rendition_named_by_content(self):
+        from PIL import Image
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.logo = self.upload('logo.png', 'RGB', (4000, 3000))
+            self.seller.save()
+        renditions = os.listdir(os.path.join(self.media_dir, 'logo_renditions'))
+        self.assertEqual(len(renditions), 1)
+
+        url = resolve_logo_url(self.seller)
+        self.assertTrue(url.endswith(renditions[0]))
+        self.assertTrue(renditions[0].startswith(pdf_cache.file_digest(self.seller.logo.path)[:32]))
+        with Image.open(os.path.join(self.media_dir, 'logo_renditions', renditions[0])) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (333, 250)))
+
+    def test_transparent_logo_stays_png(self):
+        self.seller.logo = self.upload('logo.png', 'RGBA', (200, 100))
+        self.seller.save()
+
+        self.assertTrue(resolve_logo_url(self.seller).endswith('.png'))
+
+
+class ConditionalGetTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        self.client.force_login(self.user)
+        self.offer = self.make_offer('OF/ETAG/1')
+        OfferItem.objects.create(offer=self.offer, description='Serwer', quantity=2, price_per_unit=Decimal('100'))
+        self.offer.refresh_from_db()
+
+    def test_unchanged_detail_page_returns_304(self):
+        url = reverse('offer_detail', args=[self.offer.pk])
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(len(queries), 3)  # sesja, użytkownik, oferta
+
+        Seller.objects.filter(pk=self.seller.pk).update(name='Nowa Nazwa')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+        OfferItem.objects.create(offer=self.offer, description='Dysk', quantity=1, price_per_unit=Decimal('10'))
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_pdf_validators_and_ranges(self):
+        key = offer_pdf_cache_key(self.offer)
+        pdf_cache.store_pdf(self.offer.pk, key, b'%PDF-0123456789')
+        url = reverse('offer_pdf', args=[self.offer.pk])
+
+        full = self.client.get(url)
+        self.assertEqual((full.status_code, full['ETag'], full['Accept-Ranges']), (200, f'"{key}"', 'bytes'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 304)
+
+        part = self.client.get(url, HTTP_RANGE='bytes=5-8', HTTP_IF_RANGE=full['ETag'])
+        self.assertEqual((part.status_code, part.content, part['Content-Range']), (206, b'0123', 'bytes 5-8/15'))
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=-3').content, b'789')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=99-').status_code, 416)
+        # Inna wersja pliku niż w If-Range - cały plik zamiast fragmentu
+        stale = self.client.get(url, HTTP_RANGE='bytes=5-8', HTTP_IF_RANGE='"stara"')
+        self.assertEqual((stale.status_code, stale.content), (200, b'%PDF-0123456789'))
+        # Data w If-Range nie gwarantuje tej samej wersji - też cały plik; PDF nie ma Last-Modified
+        dated = self.client.get(url, HTTP_RANGE='bytes=5-8', HTTP_IF_RANGE='Wed, 21 Oct 2099 07:28:00 GMT')
+        self.assertEqual(dated.status_code, 200)
+        self.assertNotIn('Last-Modified', full)
+
+
+class PdfJobQueueTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.override = override_settings(PDF_CACHE_DIR=self.cache_dir, PDF_RENDER_ASYNC=True)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        self.offer = self.make_offer('OF/JOB/1')
+        self.client.force_login(self.user)
+
+    @skipUnless(HAS_WEASYPRINT, "WeasyPrint niedostępny")
+    def test_async_mode_enqueues_once_and_redirects_when_done(self):
+        url = reverse('offer_pdf', args=[self.offer.pk])
+        response = self.client.get(url)
+        job = PdfRenderJob.objects.get()
+        self.assertRedirects(response, reverse('pdf_job_status', args=[job.pk]), fetch_redirect_response=False)
+
+        # Drugie kliknięcie nie tworzy nowego zadania
+        self.client.get(url)
+        self.assertEqual(PdfRenderJob.objects.count(), 1)
+
+        status = self.client.get(reverse('pdf_job_status', args=[job.pk]))
+        self.assertEqual(status.status_code, 202)
+        self.assertEqual(status.json()['status'], PdfRenderJob.Status.QUEUED)
+
+        self.assertEqual(pdf_jobs.claim_jobs(5), [job.pk])
+        self.assertEqual(pdf_jobs.claim_jobs(5), [])
+        pdf_jobs.render_job(job.pk)
+        pdf_jobs.mark_done(job.pk)
+
+        done = self.client.get(reverse('pdf_job_status', args=[job.pk]))
+        self.assertRedirects(done, url, fetch_redirect_response=False)
+        self.assertTrue(self.client.get(url).streaming)
+
+    def test_failed_job_is_retried_until_limit(self):
+        job = PdfRenderJob.objects.create(offer=self.offer, cache_key='x' * 64)
+        pdf_jobs.claim_jobs(1)
+        self.assertEqual(pdf_jobs.mark_failed(job.pk, 'boom', max_attempts=2), PdfRenderJob.Status.QUEUED)
+        pdf_jobs.claim_jobs(1)
+        self.assertEqual(pdf_jobs.mark_failed(job.pk, 'boom', max_attempts=2), PdfRenderJob.Status.FAILED)
+
+
+class PdfZipExportTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def test_cached_pdfs_are_streamed_into_valid_zip(self):
+        for i in range(3):
+            offer = self.make_offer(f"OF/ZIP/{i}")
+            pdf_cache.store_pdf(offer.pk, offer_pdf_cache_key(offer), f"%PDF-{i}".encode())
+
+        chunks = list(stream_offers_zip(Offer.objects.all()))
+        self.assertGreater(len(chunks), 1)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(sorted(archive.namelist()), [f"Oferta_OF_ZIP_{i}.pdf" for i in range(3)])
+        self.assertEqual(archive.read('Oferta_OF_ZIP_1.pdf'), b'%PDF-1')
+
+        async def collect():
+            return [chunk async for chunk in astream_offers_zip(Offer.objects.all())]
+        self.assertEqual(b''.join(async_to_sync(collect)()), b''.join(chunks))
+
+
+class OfferTotalsTests(OfferTestMixin, TestCase):
+
+    def test_item_signals_keep_total_in_sync(self):
+        offer = self.make_offer('OF/SUM/1')
+        item = OfferItem.objects.create(offer=offer, description='A', quantity=3, price_per_unit=Decimal('10.50'))
+        OfferItem.objects.create(offer=offer, description='B', quantity=1, price_per_unit=Decimal('4.00'))
+        offer.refresh_from_db()
+        self.assertEqual(offer.total_price, Decimal('35.50'))
+
+        item.delete()
+        offer.refresh_from_db()
+        self.assertEqual(offer.total_price, Decimal('4.00'))
+
+    def test_vat_and_gross_use_item_rates(self):
+        offer = self.make_offer('OF/VAT/1')
+        OfferItem.objects.create(offer=offer, description='A', quantity=1, price_per_unit=Decimal('1111'))
+        OfferItem.objects.create(offer=offer, description='B', quantity=2, price_per_unit=Decimal('50'),
+                                 vat_rate=Decimal('8.00'))
+        offer.refresh_from_db()
+        self.assertEqual(offer.total_price, Decimal('1211.00'))
+        self.assertEqual(offer.get_total_vat(), Decimal('263.53'))
+        self.assertEqual(offer.get_total_gross(), Decimal('1474.53'))
+
+        self.make_offer('OF/VAT/2')
+        revenue = Offer.objects.revenue()
+        self.assertEqual((revenue['count'], revenue['gross']), (2, Decimal('1474.53')))
+
+    def test_deferred_recalculation_runs_once(self):
+        def save_items(offer, count):
+            with CaptureQueriesContext(connection) as queries:
+                with defer_total_recalculation():
+                    for i in range(count):
+                        OfferItem.objects.create(offer=offer, description=f"P{i}", quantity=2,
+                                                 price_per_unit=Decimal('1.25'))
+            return len(queries)
+
+        small, large = self.make_offer('OF/SUM/2'), self.make_offer('OF/SUM/3')
+        # Poza INSERT-ami pozycji koszt (suma + statystyki) jest stały
+        self.assertEqual(save_items(large, 30) - save_items(small, 10), 20)
+        large.refresh_from_db()
+        self.assertEqual(large.total_price, Decimal('75.00'))
+
+    def test_edit_view_query_count_does_not_depend_on_item_count(self):
+        self.client.force_login(self.user)
+
+        def post_items(offer, count):
+            data = {
+                'seller': self.seller.pk, 'client': self.client_obj.pk, 'status': Offer.Status.DRAFT,
+                'validity_days': 14, 'payment_deadline_days': 7,
+                'payment_method': Offer.PaymentMethod.TRANSFER, 'currency_rate': '1.0000',
+                'items-TOTAL_FORMS': count, 'items-INITIAL_FORMS': 0,
+                'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000,
+            }
+            for i in range(count):
+                data.update({f'items-{i}-description': f'P{i}', f'items-{i}-quantity': 1,
+                             f'items-{i}-price_per_unit': '2.00', f'items-{i}-vat_rate': '23.00'})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('offer_edit', args=[offer.pk]), data)
+            self.assertEqual(response.status_code, 302)
+            return len(queries)
+
+        small, large = self.make_offer('OF/E/1'), self.make_offer('OF/E/2')
+        small_queries = post_items(small, 2)
+        large_queries = post_items(large, 40)
+        # Rośnie tylko liczba INSERT-ów (po jednym na pozycję)
+        self.assertEqual(large_queries - small_queries, 38)
+        large.refresh_from_db()
+        self.assertEqual(large.total_price, Decimal('80.00'))
+
+
+class OfferStatsTests(OfferTestMixin, TestCase):
+
+    def assertStatsMatchRebuild(self):
+        def summary():
+            return sorted(
+                (row['status'], row['count'], row['gross'])
+                for row in OfferDailyStat.objects.values('status')
+                .annotate(count=Sum('offer_count'), gross=Sum('total_gross'))
+                if row['count']
+            )
+
+        incremental = summary()
+        stats.rebuild()
+        self.assertEqual(incremental, summary())
+
+    def test_incremental_updates_match_full_rebuild(self):
+        offer = self.make_offer('OF/ST/1', created_by=self.user)
+        OfferItem.objects.create(offer=offer, description='A', quantity=2, price_per_unit=Decimal('100'))
+        other = self.make_offer('OF/ST/2')
+
+        offer.status = Offer.Status.PENDING
+        offer.save()
+        with stats.track_offers([other.pk]):
+            Offer.objects.filter(pk=other.pk).update(status=Offer.Status.APPROVED)
+        self.make_offer('OF/ST/3').delete()
+
+        self.assertStatsMatchRebuild()
+
+    def test_moving_client_to_another_company_moves_offers(self):
+        other = Company.objects.create(name='Beta', nip='555')
+        self.make_offer('OF/ST/5')
+        self.client_obj.company = other
+        self.client_obj.save()
+        crm_sync.upsert_clients([(2, {'email': 'jan@acme.pl', 'first_name': 'Jan', 'last_name': 'Kowalski',
+                                      'company_nip': '123-456-78-90'})])
+        # Firmę porównujemy z wartością z wczytania - po zmianie masowej wczytujemy kontakt od nowa
+        self.client_obj = Client.objects.get(pk=self.client_obj.pk)
+        self.client_obj.company = other
+        self.client_obj.save()
+
+        # Tam i z powrotem (sygnał Client, upsert CRM), i znów tam - bez dryfu w kubełkach firm
+        by_company = dict(OfferDailyStat.objects.values('company').annotate(count=Sum('offer_count'))
+                          .values_list('company', 'count'))
+        self.assertEqual((by_company.get(other.pk), by_company.get(self.company.pk, 0)), (1, 0))
+
+    def test_deleting_company_or_client_keeps_totals(self):
+        self.make_offer('OF/ST/6')
+        other = Company.objects.create(name='Beta', nip='555')
+        other_client = Client.objects.create(company=other, first_name='Ewa', last_name='Lis', email='ewa@beta.pl')
+        self.make_offer('OF/ST/7', client=other_client)
+        self.make_offer('OF/ST/8')
+
+        other.delete()
+        connection.check_constraints()  # SQLite sprawdza klucze obce dopiero przy COMMIT
+        self.assertFalse(OfferDailyStat.objects.filter(offer_count__lt=0).exists())
+        self.assertStatsMatchRebuild()
+
+        self.client_obj.delete()
+        self.assertFalse(OfferDailyStat.objects.exclude(offer_count=0).exists())
+
+    def test_saves_without_bucket_changes_skip_stats_queries(self):
+        offer = self.make_offer('OF/ST/9')
+        client = Client.objects.get(pk=self.client_obj.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            offer.description = 'Nowy opis'
+            offer.save(update_fields=['description'])
+            client.first_name = 'Janek'
+            client.save()
+
+        # Ani zdjęcia oferty (kwoty), ani odczytu firmy kontaktu, ani kubełków
+        self.assertFalse([
+            q['sql'] for q in queries
+            if 'offerdailystat' in q['sql'] or '"total_gross"' in q['sql']
+            or q['sql'].startswith('SELECT "offers_client"."company_id"')
+        ])
+
+    def test_dashboard_reads_only_rollup(self):
+        offer = self.make_offer('OF/ST/4', created_by=self.user)
+        OfferItem.objects.create(offer=offer, description='A', quantity=1, price_per_unit=Decimal('100'))
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '123.00')
+        self.assertFalse(any('"offers_offer"' in q['sql'] for q in queries))
+
+
+class SearchTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        lodz = Company.objects.create(name='Łódzkie Zakłady', nip='987-654-32-10')
+        other = Client.objects.create(company=lodz, first_name='Anna', last_name='Nowak', email='anna@lodz.pl')
+        self.acme_offer = self.make_offer('OF/S/1')
+        self.lodz_offer = self.make_offer('OF/S/2', client=other)
+
+    def found(self, query):
+        return set(search.filter_queryset(Offer.objects.all(), SearchDocument.Kind.OFFER, query))
+
+    def test_prefix_and_diacritics(self):
+        self.assertEqual(self.found('kow'), {self.acme_offer})
+        self.assertEqual(self.found('lodzkie nowak'), {self.lodz_offer})
+        self.assertEqual(self.found('ŁÓDZ'), {self.lodz_offer})
+
+    def test_nip_digits_only(self):
+        self.assertEqual(self.found('9876543210'), {self.lodz_offer})
+
+    def test_company_rename_reindexes_offers(self):
+        self.company.name = 'Zmieniona'
+        self.company.save()
+        self.assertEqual(self.found('zmieniona'), {self.acme_offer})
+        companies = search.filter_queryset(Company.objects.all(), SearchDocument.Kind.COMPANY, 'acme')
+        self.assertFalse(companies.exists())
+
+    def test_seller_rename_reindexes_offers(self):
+        self.seller.name = 'Nowy Wystawca'
+        self.seller.save()
+        self.assertEqual(self.found('wystawca'), {self.acme_offer, self.lodz_offer})
+        self.assertEqual(self.found('nasza firma'), set())
+
+    def test_offer_list_search_box(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('offer_list'), {'q': 'nowak'})
+        self.assertContains(response, 'OF/S/2')
+        self.assertNotContains(response, 'OF/S/1')
+
+
+class OfferNumberingTests(OfferTestMixin, TestCase):
+    day = timezone.localdate()
+
+    def tearDown(self):
+        numbering.reset_blocks()
+
+    def test_sequence_per_seller_and_day(self):
+        other = Seller.objects.create(name='Druga Spółka', nip='222', address='Kraków')
+        stamp = f"{self.day:%Y%m%d}"
+        self.assertEqual(numbering.next_offer_number(self.seller), f"OF/{stamp}/{self.seller.pk}/0001")
+        self.assertEqual(numbering.next_offer_number(self.seller), f"OF/{stamp}/{self.seller.pk}/0002")
+        self.assertEqual(numbering.next_offer_number(other), f"OF/{stamp}/{other.pk}/0001")
+        self.assertEqual(numbering.next_offer_number(None), f"OF/{stamp}/0/0001")
+
+    def test_rolled_back_number_is_reused(self):
+        try:
+            with transaction.atomic():
+                numbering.next_offer_number(self.seller)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertTrue(numbering.next_offer_number(self.seller).endswith('/0001'))
+
+    @override_settings(OFFER_NUMBER_BLOCK_SIZE=10)
+    def test_block_is_served_from_memory_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = numbering.next_offer_number(self.seller)
+        with self.assertNumQueries(0):
+            following = [numbering.next_offer_number(self.seller) for _ in range(9)]
+        self.assertEqual([n[-4:] for n in [first] + following], [f"{i:04d}" for i in range(1, 11)])
+        self.assertEqual(OfferNumberCounter.objects.get(seller=self.seller, day=self.day).last_value, 10)
+        self.assertTrue(numbering.next_offer_number(self.seller).endswith('/0011'))
+
+    def test_create_view_assigns_number(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('offer_create'), {
+            'seller': self.seller.pk, 'client': self.client_obj.pk, 'status': Offer.Status.DRAFT,
+            'validity_days': 14, 'payment_deadline_days': 7, 'payment_method': Offer.PaymentMethod.TRANSFER,
+            'currency_rate': '1.0000',
+            'items-TOTAL_FORMS': 1, 'items-INITIAL_FORMS': 0,
+            'items-0-description': 'Usługa', 'items-0-quantity': 2, 'items-0-price_per_unit': '10.00',
+            'items-0-vat_rate': '23.00',
+        })
+        offer = Offer.objects.get()
+        self.assertRedirects(response, reverse('offer_detail', args=[offer.pk]), fetch_redirect_response=False)
+        self.assertEqual(offer.offer_number, f"OF/{self.day:%Y%m%d}/{self.seller.pk}/0001")
+        self.assertEqual(offer.total_price, Decimal('20.00'))
+
+
+class BulkImportTests(OfferTestMixin, TestCase):
+    CSV = (
+        "offer_number;created_at;status;seller;client;description;quantity;price_per_unit;price_in_eur;vat_rate\n"
+        "IMP/1;2025-03-01;approved;111;jan@acme.pl;Usługa A;2;100,00;;23\n"
+        "IMP/1;2025-03-01;approved;111;jan@acme.pl;Usługa B;1;50.00;12.00;8\n"
+        "IMP/2;;;Nasza Firma;JAN@ACME.PL;Usługa C;3;10;;0\n"
+        "IMP/3;;;;nikt@example.com;Usługa D;1;10;;23\n"
+        "IMP/2;;;Nasza Firma;jan@acme.pl;Usługa E;1;abc;;23\n"
+        "OLD/1;;;;jan@acme.pl;Nie wejdzie;1;1;;23\n"
+    )
+
+    def run_import(self, content, **kwargs):
+        return import_offers(iter_rows(io.BytesIO(content.encode()), 'csv'), **kwargs)
+
+    def test_imports_offers_with_totals_across_chunks(self):
+        self.make_offer('OLD/1')
+        result = self.run_import(self.CSV, chunk_size=2)
+
+        self.assertEqual((result.offers_created, result.items_created), (2, 3))
+        self.assertEqual((result.offers_skipped, result.rows_rejected), (1, 2))
+        self.assertEqual([line for line, _ in result.errors], [5, 6])
+
+        first = Offer.objects.get(offer_number='IMP/1')
+        self.assertEqual(first.status, Offer.Status.APPROVED)
+        self.assertEqual(first.created_at.date().isoformat(), '2025-03-01')
+        self.assertEqual((first.total_price, first.total_vat), (Decimal('250.00'), Decimal('50.00')))
+        self.assertEqual(Offer.objects.get(offer_number='IMP/2').total_price, Decimal('30.00'))
+        self.assertEqual(Offer.objects.get(offer_number='OLD/1').items.count(), 0)
+
+        totals = OfferDailyStat.objects.aggregate(count=Sum('offer_count'), gross=Sum('total_gross'))
+        self.assertEqual((totals['count'], totals['gross']), (3, Decimal('330.00')))
+        self.assertEqual(set(search.filter_queryset(Offer.objects.all(), SearchDocument.Kind.OFFER, 'imp')),
+                         set(Offer.objects.filter(offer_number__startswith='IMP')))
+
+    def test_import_dates_are_set_in_one_update_per_chunk(self):
+        content = "offer_number;created_at;client;description;quantity;price_per_unit\n" + "".join(
+            f"T/{i};2025-03-0{i}T1{i}:2{i}:00;jan@acme.pl;Usługa;1;10\n" for i in range(1, 4)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import(content)
+
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "offers_offer" SET "created_at"')]
+        self.assertEqual(len(updates), 1)
+        created = Offer.objects.get(offer_number='T/2').created_at
+        self.assertEqual((created.day, created.hour, created.minute), (2, 12, 22))
+
+    def test_interrupted_import_keeps_original_error_and_totals(self):
+        def rows():
+            yield from iter_rows(io.BytesIO(self.CSV.encode()), 'csv')
+            raise RuntimeError("zerwane połączenie")
+
+        with self.assertRaisesMessage(RuntimeError, "zerwane połączenie"):
+            import_offers(rows(), chunk_size=2)
+        self.assertEqual(Offer.objects.get(offer_number='IMP/1').total_price, Decimal('250.00'))
+
+        # Błąd przy przeliczaniu po przerwaniu nie przykrywa błędu importu
+        Offer.objects.filter(offer_number__startswith='IMP').delete()
+        with mock.patch.object(importing, '_finish', side_effect=ValueError("sumy")), \
+                self.assertLogs('offers.importing', 'ERROR'), \
+                self.assertRaisesMessage(RuntimeError, "zerwane połączenie"):
+            import_offers(rows(), chunk_size=2)
+
+    def test_missing_columns_rejected(self):
+        with self.assertRaises(ImportFileError):
+            self.run_import("offer_number,client\nX,jan@acme.pl\n")
+
+    def test_admin_upload(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('oferty.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post(reverse('admin:offers_offer_bulk_import'), {'file': upload})
+        self.assertContains(response, 'Zaimportowano 3 ofert')
+
+
+class CrmSyncTests(OfferTestMixin, TestCase):
+
+    def rows(self, *dicts):
+        return list(enumerate(dicts, start=2))
+
+    def test_keys_are_normalized_on_save(self):
+        self.assertEqual(self.company.nip_normalized, '1234567890')
+        self.client_obj.email = ' Jan@ACME.pl '
+        self.client_obj.save()
+        self.assertEqual(self.client_obj.email_normalized, 'jan@acme.pl')
+
+    def test_merge_command_merges_duplicates_left_without_key(self):
+        # Stan po migracji 0010: duplikaty z pustym kluczem
+        twin = Company.objects.create(name='Acme bis', nip='1')
+        twin_contact = Client.objects.create(company=twin, first_name='J', last_name='K', email='j@k.pl')
+        Company.objects.filter(pk=twin.pk).update(nip='PL 123 456 78 90', nip_normalized=None)
+        Client.objects.filter(pk=twin_contact.pk).update(email='JAN@acme.pl ', email_normalized=None)
+        offer = self.make_offer('OF/DUP/1', client=twin_contact)
+
+        out = io.StringIO()
+        call_command('merge_crm_duplicates', '--dry-run', stdout=out)
+        self.assertIn(f"Firma {self.company.pk}: Acme (NIP 123-456-78-90) <- {twin.pk}: Acme bis", out.getvalue())
+        self.assertEqual(Company.objects.count(), 2)
+
+        call_command('merge_crm_duplicates', stdout=io.StringIO())
+
+        self.assertEqual(list(Company.objects.values_list('pk', flat=True)), [self.company.pk])
+        self.assertEqual(list(Client.objects.values_list('pk', flat=True)), [self.client_obj.pk])
+        offer.refresh_from_db()
+        self.assertEqual(offer.client_id, self.client_obj.pk)
+        by_company = dict(OfferDailyStat.objects.values('company').annotate(count=Sum('offer_count'))
+                          .values_list('company', 'count'))
+        self.assertEqual({company: count for company, count in by_company.items() if count}, {self.company.pk: 1})
+        self.client_obj.save()  # klucz nikomu nie koliduje
+
+    def test_upsert_companies_matches_any_nip_format(self):
+        result = crm_sync.upsert_companies(self.rows(
+            {'name': 'Acme S.A.', 'nip': 'PL1234567890', 'address': 'Poznań'},
+            {'name': 'Nowa', 'nip': '555 444 33 22'},
+            {'name': 'Bez NIP'},
+        ))
+        self.assertEqual((result.created, result.updated, result.rejected), (1, 1, 1))
+        self.company.refresh_from_db()
+        self.assertEqual((self.company.name, self.company.address), ('Acme S.A.', 'Poznań'))
+        self.assertEqual(Company.objects.count(), 2)
+
+        again = crm_sync.upsert_companies(self.rows({'name': 'Nowa', 'nip': '5554443322'}))
+        self.assertEqual((again.created, again.updated, again.unchanged), (0, 1, 0))
+
+    def test_upsert_clients(self):
+        result = crm_sync.upsert_clients(self.rows(
+            {'email': 'JAN@acme.pl', 'first_name': 'Jan', 'last_name': 'Kowalski-Nowak',
+             'company_nip': '123-456-78-90'},
+            {'email': 'ewa@acme.pl', 'first_name': 'Ewa', 'last_name': 'Zielińska', 'company_nip': '1234567890'},
+            {'email': 'x@y.pl', 'company_nip': '000'},
+        ))
+        self.assertEqual((result.created, result.updated, result.rejected), (1, 1, 1))
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.last_name, 'Kowalski-Nowak')
+        found = search.filter_queryset(Client.objects.all(), SearchDocument.Kind.CLIENT, 'zielinska')
+        self.assertEqual(list(found.values_list('email', flat=True)), ['ewa@acme.pl'])
+
+    def test_duplicate_nip_rejected_by_form_validation(self):
+        duplicate = Company(name='Acme 2', nip='1234567890')
+        with self.assertRaises(ValidationError):
+            duplicate.full_clean()
+
+    def test_admin_resource_import(self):
+        dataset = tablib.Dataset(headers=['name', 'nip', 'address'])
+        dataset.append(['Acme Nowa Nazwa', '123 456 78 90', ''])
+        dataset.append(['Druga', '999-999-99-99', ''])
+        dataset.append(['Druga bis', '9999999999', ''])
+        result = CompanyResource().import_data(dataset, dry_run=False, raise_errors=True)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(Company.objects.get(pk=self.company.pk).name, 'Acme Nowa Nazwa')
+        self.assertEqual(Company.objects.get(nip_normalized='9999999999').name, 'Druga bis')
+
+
+class ProductCatalogTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        catalog.invalidate()
+        Product.objects.create(sku='HDMI-2M', name='Kabel HDMI 2m', price_pln=Decimal('25.00'))
+        Product.objects.create(sku='SW-24', name='Przełącznik 24 porty', price_pln=Decimal('899.00'),
+                               price_eur=Decimal('210.00'))
+        Product.objects.create(sku='OLD-1', name='Kabel wycofany', price_pln=Decimal('1.00'), is_active=False)
+
+    def skus(self, query):
+        return [product['sku'] for product in catalog.lookup(query)]
+
+    def test_prefix_of_sku_or_any_word(self):
+        self.assertEqual(self.skus('kab'), ['HDMI-2M'])
+        self.assertEqual(self.skus('hdm'), ['HDMI-2M'])
+        self.assertEqual(self.skus('sw-'), ['SW-24'])
+        self.assertEqual(self.skus('PRZEŁ'), ['SW-24'])
+        self.assertEqual(self.skus('przel'), ['SW-24'])
+        self.assertEqual(self.skus('x'), [])
+
+    def test_answers_from_memory_and_rebuilds_after_change(self):
+        catalog.lookup('kab')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.skus('porty'), ['SW-24'])
+        Product.objects.filter(sku='OLD-1').update(is_active=True)
+        self.assertEqual(self.skus('kabel'), ['HDMI-2M'])  # update() bez sygnału - indeks jeszcze stary
+        Product.objects.create(sku='HDMI-5M', name='Kabel HDMI 5m', price_pln=Decimal('40.00'))
+        self.assertEqual(self.skus('kabel'), ['HDMI-2M', 'HDMI-5M', 'OLD-1'])
+
+    def test_autocomplete_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('product_autocomplete'), {'q': 'prze'})
+        self.assertEqual(response.json()['results'], [{
+            'id': Product.objects.get(sku='SW-24').pk, 'sku': 'SW-24', 'name': 'Przełącznik 24 porty',
+            'price_pln': '899.00', 'price_eur': '210.00', 'vat_rate': '23.00',
+        }])
+
+
+class ExchangeRateTests(OfferTestMixin, TestCase):
+
+    ECB_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+  <Cube>
+    <Cube time="2026-10-16"><Cube currency="USD" rate="1.0800"/><Cube currency="PLN" rate="4.2875"/></Cube>
+    <Cube time="2026-10-15"><Cube currency="USD" rate="1.0750"/><Cube currency="PLN" rate="4.3000"/></Cube>
+  </Cube>
+</gesmes:Envelope>"""
+
+    def test_loads_xml_and_csv_without_duplicates(self):
+        currency.load_rates(currency.parse_ecb_file(io.BytesIO(self.ECB_XML)), currencies=['EUR', 'USD'])
+        csv_file = io.BytesIO(b"Date, USD, PLN, \n16 October 2026, 1.0800, 4.2900, \n")
+        currency.load_rates(currency.parse_ecb_file(csv_file))
+
+        self.assertEqual(ExchangeRate.objects.count(), 4)
+        self.assertEqual(ExchangeRate.objects.get(currency='EUR', day='2026-10-16').rate, Decimal('4.2900'))
+        self.assertEqual(ExchangeRate.objects.get(currency='USD', day='2026-10-16').rate, Decimal('3.9699'))
+        # Sobota - obowiązuje kurs z piątku
+        self.assertEqual(currency.current_rate('EUR', timezone.datetime(2026, 10, 17).date()), Decimal('4.2900'))
+
+    def test_reprice_rounds_half_up_and_updates_totals(self):
+        offer = self.make_offer('OF/FX/1')
+        OfferItem.objects.create(offer=offer, description='A', quantity=1, price_per_unit=Decimal('1'),
+                                 price_in_eur=Decimal('2.50'))
+        OfferItem.objects.create(offer=offer, description='B', quantity=1, price_per_unit=Decimal('10'))
+
+        result = currency.reprice_offers([offer.pk], Decimal('4.3010'))
+
+        self.assertEqual(result.items, 1)
+        self.assertEqual(offer.items.get(description='A').price_per_unit, Decimal('10.75'))  # 10.7525
+        offer.refresh_from_db()
+        self.assertEqual(offer.currency_rate, Decimal('4.3010'))
+        self.assertEqual(offer.total_price, Decimal('20.75'))
+        self.assertEqual(OfferDailyStat.objects.aggregate(net=Sum('total_net'))['net'], Decimal('20.75'))
+
+    def test_reprice_skips_offers_approved_in_the_meantime(self):
+        offer = self.make_offer('OF/FX/3')
+        OfferItem.objects.create(offer=offer, description='A', quantity=1, price_per_unit=Decimal('1'),
+                                 price_in_eur=Decimal('1.00'))
+        offer_ids = [offer.pk]  # wybrane jako szkic...
+        Offer.objects.filter(pk=offer.pk).update(status=Offer.Status.APPROVED)  # ...i zatwierdzone przed zapisem
+
+        result = currency.reprice_offers(offer_ids, Decimal('4.0000'))
+
+        self.assertEqual((result.offers, result.items), (0, 0))
+        self.assertEqual(offer.items.get().price_per_unit, Decimal('1.00'))
+
+    def test_reprice_view_rejects_sent_offer(self):
+        ExchangeRate.objects.create(day=timezone.localdate(), rate=Decimal('4.0000'))
+        offer = self.make_offer('OF/FX/2', status=Offer.Status.APPROVED)
+        OfferItem.objects.create(offer=offer, description='A', quantity=1, price_per_unit=Decimal('1'),
+                                 price_in_eur=Decimal('1.00'))
+        self.client.force_login(self.user)
+
+        self.client.post(reverse('offer_reprice', args=[offer.pk]))
+        self.assertEqual(offer.items.get().price_per_unit, Decimal('1.00'))
+
+        Offer.objects.filter(pk=offer.pk).update(status=Offer.Status.DRAFT)
+        self.client.post(reverse('offer_reprice', args=[offer.pk]))
+        self.assertEqual(offer.items.get().price_per_unit, Decimal('4.00'))
+
+
+class OfferHistoryTests(OfferTestMixin, TestCase):
+
+    def test_request_changes_are_written_in_one_insert(self):
+        offer = self.make_offer('OF/H/1')
+        OfferItem.objects.create(offer=offer, description='A', quantity=1, price_per_unit=Decimal('10'))
+        offer = Offer.objects.get(pk=offer.pk)
+        item = offer.items.get()
+
+        with CaptureQueriesContext(connection) as queries:
+            with history.collect(user=self.user):
+                with self.captureOnCommitCallbacks(execute=True):
+                    offer.status = Offer.Status.PENDING
+                    offer.save()
+                    item.quantity = 3
+                    item.save()
+                    item.save()  # bez zmian - bez zdarzenia
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "offers_offerevent"')]
+        self.assertEqual(len(inserts), 1)
+
+        events = {event.kind: event for event in offer.events.all()}
+        self.assertEqual(events[OfferEvent.Kind.STATUS].changes, {'status': ['draft', 'pending']})
+        self.assertEqual(events[OfferEvent.Kind.STATUS].user, self.user)
+        self.assertEqual(events[OfferEvent.Kind.ITEM_CHANGED].changes, {'quantity': [1, 3]})
+
+    def test_rolled_back_change_leaves_no_trace(self):
+        offer = self.make_offer('OF/H/2')
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    offer.status = Offer.Status.APPROVED
+                    offer.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(offer.events.filter(kind=OfferEvent.Kind.STATUS).exists())
+
+    def test_admin_action_and_timeline(self):
+        offer = self.make_offer('OF/H/3', status=Offer.Status.PENDING)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:offers_offer_changelist'), {
+                'action': 'make_approved', '_selected_action': [offer.pk],
+            })
+
+        event = offer.events.get(kind=OfferEvent.Kind.STATUS)
+        self.assertEqual(event.changes, {'status': ['pending', 'approved']})
+        self.assertEqual(event.user, self.user)
+        response = self.client.get(reverse('offer_detail', args=[offer.pk]))
+        self.assertContains(response, 'Oczekuje na akceptację')
+        self.assertContains(response, 'Zatwierdzona')
+
+    def test_admin_log_search_by_number_and_filter_by_offer_id(self):
+        first = self.make_offer('OF/H/4', status=Offer.Status.PENDING)
+        second = self.make_offer('OF/H/5', status=Offer.Status.PENDING)
+        for offer in (first, second):
+            OfferEvent.objects.create(offer=offer, kind=OfferEvent.Kind.STATUS, changes={})
+        self.client.force_login(self.user)
+        url = reverse('admin:offers_offerevent_changelist')
+
+        response = self.client.get(url, {'q': 'H/4'})
+        self.assertEqual([event.offer_id for event in response.context['cl'].result_list], [first.pk])
+        response = self.client.get(url, {'offer__id__exact': second.pk})
+        self.assertEqual([event.offer_id for event in response.context['cl'].result_list], [second.pk])
+
+
+class StandInSMTPBackend(locmem.EmailBackend):
+    """Lokalny zastępca serwera SMTP: liczy otwarte i zamknięte połączenia, odrzuca wybrane adresy."""
+    opened = 0
+    closed = 0
+    open_error = None
+    errors = {}  # adres -> wyjątek
+
+    def open(self):
+        StandInSMTPBackend.opened += 1
+        if self.open_error:
+            raise self.open_error
+        return True
+
+    def close(self):
+        StandInSMTPBackend.closed += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in self.errors:
+                raise self.errors[message.to[0]]
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='offers.tests.StandInSMTPBackend')
+class OfferEmailTests(OfferTestMixin, TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        StandInSMTPBackend.opened = StandInSMTPBackend.closed = 0
+        StandInSMTPBackend.open_error = None
+        StandInSMTPBackend.errors = {}
+
+    def make_approved_offer(self, number, email='jan@acme.pl'):
+        client = Client.objects.filter(email=email).first() or Client.objects.create(
+            company=self.company, first_name='Anna', last_name='Nowak', email=email)
+        offer = self.make_offer(number, client=client, status=Offer.Status.APPROVED)
+        pdf_cache.store_pdf(offer.pk, offer_pdf_cache_key(offer), b'%PDF-test')
+        return offer
+
+    def test_request_only_queues_the_message(self):
+        offer = self.make_approved_offer('OF/M/1')
+        self.client.force_login(self.user)
+
+        self.client.post(reverse('offer_send_email', args=[offer.pk]))
+        self.client.post(reverse('offer_send_email', args=[offer.pk]))
+
+        self.assertEqual(OutboundEmail.objects.get().to, 'jan@acme.pl')
+        self.assertEqual(StandInSMTPBackend.opened, 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_worker_sends_batch_over_one_connection(self):
+        offers = [self.make_approved_offer(f'OF/M/{i}', email=f'k{i}@example.com') for i in range(3)]
+        for offer in offers:
+            mailing.enqueue_offer_email(offer)
+
+        call_command('email_worker', '--once', '--batch-size', '2', stdout=io.StringIO())
+
+        self.assertEqual(StandInSMTPBackend.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [f'k{i}@example.com' for i in range(3)])
+        self.assertEqual(mail.outbox[0].attachments[0][1], b'%PDF-test')
+        self.assertEqual(Offer.objects.filter(status=Offer.Status.SENT).count(), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.Status.SENT).exists())
+        self.assertEqual(OfferDailyStat.objects.get(status=Offer.Status.SENT).offer_count, 3)
+
+    def test_worker_closes_connection_that_failed_to_open(self):
+        mailing.enqueue_offer_email(self.make_approved_offer('OF/M/8'))
+        StandInSMTPBackend.open_error = smtplib.SMTPAuthenticationError(535, b'zle haslo')
+
+        call_command('email_worker', '--once', stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual((StandInSMTPBackend.opened, StandInSMTPBackend.closed), (1, 1))
+        self.assertTrue(mailing.has_due())
+
+    def test_transient_errors_retry_with_backoff_and_refused_address_fails(self):
+        flaky = mailing.enqueue_offer_email(self.make_approved_offer('OF/M/5', email='flaky@example.com'))
+        refused = mailing.enqueue_offer_email(self.make_approved_offer('OF/M/6', email='zly@example.com'))
+        StandInSMTPBackend.errors = {
+            'flaky@example.com': smtplib.SMTPServerDisconnected('zerwane'),
+            'zly@example.com': smtplib.SMTPRecipientsRefused({'zly@example.com': (550, b'no such user')}),
+        }
+
+        self.assertEqual(mailing.send_batch(mail.get_connection()), (0, 2))
+
+        flaky.refresh_from_db()
+        refused.refresh_from_db()
+        self.assertEqual((flaky.status, flaky.attempts), (OutboundEmail.Status.QUEUED, 1))
+        self.assertGreater(flaky.next_attempt_at, timezone.now() + timedelta(seconds=30))
+        self.assertEqual(refused.status, OutboundEmail.Status.FAILED)
+        self.assertFalse(mailing.has_due())
+
+    def test_offer_no_longer_approved_cancels_queued_message(self):
+        offer = self.make_approved_offer('OF/M/7')
+        email = mailing.enqueue_offer_email(offer)
+        offer.status = Offer.Status.DRAFT
+        offer.save()
+
+        self.assertEqual(mailing.send_batch(mail.get_connection()), (0, 0))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.CANCELLED)
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(mailing.has_due())
+        # Po ponownym zatwierdzeniu ofertę można wysłać jeszcze raz
+        offer.status = Offer.Status.APPROVED
+        offer.save()
+        self.assertNotEqual(mailing.enqueue_offer_email(offer).pk, email.pk)
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_is_deterministic_and_idempotent(self):
+        result = seeding.generate(30, items_per_offer=3, seed=7)
+
+        self.assertEqual((result.offers, result.skipped), (30, 0))
+        self.assertEqual(seeding.seeded_items().count(), result.items)
+        self.assertEqual(OfferDailyStat.objects.aggregate(n=Sum('offer_count'))['n'], 30)
+        self.assertFalse(seeding.seeded_offers().filter(total_gross=0).exists())
+        self.assertEqual(seeding.generate(30, items_per_offer=3, seed=7).skipped, 30)
+
+        rows = lambda: list(seeding._offer_rows(1, 5, 5, 10, ['S'], 3, random.Random(7)))  # noqa: E731
+        self.assertEqual([row['description'] for _line, row in rows()],
+                         [row['description'] for _line, row in rows()])
+
+    def test_run_leaves_data_untouched_and_compare_flags_regressions(self):
+        seeding.generate(20, items_per_offer=2, seed=1)
+        prices = sorted(OfferItem.objects.values_list('pk', 'price_per_unit'))
+
+        result = benchmark.run(['offer_list', 'offer_detail', 'offer_edit'], iterations=2, warmup=0)
+
+        self.assertEqual(sorted(OfferItem.objects.values_list('pk', 'price_per_unit')), prices)
+        measured = result['scenarios']['offer_edit']
+        self.assertGreater(measured['queries'], 0)
+        self.assertLessEqual(measured['p50_ms'], measured['p95_ms'])
+
+        baseline = {'scenarios': {name: {**values, 'queries': values['queries'] - 1}
+                                  for name, values in result['scenarios'].items()}}
+        regressions = [row for row in benchmark.compare(result, baseline) if row.is_regression(0.2)]
+        self.assertEqual({(row.scenario, row.metric) for row in regressions},
+                         {(name, 'queries') for name in result['scenarios']})
+
+
+@override_settings(QUERY_INSPECTOR=True)
+class QueryInspectorTests(OfferTestMixin, TestCase):
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 'a' LIMIT 21"),
+                         fingerprint("SELECT  * FROM t WHERE id IN (%s) AND x = 'b' LIMIT 1"))
+
+    def test_headers_and_repeated_queries_point_at_template_and_code(self):
+        for i in range(4):
+            self.make_offer(f'OF/Q/{i}')
+        self.client.force_login(self.user)
+
+        with self.assertLogs('offers.query_inspector', 'WARNING') as logs:
+            response = self.client.get(reverse('admin:offers_offer_changelist'))
+
+        self.assertGreater(int(response['X-Query-Count']), 8)
+        self.assertGreaterEqual(int(response['X-Query-Repeated']), 1)
+        self.assertIn('change_list.html', response['X-Query-Repeated-Origin'])
+        self.assertTrue(any('offers/models.py' in line and '__str__' in line for line in logs.output))
+
+    @override_settings(QUERY_BUDGETS={'offer_detail': 2}, QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_fails_async_view(self):
+        offer = self.make_offer('OF/Q/9')
+        self.client.force_login(self.user)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('offer_detail', args=[offer.pk]))
+
+
+class OfferWorkflowTests(OfferTestMixin, TestCase):
+    def test_batch_endpoint_reports_each_offer(self):
+        pending = [self.make_offer(f'OF/W/{i}', status=Offer.Status.PENDING) for i in range(2)]
+        draft = self.make_offer('OF/W/D')
+        self.client.force_login(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('offer_batch_status'),
+                {'action': 'approve', 'ids': [pending[0].pk, pending[1].pk, draft.pk, 999999]},
+                content_type='application/json',
+            )
+
+        results = {row['id']: row for row in response.json()['results']}
+        self.assertTrue(results[pending[0].pk]['ok'] and results[pending[1].pk]['ok'])
+        self.assertIn('Robocza', results[draft.pk]['error'])
+        self.assertFalse(results[999999]['ok'])
+        self.assertEqual(Offer.objects.filter(status=Offer.Status.APPROVED).count(), 2)
+        self.assertEqual(OfferDailyStat.objects.get(status=Offer.Status.APPROVED).offer_count, 2)
+        self.assertEqual(OfferEvent.objects.filter(kind=OfferEvent.Kind.STATUS).count(), 2)
+
+    def test_second_approval_is_rejected_by_the_guard(self):
+        offer = self.make_offer('OF/W/R', status=Offer.Status.PENDING)
+
+        self.assertEqual(workflow.apply('approve', [offer.pk], self.user).changed, [offer.pk])
+        second = workflow.apply('reject', [offer.pk], self.user, reason='Za drogo')
+
+        self.assertIn(offer.pk, second.failed)
+        offer.refresh_from_db()
+        self.assertEqual((offer.status, offer.rejection_reason), (Offer.Status.APPROVED, None))
+
+    def test_permissions_and_admin_actions_use_the_state_machine(self):
+        seller_user = User.objects.create_user('handlowiec', password='x')
+        offer = self.make_offer('OF/W/P', status=Offer.Status.PENDING)
+        with self.assertRaises(workflow.TransitionError):
+            workflow.apply('approve', [offer.pk], seller_user)
+
+        approved = self.make_offer('OF/W/A', status=Offer.Status.APPROVED)
+        rejected = self.make_offer('OF/W/X', status=Offer.Status.REJECTED)
+        self.client.force_login(self.user)
+        self.client.post(reverse('admin:offers_offer_changelist'), {
+            'action': 'make_draft', '_selected_action': [approved.pk, rejected.pk],
+        })
+
+        self.assertEqual(Offer.objects.get(pk=approved.pk).status, Offer.Status.APPROVED)
+        self.assertEqual(Offer.objects.get(pk=rejected.pk).status, Offer.Status.DRAFT)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    databases = {'default'}
+
+    def route_in_view(self, request):
+        @replica_reads
+        def view(request):
+            return ReplicaRouter().db_for_read(Offer)
+        return view(request)
+
+    def test_read_only_views_read_from_replica(self):
+        request = RequestFactory().get('/offers/')
+
+        self.assertEqual(self.route_in_view(request), 'replica')
+        self.assertEqual(ReplicaRouter().db_for_read(Offer), 'default')
+        self.assertEqual(ReplicaRouter().db_for_write(Offer), 'default')
+        self.assertFalse(ReplicaRouter().allow_migrate('replica', 'offers'))
+
+    def test_user_pinned_after_write_reads_from_primary(self):
+        request = RequestFactory().get('/offers/')
+        request.COOKIES[PIN_COOKIE] = '1'
+
+        self.assertEqual(self.route_in_view(request), 'default')
+
+    def test_reads_inside_transaction_stay_on_primary(self):
+        # Np. sprawdzenie aktywnego zadania PDF przed utworzeniem nowego (pdf_jobs.enqueue_pdf_job)
+        @replica_reads
+        def view(request):
+            with transaction.atomic():
+                return ReplicaRouter().db_for_read(PdfRenderJob)
+
+        self.assertEqual(view(RequestFactory().get('/offers/1/pdf/')), 'default')
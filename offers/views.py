@@ -1,17 +1,31 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.template.loader import get_template
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-import uuid
 from django.conf import settings
-from .models import Offer, OfferItem
-from .forms import OfferForm, OfferItemFormSet
-from weasyprint import HTML, CSS
-from django.http import HttpResponse, FileResponse
-from django.template.loader import render_to_string
-from datetime import timedelta
+from .models import Offer, OfferEvent, OfferItem, OfferDailyStat, PdfRenderJob, defer_total_recalculation
+from .forms import OfferForm, OfferItemFormSet, OfferFilterForm
+from .numbering import next_offer_number
+from .pagination import akeyset_paginate
+from .pdf_cache import file_digest
+from .pdf import PDF_QUERYSET_RELATED, arender_offer_pdf, offer_pdf_cache_key, cached_offer_pdf
+from . import catalog, conditional, currency, history, mailing, pdf_jobs, workflow
+from .pdf_jobs import enqueue_pdf_job
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.middleware.csrf import get_token
+from django.utils.http import url_has_allowed_host_and_scheme
+from datetime import date, timedelta
+from django.db.models import OuterRef, Prefetch, Subquery, Sum, prefetch_related_objects
+from django.db.models.functions import TruncMonth
 from django.contrib import messages
-import os
-import sys
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
 
 
 # --- WIDOK: KAFELKI (DASHBOARD) ---
@@ -20,61 +34,185 @@ def home(request):
     return render(request, 'offers/home.html')
 
 
+# --- WIDOK: STATYSTYKI SPRZEDAŻY ---
+def _stats_breakdown(stats, *fields, limit=None):
+    rows = (
+        stats.values(*fields)
+        .annotate(count=Sum('offer_count'), net=Sum('total_net'), gross=Sum('total_gross'))
+        .filter(count__gt=0)
+        .order_by('-gross', *fields)
+    )
+    return rows[:limit] if limit else rows
+
+
+@login_required
+def dashboard(request):
+    # Czytamy wyłącznie rollup OfferDailyStat - koszt nie zależy od liczby ofert
+    try:
+        months = min(max(int(request.GET.get('months', 12)), 1), 60)
+    except ValueError:
+        months = 12
+
+    today = timezone.localdate()
+    month_index = today.year * 12 + today.month - 1 - (months - 1)
+    since = date(month_index // 12, month_index % 12 + 1, 1)
+
+    stats = OfferDailyStat.objects.filter(day__gte=since).exclude(offer_count=0)
+    totals = stats.aggregate(count=Sum('offer_count'), net=Sum('total_net'), gross=Sum('total_gross'))
+
+    status_labels = dict(Offer.Status.choices)
+    by_status = [
+        dict(row, label=status_labels.get(row['status'], row['status']))
+        for row in _stats_breakdown(stats, 'status')
+    ]
+    by_month = (
+        stats.annotate(month=TruncMonth('day'))
+        .values('month')
+        .annotate(count=Sum('offer_count'), net=Sum('total_net'), gross=Sum('total_gross'))
+        .order_by('month')
+    )
+
+    return render(request, 'offers/dashboard.html', {
+        'months': months,
+        'month_options': [3, 6, 12, 24, 36],
+        'since': since,
+        'totals': totals,
+        'by_status': by_status,
+        'by_month': by_month,
+        'by_seller': _stats_breakdown(stats, 'seller__name', limit=10),
+        'by_salesperson': _stats_breakdown(stats, 'created_by__username', 'created_by__first_name',
+                                           'created_by__last_name', limit=10),
+        'by_company': _stats_breakdown(stats, 'company__name', limit=10),
+    })
+
+
 # --- WIDOK: LISTA OFERT ---
+OFFER_LIST_PAGE_SIZE = getattr(settings, 'OFFER_LIST_PAGE_SIZE', 25)
+
+
+async def _aload_user(request):
+    # Szablony czytają request.user (context processor auth). W widoku async nie wolno go
+    # dociągać z bazy leniwie - podstawiamy użytkownika wczytanego asynchronicznie.
+    request.user = await request.auser()
+
+
 @login_required
-def offer_list(request):
-    offers = Offer.objects.all().order_by('-created_at')
-    return render(request, 'offers/offer_list.html', {'offers': offers})
+async def offer_list(request):
+    # Widok async (ASGI): czekając na bazę nie zajmuje wątku
+    # Klient i jego firma w jednym zapytaniu (JOIN) - bez dociągania per wiersz
+    offers = Offer.objects.select_related('client__company')
+
+    # Walidacja i listy wyboru formularza to zwykły (synchroniczny) ORM
+    filter_form = OfferFilterForm(request.GET or None)
+    if await sync_to_async(filter_form.load)():
+        offers = filter_form.filter_queryset(offers)
+
+    page = await akeyset_paginate(
+        offers,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=OFFER_LIST_PAGE_SIZE,
+    )
+
+    # Filtry przenosimy do linków "dalej"/"wstecz", kursory podmieniamy
+    filter_params = request.GET.copy()
+    filter_params.pop('after', None)
+    filter_params.pop('before', None)
+
+    await _aload_user(request)
+    return render(request, 'offers/offer_list.html', {
+        'offers': page,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': filter_params.urlencode(),
+    })
 
 
 # --- WIDOK: SZCZEGÓŁY OFERTY ---
-@login_required
-def offer_detail(request, pk):
-    offer = get_object_or_404(Offer, pk=pk)
-    return render(request, 'offers/offer_details.html', {'offer': offer})
+OFFER_DETAIL_TEMPLATE = 'offers/offer_details.html'
 
 
-# --- WIDOK: TWORZENIE NOWEJ OFERTY ---
-@login_required
-def offer_create(request):
-    if request.method == 'POST':
-        form = OfferForm(request.POST, request.FILES)
+def _row_values(obj):
+    return [getattr(obj, field.attname) for field in obj._meta.concrete_fields] if obj else None
 
-        if form.is_valid():
-            offer = form.save(commit=False)
 
-            # Generowanie unikalnego numeru
-            timestamp = timezone.now().strftime("%Y%m%d")
-            unique_id = str(uuid.uuid4())[:4].upper()
-            offer.offer_number = f"OF/{timestamp}/{unique_id}"
-            offer.created_by = request.user
+def _csrf_secret(request):
+    # Sekret CSRF (stały dla przeglądarki), a nie maskowany token, który zmienia się przy każdym renderze.
+    # get_token() przy pierwszej wizycie tworzy sekret - tak jak zrobiłby to {% csrf_token %} w szablonie.
+    get_token(request)
+    return request.META.get('CSRF_COOKIE')
 
-            offer.save()  # Zapisujemy, żeby mieć ID
 
-            # Podpinamy produkty pod ofertę
-            formset = OfferItemFormSet(request.POST, instance=offer)
+def _offer_detail_etag(request, offer):
+    # Strona zależy od oferty (zmiana pozycji podbija updated_at), klienta z firmą, wystawcy,
+    # historii, zalogowanego użytkownika (przyciski CEO, token CSRF w formularzach) i szablonu
+    client = offer.client
+    return conditional.make_etag(
+        _row_values(offer), offer.last_event_at,
+        _row_values(client), _row_values(client.company if client else None), _row_values(offer.seller),
+        request.user.pk, request.user.get_username(), request.user.is_superuser,
+        _csrf_secret(request),
+        file_digest(get_template(OFFER_DETAIL_TEMPLATE).origin.name),
+    )
 
-            if formset.is_valid():
-                formset.save()
 
-                # Przeliczanie sumy (korzystamy z related_name='items')
-                total = 0
-                for item in offer.items.all():
-                    total += item.total_price
+@login_required
+async def offer_detail(request, pk):
+    # Wszystko, czego potrzebuje szablon, wczytujemy tutaj - renderowanie nie może pytać bazy.
+    # Oferta z klientem, firmą i wystawcą to jeden JOIN (razem z czasem ostatniego zdarzenia historii -
+    # z niego i z updated_at liczymy ETag/Last-Modified), pozycje - drugie zapytanie,
+    # z wartościami wierszy policzonymi w bazie; liczba zapytań nie zależy od liczby pozycji.
+    offer = await aget_object_or_404(
+        Offer.objects.select_related('client__company', 'seller').annotate(
+            last_event_at=Subquery(
+                OfferEvent.objects.filter(offer=OuterRef('pk')).order_by('-timestamp').values('timestamp')[:1]
+            ),
+        ),
+        pk=pk,
+    )
+    await _aload_user(request)
+
+    # Powtórne otwarcie niezmienionej oferty: 304 bez pozycji, historii i szablonu.
+    # Z komunikatem do wyświetlenia (np. po zapisie) zawsze renderujemy stronę.
+    etag = _offer_detail_etag(request, offer)
+    last_modified = max(filter(None, (offer.updated_at, offer.last_event_at)))
+    if not len(messages.get_messages(request)):
+        unchanged = conditional.not_modified(request, etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+
+    await sync_to_async(prefetch_related_objects)(
+        [offer], Prefetch('items', queryset=OfferItem.objects.with_amounts().order_by('pk')),
+    )
+    events = await history.atimeline(offer)
+    response = render(request, OFFER_DETAIL_TEMPLATE, {'offer': offer, 'events': events})
+    return conditional.set_validators(response, etag, last_modified)
 
-                offer.total_price = total
+
+# --- WIDOK: TWORZENIE NOWEJ OFERTY ---
+@login_required
+def offer_create(request):
+    if request.method == 'POST':
+        form = OfferForm(request.POST, request.FILES)
+        # Pozycje walidujemy przed zapisem nagłówka - błąd nie zostawia pustej oferty
+        formset = OfferItemFormSet(request.POST, instance=form.instance)
+
+        if form.is_valid() and formset.is_valid():
+            # Numer, oferta i pozycje w jednej transakcji - przy błędzie numer wraca do puli
+            with transaction.atomic():
+                offer = form.save(commit=False)
+                offer.offer_number = next_offer_number(offer.seller)
+                offer.created_by = request.user
                 offer.save()
 
-                return redirect('offer_detail', pk=offer.pk)
-            else:
-                # BŁĄD W PRODUKTACH
-                print("--- BŁĄD FORMSETU (PRODUKTY) ---")
-                print(formset.errors)
-                offer.delete()  # Usuwamy pustą ofertę
+                # Suma przeliczana raz, po zapisaniu wszystkich pozycji
+                formset.instance = offer
+                with defer_total_recalculation():
+                    formset.save()
+
+            return redirect('offer_detail', pk=offer.pk)
         else:
-            # BŁĄD W NAGŁÓWKU
-            print("--- BŁĄD FORMULARZA GŁÓWNEGO ---")
-            print(form.errors)
+            logger.warning("Błąd formularza nowej oferty: %s, pozycje: %s", form.errors.as_json(), formset.errors)
 
     else:
         form = OfferForm()
@@ -86,6 +224,46 @@ def offer_create(request):
     })
 
 
+# --- WIDOK: PRZELICZENIE CEN Z EUR (aktualny kurs z tabeli kursów) ---
+@login_required
+def offer_reprice(request, pk):
+    offer = get_object_or_404(Offer, pk=pk)
+    if request.method == 'POST':
+        try:
+            result = currency.reprice_offer(offer)
+        except ValueError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, f"Ceny przeliczone po kursie {result.rate} PLN/EUR "
+                                      f"(zmienione pozycje: {result.items}).")
+    return redirect('offer_detail', pk=pk)
+
+
+# --- WIDOK: WYSYŁKA OFERTY DO KLIENTA (tylko kolejka - SMTP obsługuje manage.py email_worker) ---
+@login_required
+def offer_send_email(request, pk):
+    offer = get_object_or_404(Offer.objects.select_related('client'), pk=pk)
+    if request.method == 'POST':
+        try:
+            email = mailing.enqueue_offer_email(offer, user=request.user)
+        except ValueError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, f"Oferta czeka w kolejce wysyłki do {email.to}.")
+    return redirect('offer_detail', pk=pk)
+
+
+# --- WIDOK: PODPOWIEDZI PRODUKTÓW (JSON dla pozycji oferty) ---
+@login_required
+def product_autocomplete(request):
+    # Odpowiada z indeksu w pamięci (offers/catalog.py) - katalog nie jest czytany z bazy
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    return JsonResponse({'results': catalog.lookup(request.GET.get('q', ''), limit=limit)})
+
+
 # --- WIDOK: EDYCJA OFERTY ---
 @login_required
 def offer_edit(request, pk):
@@ -105,21 +283,14 @@ def offer_edit(request, pk):
 
         if form.is_valid() and formset.is_valid():
             form.save()
-            formset.save()
-
-            # Przeliczamy sumę ponownie
-            total = 0
-            for item in offer.items.all():
-                total += item.total_price
-
-            offer.total_price = total
-            offer.save()
+            # Suma przeliczana raz, po zapisaniu wszystkich pozycji
+            with defer_total_recalculation():
+                formset.save()
 
             return redirect('offer_detail', pk=offer.pk)
         else:
-            print("--- BŁĄD EDYCJI ---")
-            print("Form errors:", form.errors)
-            print("Formset errors:", formset.errors)
+            logger.warning("Błąd edycji oferty %s: %s, pozycje: %s", offer.pk, form.errors.as_json(),
+                           formset.errors)
 
     else:
         form = OfferForm(instance=offer)
@@ -133,134 +304,172 @@ def offer_edit(request, pk):
 
 
 # --- WIDOK: PDF  ---
+def _pdf_response(request, offer, body, etag):
+    # Całe bajty zamiast FileResponse - pod ASGI plik nie musi być strumieniowany przez wątek
+    # Bez Last-Modified: PDF zależy też od klienta, wystawcy, logo i szablonu - data zmiany oferty
+    # nie jest wiarygodnym walidatorem, ETag (klucz cache) obejmuje wszystko
+    response = conditional.ranged_response(request, body, 'application/pdf', etag)
+    response['Content-Disposition'] = f'filename="Oferta_{offer.offer_number}.pdf"'
+    return response
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
 @login_required
-def offer_pdf(request, pk):
-    offer = get_object_or_404(Offer, pk=pk)
+async def offer_pdf(request, pk):
+    offer = await aget_object_or_404(Offer.objects.select_related(*PDF_QUERYSET_RELATED), pk=pk)
 
-    # --- KONFIGURACJA ŚCIEŻEK ---
+    # --- CACHE: ten sam zestaw danych = ten sam plik, bez ponownego renderowania ---
+    # Klucz czyta pozycje oferty i skróty plików - synchronicznie, poza pętlą zdarzeń
+    cache_key = await sync_to_async(offer_pdf_cache_key)(offer)
 
-    if not settings.DEBUG:
-        # --- PRODUKCJA (PythonAnywhere) ---
-        css_path = '/home/jakub3011/offert_system_basic/staticfiles/offers/pdf_style.css'
+    # Klucz to skrót wszystkich danych PDF-a - zarazem ETag. Klient z aktualną
+    # wersją dostaje 304 bez czytania pliku i bez renderowania.
+    etag = f'"{cache_key}"'
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
 
-        # Logo z dysku
-        if offer.seller.logo:
-            logo_url = 'file://' + offer.seller.logo.path
-        else:
-            logo_url = None
+    cached_path = await sync_to_async(cached_offer_pdf, thread_sensitive=False)(offer, cache_key)
+    if cached_path:
+        return _pdf_response(request, offer, await sync_to_async(_read_file, thread_sensitive=False)(cached_path), etag)
 
-    else:
-        # --- LOKALNIE (Docker) ---
-        # Ścieżka do kodu źródłowego
-        css_path = os.path.join(settings.BASE_DIR, 'offers', 'static', 'offers', 'pdf_style.css')
-
-        # Logo
-        logo_url = request.build_absolute_uri(offer.seller.logo.url) if offer.seller.logo else None
-
-    # --- DEBUGOWANIE ---
-    # To zobaczysz w Server Log na PA
-    print(f"--- DEBUG PDF ---", file=sys.stderr)
-    print(f"TRYB: {'PRODUKCJA' if not settings.DEBUG else 'LOKALNY'}", file=sys.stderr)
-    print(f"Używam CSS: {css_path}", file=sys.stderr)
-    print(f"Czy plik istnieje?: {os.path.exists(css_path)}", file=sys.stderr)
-
-    # --- RENDEROWANIE ---
-    context = {
-        'offer': offer,
-        'logo_url': logo_url,
-    }
+    # --- TRYB ASYNCHRONICZNY: renderuje worker, my tylko zlecamy ---
+    if getattr(settings, 'PDF_RENDER_ASYNC', False):
+        job = await sync_to_async(enqueue_pdf_job)(offer, cache_key, user=await request.auser())
+        return redirect('pdf_job_status', job_id=job.pk)
 
-    html_string = render_to_string('offers/offer_pdf.html', context)
+    # Renderowanie w ograniczonej puli wątków (PDF_RENDER_THREADS)
+    pdf_file = await arender_offer_pdf(offer, cache_key)
+    return _pdf_response(request, offer, pdf_file, etag)
 
-    # base_url='' - nie pozwalamy WeasyPrintowi błądzić po sieci
-    html = HTML(string=html_string, base_url='')
 
-    if os.path.exists(css_path):
-        try:
-            css = CSS(filename=css_path)
-            pdf_file = html.write_pdf(stylesheets=[css])
-            print("CSS załadowany poprawnie.", file=sys.stderr)
-        except Exception as e:
-            print(f"Błąd ładowania CSS: {e}", file=sys.stderr)
-            pdf_file = html.write_pdf()
-    else:
-        print("!!! PLIK CSS NIE ISTNIEJE !!! Generuję bez styli.", file=sys.stderr)
-        pdf_file = html.write_pdf()
+@login_required
+def offer_pdf_enqueue(request, pk):
+    offer = get_object_or_404(Offer.objects.select_related(*PDF_QUERYSET_RELATED), pk=pk)
+    cache_key = offer_pdf_cache_key(offer)
+    if cached_offer_pdf(offer, cache_key):
+        return redirect('offer_pdf', pk=offer.pk)
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="Oferta_{offer.offer_number}.pdf"'
+    job = enqueue_pdf_job(offer, cache_key, user=request.user)
+    return redirect('pdf_job_status', job_id=job.pk)
+
+
+@login_required
+def pdf_job_status(request, job_id):
+    """
+    Endpoint do odpytywania. Gotowe zadanie -> przekierowanie do pliku
+    (offer_pdf poda go prosto z cache). W toku -> JSON ze statusem i Retry-After.
+    """
+    job = get_object_or_404(PdfRenderJob, pk=job_id)
+
+    if job.status == PdfRenderJob.Status.DONE and request.GET.get('format') != 'json':
+        return redirect('offer_pdf', pk=job.offer_id)
+
+    data = {
+        'id': job.pk,
+        'offer': job.offer_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'status_url': reverse('pdf_job_status', args=[job.pk]),
+    }
+    if job.status == PdfRenderJob.Status.DONE:
+        data['download_url'] = reverse('offer_pdf', args=[job.offer_id])
+    if job.status == PdfRenderJob.Status.FAILED:
+        data['error'] = job.error
+
+    in_progress = job.status in pdf_jobs.ACTIVE_STATUSES
+    response = JsonResponse(data, status=202 if in_progress else 200)
+    if in_progress:
+        response['Retry-After'] = '2'
     return response
 
 
 @login_required
 def offer_reject(request, pk):
-    offer = get_object_or_404(Offer, pk=pk)
+    return offer_change_status(request, pk, 'reject')
 
-    if request.method == 'POST':
-        reason = request.POST.get('rejection_reason')
-        if reason:
-            offer.status = Offer.Status.REJECTED
-            offer.rejection_reason = reason
-            offer.save()
-            messages.warning(request, f"Oferta odrzucona. Powód: {reason}")
-            return redirect('offers:offer_list')
-        else:
-            messages.error(request, "Musisz podać powód odrzucenia!")
 
-    return render(request, 'offers/offer_reject.html', {'offer': offer})
+# Komunikaty po udanej zmianie statusu jednej oferty
+STATUS_MESSAGES = {
+    'submit': (messages.success, "Oferta {number} wysłana do akceptacji."),
+    'approve': (messages.success, "Oferta zatwierdzona! Można generować PDF."),
+    'reject': (messages.warning, "Oferta odrzucona. Powód: {reason}"),
+    'draft': (messages.info, "Oferta przywrócona do edycji."),
+    'consultation': (messages.info, "Oferta {number} skierowana do konsultacji."),
+}
 
 
 @login_required
 def offer_change_status(request, pk, action):
-    # 1. Pobieramy konkretną ofertę (pakiet)
+    # Reguły przejść i warunkowy UPDATE - offers/workflow.py
     offer = get_object_or_404(Offer, pk=pk)
-    user = request.user
-
-    # 2. Logika przejść (State Machine)
-
-    # SCENARIUSZ A: Wysłanie do akceptacji (Draft -> Pending)
-    if action == 'submit':
-        if offer.status == Offer.Status.DRAFT:
-            offer.status = Offer.Status.PENDING
-            offer.save()
-            messages.success(request, f"Oferta {offer.offer_number} wysłana do akceptacji.")
-        else:
-            messages.warning(request, "Tylko szkic można wysłać do akceptacji.")
-
-    # SCENARIUSZ B: Zatwierdzenie (Pending -> Approved)
-    elif action == 'approve':
-        if user.is_superuser:
-            if offer.status == Offer.Status.PENDING:
-                offer.status = Offer.Status.APPROVED
-                offer.save()
-                messages.success(request, "Oferta zatwierdzona! Można generować PDF.")
-            else:
-                messages.warning(request, "Zatwierdzić można tylko oczekującą ofertę.")
-        else:
-            messages.error(request, "Brak uprawnień (wymagany CEO).")
-
-    # SCENARIUSZ C: Odrzucenie (Pending -> Rejected)
-
-    elif action == 'reject':
-        if request.method == 'POST':
-            reason = request.POST.get('rejection_reason')
-            if reason:
-                offer.status = Offer.Status.REJECTED
-                offer.rejection_reason = reason
-                offer.save()
-                messages.warning(request, f"Oferta odrzucona. Powód: {reason}")
-                return redirect('offer_list')
-            else:
-                messages.error(request, "Musisz podać powód odrzucenia!")
 
+    # Odrzucenie wymaga powodu - najpierw formularz
+    if action == 'reject' and request.method != 'POST':
         return render(request, 'offers/offer_reject.html', {'offer': offer})
 
+    reason = request.POST.get('rejection_reason')
+    try:
+        result = workflow.apply(action, [offer.pk], request.user, reason=reason)
+    except workflow.TransitionError as exc:
+        messages.error(request, str(exc))
+        if action == 'reject':
+            return render(request, 'offers/offer_reject.html', {'offer': offer})
+        return redirect('offer_list')
+
+    if result.changed:
+        notify, text = STATUS_MESSAGES[action]
+        notify(request, text.format(number=offer.offer_number, reason=reason))
+    else:
+        messages.warning(request, result.failed[offer.pk])
+    return redirect('offer_list')
 
-    # SCENARIUSZ D: Cofnięcie do Draftu (np. żeby poprawić odrzuconą)
-    elif action == 'draft':
-        if offer.status == Offer.Status.REJECTED:
-            offer.status = Offer.Status.DRAFT
-            offer.save()
-            messages.info(request, "Oferta przywrócona do edycji.")
 
+# --- WIDOK: HURTOWA ZMIANA STATUSU (lista ofert / JSON) ---
+@login_required
+def offer_batch_status(request):
+    """
+    POST action=approve&ids=1&ids=2 (formularz listy ofert) albo JSON
+    {"action": "approve", "ids": [1, 2], "reason": "..."}. Odpowiedź JSON
+    z wynikiem dla każdego ID; formularz wraca na listę z komunikatem.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': "Wymagany POST."}, status=405)
+
+    wants_json = request.content_type == 'application/json'
+    if wants_json:
+        try:
+            payload = json.loads(request.body or b'{}')
+            action, ids, reason = payload.get('action'), payload.get('ids') or [], payload.get('reason')
+            if not isinstance(ids, list):
+                raise ValueError
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': "Niepoprawny JSON."}, status=400)
+    else:
+        action, ids, reason = request.POST.get('action'), request.POST.getlist('ids'), request.POST.get('reason')
+
+    try:
+        result = workflow.apply(action, ids, request.user, reason=reason)
+    except (workflow.TransitionError, ValueError, TypeError) as exc:
+        message = str(exc) if isinstance(exc, workflow.TransitionError) else "Niepoprawna lista ID."
+        if wants_json:
+            return JsonResponse({'error': message}, status=400)
+        messages.error(request, message)
+        return redirect('offer_list')
+
+    if wants_json:
+        return JsonResponse(result.as_json())
+    if result.changed:
+        messages.success(request, f"Zmieniono status {len(result.changed)} ofert na „{result.status.label}”.")
+    if result.failed:
+        messages.warning(request, f"Pominięto {len(result.failed)} ofert: "
+                                  + "; ".join(f"#{pk}: {error}" for pk, error in list(result.failed.items())[:5]))
+    # Powrót na tę samą stronę listy (z filtrami) - tylko adres z naszego hosta
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        return redirect(next_url)
     return redirect('offer_list')
@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import history
+from .models import Offer
+from .stats import track_offers
+
+# --- OBIEG OFERTY (MASZYNA STANÓW) ---
+# Jedno miejsce z regułami przejść dla widoków, endpointu hurtowego i akcji
+# w panelu admina. Cała lista ofert zmienia status jednym UPDATE-em
+# z warunkiem na status źródłowy (WHERE status IN (...)) - dwóch
+# zatwierdzających klikających naraz nie nadpisze sobie decyzji: drugi
+# UPDATE nie znajdzie już oferty w statusie "oczekuje".
+#
+# Które oferty zmienił właśnie ten UPDATE, poznajemy po updated_at = chwila
+# wywołania (znacznik), a nie po samym statusie - oferta zatwierdzona
+# równolegle przez kogoś innego nie zostanie zgłoszona jako nasz sukces.
+
+
+@dataclass(frozen=True)
+class Transition:
+    target: str
+    sources: tuple
+    superuser_only: bool = False
+    needs_reason: bool = False
+
+
+TRANSITIONS = {
+    'submit': Transition(Offer.Status.PENDING,
+                         (Offer.Status.DRAFT, Offer.Status.IN_CONSULTATION, Offer.Status.REJECTED)),
+    'approve': Transition(Offer.Status.APPROVED, (Offer.Status.PENDING,), superuser_only=True),
+    'reject': Transition(Offer.Status.REJECTED, (Offer.Status.PENDING,), superuser_only=True, needs_reason=True),
+    'draft': Transition(Offer.Status.DRAFT,
+                        (Offer.Status.PENDING, Offer.Status.IN_CONSULTATION, Offer.Status.REJECTED)),
+    'consultation': Transition(Offer.Status.IN_CONSULTATION, (Offer.Status.DRAFT, Offer.Status.PENDING)),
+}
+
+
+class TransitionError(ValueError):
+    """Przejście niemożliwe dla całej listy (nieznana akcja, brak uprawnień, brak powodu)."""
+
+
+@dataclass
+class TransitionResult:
+    action: str
+    status: str
+    changed: list = field(default_factory=list)  # ID ofert ze zmienionym statusem
+    failed: dict = field(default_factory=dict)  # ID -> powód
+
+    def as_json(self):
+        return {
+            'action': self.action,
+            'status': self.status,
+            'results': [{'id': pk, 'ok': True} for pk in self.changed]
+                       + [{'id': pk, 'ok': False, 'error': error} for pk, error in self.failed.items()],
+        }
+
+
+def _status_label(value):
+    return str(dict(Offer.Status.choices).get(value, value))
+
+
+def check(action, user, reason=None):
+    """Zwraca Transition albo rzuca TransitionError."""
+    transition = TRANSITIONS.get(action)
+    if transition is None:
+        raise TransitionError(f"Nieznana akcja: {action}")
+    if transition.superuser_only and not getattr(user, 'is_superuser', False):
+        raise TransitionError("Brak uprawnień (wymagany CEO).")
+    if transition.needs_reason and not (reason or '').strip():
+        raise TransitionError("Musisz podać powód odrzucenia!")
+    return transition
+
+
+def apply(action, offer_ids, user, reason=None):
+    """
+    Zmienia status ofert `offer_ids` zgodnie z akcją (klucz TRANSITIONS) jednym
+    warunkowym UPDATE-em. Oferty w niedozwolonym statusie zostają bez zmian
+    i trafiają do result.failed z powodem.
+    """
+    transition = check(action, user, reason)
+    offer_ids = list(dict.fromkeys(int(pk) for pk in offer_ids))
+    result = TransitionResult(action, transition.target)
+    if not offer_ids:
+        return result
+
+    values = {'status': transition.target, 'updated_at': timezone.now()}
+    if transition.needs_reason:
+        values['rejection_reason'] = reason.strip()
+
+    # queryset.update() omija sygnały - statystyki i historię prowadzimy ręcznie
+    with transaction.atomic(), track_offers(offer_ids), history.track_status(offer_ids):
+        Offer.objects.filter(pk__in=offer_ids, status__in=transition.sources).update(**values)
+        states = {pk: (status, updated_at) for pk, status, updated_at
+                  in Offer.objects.filter(pk__in=offer_ids).values_list('pk', 'status', 'updated_at')}
+
+    for pk in offer_ids:
+        if pk not in states:
+            result.failed[pk] = "Oferta nie istnieje."
+        elif states[pk] == (transition.target, values['updated_at']):
+            result.changed.append(pk)
+        elif states[pk][0] == transition.target:
+            result.failed[pk] = f"Oferta ma już status „{_status_label(transition.target)}”."
+        else:
+            result.failed[pk] = (f"Niedozwolone przejście ze statusu „{_status_label(states[pk][0])}” "
+                                 f"do „{_status_label(transition.target)}”.")
+    return result